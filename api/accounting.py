@@ -0,0 +1,240 @@
+"""
+命令的資源用量統計
+
+每個命令結束時記錄執行時間、CPU 使用者／系統時間、最大 RSS 與讀寫位元組數
+（wait4 與 /proc/<pid>/io，見 api/spawner.py 的 reap_with_usage），並依命令樣式
+彙總最近一段時間的用量，找出代理程式反覆執行、成本最高的命令。
+
+命令樣式只保留程式名稱、選項與管線結構，去掉檔名等參數，例如
+`grep -c error /var/log/app.log | sort -n` 的樣式為 `grep -c | sort -n`。
+"""
+import os
+import re
+import shlex
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .spawner import ForkServerProcess, reap_with_usage
+
+USAGE_WINDOW_ENV = "SHELL_HELPER_USAGE_WINDOW"
+DEFAULT_WINDOW = 3600.0
+MAX_PATTERNS = 500
+MAX_SAMPLES_PER_PATTERN = 1000
+MAX_PATTERN_LENGTH = 200
+
+COMMAND_SEPARATORS = frozenset({"|", "||", "&&", ";", "&"})
+REDIRECTIONS = frozenset({">", ">>", ">|", "&>", "<", "<<", "<<<", ">&", "<&"})
+# 第一個參數是子命令的程式，樣式保留子命令（git status 與 git log 分開統計）
+SUBCOMMAND_PROGRAMS = frozenset({
+    "apt", "brew", "cargo", "docker", "dotnet", "git", "go", "helm", "journalctl", "kubectl",
+    "npm", "pip", "pip3", "podman", "systemctl", "uv", "yarn",
+})
+DIGITS = re.compile(r"\d+")
+
+# /debug/usage 的排序方式
+SORT_KEYS = {
+    "cpu": "cpu_total_s",
+    "wall": "wall_total_s",
+    "count": "count",
+    "rss": "max_rss_kb",
+    "io": "io_total_bytes",
+}
+
+
+def _window_from_env() -> float:
+    try:
+        return max(1.0, float(os.environ.get(USAGE_WINDOW_ENV, DEFAULT_WINDOW)))
+    except ValueError:
+        return DEFAULT_WINDOW
+
+
+def _segment_pattern(words: List[str]) -> str:
+    """單一命令的樣式：程式名稱、子命令與選項（不含選項的值）"""
+    words = [word for word in words if not ("=" in word and not word.startswith("-"))] or words
+    program = os.path.basename(words[0]) or words[0]
+    parts = [program]
+    rest = words[1:]
+    if program.lower() in SUBCOMMAND_PROGRAMS:
+        subcommand = next((word for word in rest if not word.startswith("-")), None)
+        if subcommand is not None:
+            parts.append(subcommand)
+    for word in rest:
+        if word.startswith("-") and len(word) > 1:
+            parts.append(DIGITS.sub("N", word.split("=", 1)[0]))
+    return " ".join(parts)
+
+
+def command_pattern(shell_command: Optional[str] = None, argv: Optional[List[str]] = None) -> str:
+    """將命令轉為彙總用的樣式"""
+    if argv:
+        return _segment_pattern(argv)[:MAX_PATTERN_LENGTH]
+    if not shell_command or not shell_command.strip():
+        return ""
+    try:
+        lexer = shlex.shlex(shell_command, posix=True, punctuation_chars=True)
+        lexer.whitespace_split = True
+        tokens = list(lexer)
+    except ValueError:
+        # 引號未成對時只取程式名稱
+        return shell_command.split()[0][:MAX_PATTERN_LENGTH]
+
+    segments: List[str] = []
+    words: List[str] = []
+    skip = False
+    for token in tokens + [";"]:
+        if skip:
+            skip = False
+        elif token in REDIRECTIONS:
+            # 略過重新導向的目標
+            skip = True
+        elif token in COMMAND_SEPARATORS or token in ("(", ")"):
+            if words:
+                segments.append(_segment_pattern(words))
+                words = []
+            if token in COMMAND_SEPARATORS:
+                segments.append(token)
+        else:
+            words.append(token)
+    while segments and segments[-1] in COMMAND_SEPARATORS:
+        segments.pop()
+    return " ".join(segments)[:MAX_PATTERN_LENGTH]
+
+
+def wait_for_exit(process, started: float) -> Tuple[int, Dict[str, Any]]:
+    """等待命令結束，回傳 (返回碼, 用量)；用量一定包含執行時間 wall_s
+
+    subprocess.Popen 啟動的命令由這裡以 wait4 回收（呼叫前不可呼叫 process.poll()），
+    forkserver 啟動的命令使用 forkserver 回收時記錄的用量；Windows 只記錄執行時間。
+    """
+    if isinstance(process, ForkServerProcess):
+        return_code = process.wait()
+        usage = dict(process.usage)
+    elif hasattr(os, "wait4") and process.returncode is None:
+        return_code, usage = reap_with_usage(process.pid)
+        process.returncode = return_code
+    else:
+        return_code = process.wait()
+        usage = {}
+    usage["wall_s"] = round(time.perf_counter() - started, 6)
+    return return_code, usage
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class UsageTable:
+    """依命令樣式彙總最近 window 秒內的資源用量
+
+    每個樣式最多保留 MAX_SAMPLES_PER_PATTERN 筆紀錄；樣式數超過 max_patterns 時
+    移除最久沒有出現的樣式。
+    """
+
+    def __init__(self, window: Optional[float] = None, max_patterns: int = MAX_PATTERNS, clock=time.monotonic):
+        self.window = window or _window_from_env()
+        self.max_patterns = max_patterns
+        self.clock = clock
+        # 每筆紀錄：(時間, 執行時間, CPU 時間, 最大 RSS, 讀取位元組, 寫入位元組, 是否失敗)
+        self._samples: "OrderedDict[str, Deque[Tuple[float, float, float, int, int, int, bool]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, pattern: str, usage: Dict[str, Any], return_code: int) -> None:
+        if not pattern:
+            return
+        sample = (
+            self.clock(),
+            usage.get("wall_s", 0.0),
+            usage.get("cpu_user_s", 0.0) + usage.get("cpu_system_s", 0.0),
+            usage.get("max_rss_kb", 0),
+            usage.get("io_read_bytes", 0),
+            usage.get("io_write_bytes", 0),
+            return_code != 0,
+        )
+        with self._lock:
+            samples = self._samples.get(pattern)
+            if samples is None:
+                samples = self._samples[pattern] = deque(maxlen=MAX_SAMPLES_PER_PATTERN)
+            else:
+                self._samples.move_to_end(pattern)
+            samples.append(sample)
+            while len(self._samples) > self.max_patterns:
+                self._samples.popitem(last=False)
+
+    def _prune(self) -> None:
+        deadline = self.clock() - self.window
+        for pattern in list(self._samples):
+            samples = self._samples[pattern]
+            while samples and samples[0][0] < deadline:
+                samples.popleft()
+            if not samples:
+                del self._samples[pattern]
+
+    def summary(self, sort: str = "cpu", limit: int = 20) -> List[Dict[str, Any]]:
+        """各樣式的彙總，依 sort（SORT_KEYS）由大到小排列"""
+        now = self.clock()
+        with self._lock:
+            self._prune()
+            snapshot = {pattern: list(samples) for pattern, samples in self._samples.items()}
+
+        rows = []
+        for pattern, samples in snapshot.items():
+            walls = sorted(sample[1] for sample in samples)
+            cpu_total = sum(sample[2] for sample in samples)
+            read_bytes = sum(sample[4] for sample in samples)
+            write_bytes = sum(sample[5] for sample in samples)
+            rows.append({
+                "pattern": pattern,
+                "count": len(samples),
+                "failures": sum(1 for sample in samples if sample[6]),
+                "wall_total_s": round(sum(walls), 6),
+                "wall_p50_s": round(_percentile(walls, 0.5), 6),
+                "wall_p95_s": round(_percentile(walls, 0.95), 6),
+                "wall_max_s": round(walls[-1], 6),
+                "cpu_total_s": round(cpu_total, 6),
+                "cpu_mean_s": round(cpu_total / len(samples), 6),
+                "max_rss_kb": max(sample[3] for sample in samples),
+                "io_read_bytes": read_bytes,
+                "io_write_bytes": write_bytes,
+                "io_total_bytes": read_bytes + write_bytes,
+                "last_seen_s": round(now - samples[-1][0], 3),
+            })
+        key = SORT_KEYS.get(sort, SORT_KEYS["cpu"])
+        rows.sort(key=lambda row: row[key], reverse=True)
+        return rows[:limit]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+USAGE = UsageTable()
+
+
+def finish_command(process, started: float, pattern: str, sandbox=None) -> Tuple[int, Dict[str, Any]]:
+    """等待命令結束、補上沙箱的限制與用量，並記錄到 USAGE"""
+    return_code, usage = wait_for_exit(process, started)
+    if sandbox is not None:
+        sandbox.annotate(usage, return_code)
+    USAGE.record(pattern, usage, return_code)
+    return return_code, usage
+
+
+def abort_command(process) -> None:
+    """讀取輸出或組合結果失敗時結束並回收命令，不留下執行中的行程或僵屍行程"""
+    try:
+        process.kill()
+    except OSError:
+        pass
+    for stream in (process.stdout, process.stderr):
+        try:
+            stream.close()
+        except (OSError, ValueError):
+            pass
+    process.wait()
@@ -0,0 +1,429 @@
+"""
+命令執行的准入控制：每個客戶端的速率限制與公平排程
+
+單一代理程式大量呼叫 /execute 或 tools/call 時，不應讓其他客戶端的命令一直排不到。
+每個命令開始執行前依序經過：
+
+1. 速率限制：每個客戶端一個 token bucket（每秒補充 rate 個、最多累積 burst 個），
+   沒有 token 時立即拒絕並告知多久後可重試
+2. 公平排程：同時執行的命令數達到 max_concurrent 時排隊，依客戶端加權輪流
+   （weighted round-robin）取出，權重 2 的客戶端每輪可連續執行 2 個命令；
+   同一客戶端排隊中的命令超過 max_queued 時拒絕
+
+客戶端依 API 金鑰（X-API-Key 或 Authorization: Bearer）或來源位址識別，可用 identity
+設定採用哪些來源。MCP 工作階段 ID 由客戶端自行決定，不用來識別客戶端。伺服器不驗證
+金鑰，客戶端可以自行更換金鑰取得新的額度；前面沒有驗證金鑰的代理伺服器時，請只以
+來源位址識別。
+
+設定以 SHELL_HELPER_RATE_LIMITS（JSON）提供。設定 SHELL_HELPER_ADMIN_TOKEN 後，
+可帶 X-Admin-Token 標頭以 PATCH /admin/rate-limits 在執行中修改；未設定時只能查看。
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from .metrics import REGISTRY, Counter, Gauge, Histogram
+
+RATE_LIMITS_ENV = "SHELL_HELPER_RATE_LIMITS"
+ADMIN_TOKEN_ENV = "SHELL_HELPER_ADMIN_TOKEN"
+ADMIN_TOKEN_HEADER = "x-admin-token"
+IDENTITY_SOURCES = ("key", "address")
+# 追蹤的客戶端數上限，超過時移除最久沒有使用的客戶端（其 token bucket 視同已補滿）
+MAX_CLIENTS = 10000
+# 指標中未個別設定的客戶端統一記為 default，避免標籤數量無限增長
+DEFAULT_CLIENT_LABEL = "default"
+
+DEFAULT_CONFIG: Dict[str, Any] = {
+    # 每個客戶端每秒可啟動的命令數，0 為不限制
+    "rate": 0.0,
+    # 可累積的命令數（瞬間最多連續啟動幾個）
+    "burst": 10,
+    # 所有客戶端同時執行的命令數上限
+    "max_concurrent": os.cpu_count() or 4,
+    # 每個客戶端排隊中的命令數上限
+    "max_queued": 100,
+    "identity": list(IDENTITY_SOURCES),
+    # 個別客戶端的 rate、burst 與 weight（預設 1），例如 {"addr:10.0.0.5": {"rate": 1, "weight": 1}}
+    "clients": {},
+}
+CLIENT_KEYS = ("rate", "burst", "weight")
+
+
+class AdmissionError(ValueError):
+    """速率限制設定無效"""
+
+
+class RateLimited(Exception):
+    """命令因速率限制或排隊已滿被拒絕；retry_after 為建議的重試秒數"""
+
+    def __init__(self, client: str, reason: str, retry_after: float):
+        self.client = client
+        self.reason = reason
+        self.retry_after = retry_after
+        if reason == "rate":
+            message = f"客戶端 {client} 超過速率限制，請於 {retry_after:.1f} 秒後重試"
+        else:
+            message = f"客戶端 {client} 排隊中的命令過多，請於 {retry_after:.1f} 秒後重試"
+        super().__init__(message)
+
+    @property
+    def retry_after_header(self) -> str:
+        """Retry-After 標頭只接受整數秒"""
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+@dataclass(frozen=True)
+class ClientInfo:
+    """從請求取得的客戶端識別資訊；金鑰只保留雜湊"""
+    key: Optional[str] = None
+    address: Optional[str] = None
+
+    def identity(self, sources=IDENTITY_SOURCES) -> str:
+        for source in sources:
+            value = getattr(self, source)
+            if value:
+                return f"{'addr' if source == 'address' else source}:{value}"
+        return "local"
+
+
+CURRENT_CLIENT: ContextVar[ClientInfo] = ContextVar("current_client", default=ClientInfo())
+
+
+def _hash_key(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def client_from_scope(scope) -> ClientInfo:
+    """依 ASGI scope 的 API 金鑰標頭與來源位址建立 ClientInfo"""
+    key = None
+    for name, value in scope.get("headers") or ():
+        if name == b"x-api-key" and value:
+            key = value.decode("latin-1")
+        elif name == b"authorization" and value[:7].lower() == b"bearer " and key is None:
+            key = value[7:].decode("latin-1").strip()
+    client = scope.get("client")
+    # Unix domain socket 沒有來源位址
+    address = client[0] if client else None
+    return ClientInfo(_hash_key(key) if key else None, address)
+
+
+def admin_allowed(token: Optional[str]) -> bool:
+    """token 是否符合 SHELL_HELPER_ADMIN_TOKEN；未設定時一律拒絕（設定只能查看）"""
+    expected = os.environ.get(ADMIN_TOKEN_ENV)
+    if not expected or not token:
+        return False
+    return hmac.compare_digest(token.encode("utf-8"), expected.encode("utf-8"))
+
+
+class ClientIdentityMiddleware:
+    """設定 CURRENT_CLIENT 的 ASGI 中介層；請求內建立的工作（例如 SSE 串流）也會沿用"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = CURRENT_CLIENT.set(client_from_scope(scope))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            CURRENT_CLIENT.reset(token)
+
+
+def _number(value: Any, name: str, minimum: float = 0.0) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < minimum:
+        raise AdmissionError(f"{name} 必須是不小於 {minimum:g} 的數字")
+    return value
+
+
+def resolve_rate_limits(value: Optional[Dict[str, Any]], base: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """以 value 覆寫 base（預設為 DEFAULT_CONFIG）中提供的欄位，驗證後回傳新的設定"""
+    config = json.loads(json.dumps(base if base is not None else DEFAULT_CONFIG))
+    if not value:
+        return config
+    if not isinstance(value, dict):
+        raise AdmissionError("速率限制設定必須是物件")
+    unknown = set(value) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise AdmissionError(f"不支援的設定: {', '.join(sorted(unknown))}")
+
+    if "rate" in value:
+        config["rate"] = _number(value["rate"], "rate")
+    if "burst" in value:
+        config["burst"] = _number(value["burst"], "burst", 1)
+    for name in ("max_concurrent", "max_queued"):
+        if name in value:
+            config[name] = int(_number(value[name], name, 1))
+    if "identity" in value:
+        sources = value["identity"]
+        if not isinstance(sources, list) or not sources or set(sources) - set(IDENTITY_SOURCES):
+            raise AdmissionError(f"identity 必須是 {', '.join(IDENTITY_SOURCES)} 組成的清單")
+        config["identity"] = list(sources)
+    if "clients" in value:
+        if not isinstance(value["clients"], dict):
+            raise AdmissionError("clients 必須是物件")
+        for client, overrides in value["clients"].items():
+            if overrides is None:
+                # null 移除該客戶端的個別設定
+                config["clients"].pop(client, None)
+                continue
+            if not isinstance(overrides, dict) or set(overrides) - set(CLIENT_KEYS):
+                raise AdmissionError(f"clients.{client} 只能設定 {', '.join(CLIENT_KEYS)}")
+            entry = {}
+            for name, item in overrides.items():
+                entry[name] = _number(item, f"clients.{client}.{name}", 1 if name != "rate" else 0)
+            config["clients"][client] = entry
+    return config
+
+
+def default_rate_limits() -> Dict[str, Any]:
+    """SHELL_HELPER_RATE_LIMITS 的設定；格式錯誤時使用預設值"""
+    raw = os.environ.get(RATE_LIMITS_ENV)
+    if not raw:
+        return resolve_rate_limits(None)
+    try:
+        return resolve_rate_limits(json.loads(raw))
+    except (ValueError, TypeError):
+        return resolve_rate_limits(None)
+
+
+class TokenBucket:
+    """每秒補充 rate 個 token、最多 burst 個的 token bucket"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now: float, cost: float = 1.0) -> float:
+        """取出 cost 個 token；成功回傳 0，不足時回傳還需等待的秒數"""
+        self.refill(now)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def reconfigure(self, rate: float, burst: float, now: float) -> None:
+        self.refill(now)
+        self.rate = rate
+        self.burst = burst
+        self.tokens = min(self.tokens, burst)
+
+
+class FairScheduler:
+    """以加權輪流方式分配執行名額
+
+    沒有排隊時直接取得名額；名額用完後各客戶端各自排隊，釋放名額時依客戶端輪流
+    取出，每個客戶端每輪最多連續取得 weight 個名額。只能在同一個事件迴圈中使用。
+    """
+
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent = max_concurrent
+        self.running = 0
+        # 有命令排隊的客戶端，依輪到的順序排列：客戶端 → (排隊中的命令, 權重)
+        self._queues: "OrderedDict[str, Tuple[Deque[asyncio.Future], int]]" = OrderedDict()
+        # 目前輪到的客戶端本輪還能取得的名額
+        self._credit = 0
+
+    def queued(self, client: Optional[str] = None) -> int:
+        if client is not None:
+            entry = self._queues.get(client)
+            return len(entry[0]) if entry else 0
+        return sum(len(queue) for queue, _ in self._queues.values())
+
+    def queued_by_client(self) -> Dict[str, int]:
+        return {client: len(queue) for client, (queue, _) in self._queues.items()}
+
+    async def acquire(self, client: str, weight: int = 1) -> None:
+        if self.running < self.max_concurrent and not self._queues:
+            self.running += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        entry = self._queues.get(client)
+        if entry is None:
+            if not self._queues:
+                self._credit = weight
+            self._queues[client] = (deque([future]), weight)
+        else:
+            entry[0].append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已分配名額後才被取消，交給下一個命令
+                self.release()
+            else:
+                self._remove(client, future)
+            raise
+
+    def _remove(self, client: str, future: asyncio.Future) -> None:
+        entry = self._queues.get(client)
+        if entry is None:
+            return
+        try:
+            entry[0].remove(future)
+        except ValueError:
+            return
+        if not entry[0]:
+            self._drop(client)
+
+    def _drop(self, client: str) -> None:
+        """移除沒有排隊命令的客戶端；若正輪到它，下一個客戶端從完整的權重開始"""
+        first = next(iter(self._queues))
+        del self._queues[client]
+        if client == first and self._queues:
+            self._credit = next(iter(self._queues.values()))[1]
+
+    def release(self) -> None:
+        self.running -= 1
+        self._dispatch()
+
+    def resize(self, max_concurrent: int) -> None:
+        self.max_concurrent = max_concurrent
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self.running < self.max_concurrent and self._queues:
+            client, (queue, weight) = next(iter(self._queues.items()))
+            future = queue.popleft()
+            self._credit -= 1
+            if not queue:
+                self._drop(client)
+            elif self._credit <= 0:
+                # 本輪名額用完，換下一個客戶端
+                self._queues.move_to_end(client)
+                self._credit = next(iter(self._queues.values()))[1]
+            if future.done():
+                continue
+            self.running += 1
+            future.set_result(None)
+
+
+ADMISSIONS = REGISTRY.register(Counter(
+    "shell_admissions_total", "命令准入結果（admitted、rate_limited、queue_full）", ("client", "result")
+))
+ADMISSION_WAIT = REGISTRY.register(Histogram(
+    "shell_admission_wait_seconds", "命令等待執行名額的時間", ("client",)
+))
+
+
+class Admission:
+    """速率限制與公平排程；設定可在執行中以 configure() 更換"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, clock=time.monotonic):
+        self.clock = clock
+        self.config = config if config is not None else default_rate_limits()
+        self.scheduler = FairScheduler(self.config["max_concurrent"])
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def configure(self, config: Dict[str, Any]) -> None:
+        """套用 resolve_rate_limits 驗證過的設定；已累積的 token 不會超過新的 burst"""
+        self.config = config
+        now = self.clock()
+        for client, bucket in list(self._buckets.items()):
+            rate, burst, _ = self._limits(client)
+            if rate > 0:
+                bucket.reconfigure(rate, burst, now)
+            else:
+                del self._buckets[client]
+        self.scheduler.resize(config["max_concurrent"])
+
+    def identity(self, client: ClientInfo) -> str:
+        return client.identity(self.config["identity"])
+
+    def _limits(self, client: str) -> Tuple[float, float, int]:
+        overrides = self.config["clients"].get(client, {})
+        return (
+            overrides.get("rate", self.config["rate"]),
+            overrides.get("burst", self.config["burst"]),
+            int(overrides.get("weight", 1)),
+        )
+
+    def _label(self, client: str) -> str:
+        return client if client in self.config["clients"] else DEFAULT_CLIENT_LABEL
+
+    def _take_token(self, client: str, rate: float, burst: float) -> float:
+        now = self.clock()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(rate, burst, now)
+            while len(self._buckets) > MAX_CLIENTS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+        return bucket.take(now)
+
+    @asynccontextmanager
+    async def admit(self, client: Optional[ClientInfo] = None):
+        """取得執行名額；超過速率限制或排隊已滿時拋出 RateLimited
+
+        用法：
+            async with ADMISSION.admit(CURRENT_CLIENT.get()):
+                ...執行命令...
+        """
+        identity = self.identity(client or CURRENT_CLIENT.get())
+        label = self._label(identity)
+        rate, burst, weight = self._limits(identity)
+        if self.scheduler.queued(identity) >= self.config["max_queued"]:
+            ADMISSIONS.labels(label, "queue_full").inc()
+            raise RateLimited(identity, "queue", 1 / rate if rate > 0 else 1.0)
+        if rate > 0:
+            wait = self._take_token(identity, rate, burst)
+            if wait > 0:
+                ADMISSIONS.labels(label, "rate_limited").inc()
+                raise RateLimited(identity, "rate", wait)
+
+        started = time.perf_counter()
+        await self.scheduler.acquire(identity, weight)
+        ADMISSION_WAIT.labels(label).observe(time.perf_counter() - started)
+        ADMISSIONS.labels(label, "admitted").inc()
+        try:
+            yield identity
+        finally:
+            self.scheduler.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """目前的設定、執行中與排隊中的命令數，以及各客戶端剩餘的 token"""
+        now = self.clock()
+        tokens = {}
+        for client, bucket in self._buckets.items():
+            bucket.refill(now)
+            tokens[client] = round(bucket.tokens, 3)
+        return {
+            "config": self.config,
+            "running": self.scheduler.running,
+            "queued": self.scheduler.queued_by_client(),
+            "tokens": tokens,
+        }
+
+
+ADMISSION = Admission()
+
+REGISTRY.register(Gauge("shell_commands_queued", "等待執行名額的命令數",
+                        func=lambda: ADMISSION.scheduler.queued()))
+REGISTRY.register(Gauge("shell_max_concurrent_commands", "同時執行的命令數上限",
+                        func=lambda: ADMISSION.config["max_concurrent"]))
+REGISTRY.register(Gauge("shell_rate_limit_per_second", "每個客戶端每秒可啟動的命令數（0 為不限制）",
+                        func=lambda: ADMISSION.config["rate"]))
+REGISTRY.register(Gauge("shell_rate_limit_burst", "每個客戶端可累積的命令數",
+                        func=lambda: ADMISSION.config["burst"]))
+REGISTRY.register(Gauge("shell_rate_limit_clients", "有 token bucket 的客戶端數",
+                        func=lambda: len(ADMISSION._buckets)))
@@ -1,6 +1,17 @@
+import asyncio
 import platform
-import subprocess
+import shlex
+from typing import Any, Dict, List, Optional, Union
 from fastapi import HTTPException
+from .metrics import CommandTimer
+from .output_compaction import CompactionError, compact_output, resolve_compaction
+from .accounting import abort_command, command_pattern, finish_command
+from .admission import ADMISSION, CURRENT_CLIENT, RateLimited
+from .profiling import phase
+from .command_line import launch_command
+from .sandbox import SandboxError, open_sandbox, resolve_limits
+from .tracing import TRACE_COMMAND_LENGTH, start_span
+from .table_parser import parse_tables
 
 class ShellAgent:
     def get_platform(self) -> str:
@@ -12,38 +23,100 @@ class ShellAgent:
             return "*nix"
         return "Unknown"
 
-    async def execute_command(self, platform: str, shell_command: str) -> dict:
-        """執行 shell 命令"""
+    async def execute_command(self, platform: str, shell_command: Optional[str] = None,
+                              output_format: str = "text", argv: Optional[List[str]] = None,
+                              compact: Union[None, bool, Dict[str, Any]] = None,
+                              limits: Optional[Dict[str, Any]] = None) -> dict:
+        """執行 shell 命令
+
+        提供 argv 時不經過 shell 直接執行；不含 shell 語法的簡單命令也會自動直接執行。
+        output_format 為 "table" 時，在伺服器端一次解析輸出中的表格
+        （Format-Table 固定寬度表格或 JSON 輸出），以 tables 欄位回傳。
+        提供 compact 時精簡輸出與錯誤輸出（見 api/output_compaction.py），
+        統計以 compaction 欄位回傳；預設回傳完整輸出。
+        執行時間、CPU 時間、最大 RSS 與讀寫位元組數以 usage 欄位回傳（見 api/accounting.py）；
+        提供 limits（或設定 SHELL_HELPER_LIMITS）時在資源限制下執行（見 api/sandbox.py）。
+        執行前經過目前客戶端的速率限制與公平排程（見 api/admission.py），超過限制時回應 429。
+        """
         if platform not in ["Windows", "*nix"]:
             raise HTTPException(status_code=400, detail="不支援的作業系統平台")
-
-        args = ['powershell', '-Command', shell_command] if platform == "Windows" else shell_command
+        try:
+            # 在啟動命令前驗證，設定無效時不執行命令
+            options = resolve_compaction(compact, default_enabled=False)
+        except CompactionError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        try:
+            sandbox = open_sandbox(resolve_limits(limits))
+        except SandboxError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
         try:
-            process = subprocess.Popen(
-                args,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-
-            result = []
-            while True:
-                output = process.stdout.readline()
-                if output == '' and process.poll() is not None:
-                    break
-                if output:
-                    result.append(output)
-
-            error = process.stderr.read()
-            return_code = process.wait()
-
-            return {
-                "output": "".join(result),
-                "error": error if error else None,
-                "return_code": return_code
-            }
-
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+            async with ADMISSION.admit(CURRENT_CLIENT.get()):
+                # 命令在工作執行緒中執行，不阻塞事件迴圈與其他客戶端的請求
+                return await asyncio.to_thread(self._run_command, platform, shell_command, output_format,
+                                               argv, options, sandbox)
+        except RateLimited as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": e.retry_after_header})
+        finally:
+            if sandbox:
+                sandbox.close()
+
+    def _run_command(self, platform: str, shell_command: Optional[str], output_format: str,
+                     argv: Optional[List[str]], options: Optional[Dict[str, Any]], sandbox) -> dict:
+        """啟動命令、讀取輸出並組成回應；options 為 resolve_compaction 的結果，sandbox 為 None 時不限制資源"""
+        command_text = shlex.join(argv) if argv else shell_command
+        attributes = {"shell.platform": platform, "shell.command": command_text[:TRACE_COMMAND_LENGTH]}
+        with start_span("subprocess", attributes=attributes) as span:
+            timer = CommandTimer("api")
+            process = None
+            try:
+                with phase("spawn"):
+                    process, mode = launch_command(platform, shell_command, argv,
+                                                   sandbox)
+                timer.spawned()
+                span.set_attribute("process.pid", process.pid)
+                span.set_attribute("process.launch", mode)
+
+                result = []
+                with phase("read"):
+                    while True:
+                        output = process.stdout.readline()
+                        if output == '':
+                            break
+                        timer.first_byte()
+                        result.append(output)
+
+                with phase("wait"):
+                    error = process.stderr.read()
+                    return_code, usage = finish_command(process, timer.start,
+                                                        command_pattern(shell_command, argv), sandbox)
+
+                with phase("build"):
+                    output = "".join(result)
+                    output_bytes = len(output.encode("utf-8"))
+                    timer.finish("success" if return_code == 0 else "failure", output_bytes)
+                    span.set_attribute("process.exit_code", return_code)
+                    span.set_attribute("process.output_bytes", output_bytes)
+                    response = {
+                        "output": output,
+                        "error": error if error else None,
+                        "return_code": return_code,
+                        "usage": usage
+                    }
+                if output_format == "table":
+                    with phase("parse_tables"):
+                        response["tables"] = parse_tables(output)
+                if options is not None:
+                    with phase("compact"):
+                        response["output"], response["compaction"] = compact_output(output, options)
+                        if error:
+                            response["error"], _ = compact_output(error, options)
+                return response
+
+            except Exception as e:
+                timer.finish("error")
+                if process is not None:
+                    # 結束並回收命令後才釋放沙箱與執行名額
+                    abort_command(process)
+                raise HTTPException(status_code=500, detail=str(e))
+
@@ -0,0 +1,94 @@
+"""
+命令列啟動方式
+
+*nix 平台的命令預設經由 /bin/sh -c 執行。不含任何 shell 語法的簡單命令（例如
+`uname -a`、`ls -la /tmp`）以 shlex 拆成 argv 後直接執行，省去啟動 shell 的成本；
+呼叫端也可以直接提供 argv。Windows 平台直接啟動 powershell，不再多經過一層 cmd。
+"""
+import os
+import shlex
+import subprocess
+from typing import List, Optional, Tuple, Union
+
+from .spawner import spawn_command
+
+# 設為 0 時停用簡單命令的自動偵測（明確提供的 argv 仍直接執行）
+EXEC_FASTPATH_ENV = "SHELL_HELPER_EXEC_FASTPATH"
+
+# 出現任何一個字元就交給 shell：管線、重新導向、變數與命令替換、跳脫、萬用字元、註解等
+SHELL_CHARACTERS = frozenset("|&;<>()$`\\*?[]{}~#!\n")
+
+# shell 內建命令或行為與同名執行檔不同的命令；echo、printf、kill、pwd、test 雖然有同名
+# 執行檔，但選項與跳脫字元的處理不同（例如 dash 的 echo 不接受 -e）
+SHELL_BUILTINS = frozenset({
+    ".", ":", "[", "alias", "bg", "break", "cd", "command", "continue", "echo", "eval", "exec", "exit",
+    "export", "fg", "getopts", "hash", "jobs", "kill", "local", "printf", "pwd", "read", "readonly",
+    "return", "set", "shift", "source", "test", "times", "trap", "type", "ulimit", "umask", "unalias",
+    "unset", "wait",
+})
+
+
+def fastpath_enabled() -> bool:
+    return os.environ.get(EXEC_FASTPATH_ENV, "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def split_simple_command(command: str) -> Optional[List[str]]:
+    """命令不需要 shell 時回傳拆分後的 argv，否則回傳 None
+
+    只接受由一般字詞與引號組成的單一命令；含有 shell 語法、環境變數指派
+    （FOO=1 cmd）或 shell 內建命令時一律交給 shell 處理，確保結果與 sh -c 相同。
+    """
+    if not command or not SHELL_CHARACTERS.isdisjoint(command):
+        return None
+    try:
+        argv = shlex.split(command, posix=True)
+    except ValueError:
+        # 引號未成對，交給 shell 回報錯誤
+        return None
+    if not argv or "=" in argv[0] or argv[0] in SHELL_BUILTINS:
+        return None
+    return argv
+
+
+def _spawn(args: Union[str, List[str]], shell: bool, sandbox=None):
+    """啟動命令；有 sandbox 時以 /bin/sh 包裝命令，在 exec 前套用限制（見 api/sandbox.py）"""
+    if sandbox is not None:
+        args, shell = sandbox.command(args, shell)
+    return spawn_command(args, shell=shell)
+
+
+def _spawn_or_report(args: List[str]):
+    """直接執行 args；找不到執行檔時（例如在 *nix 主機上指定 Windows 平台）改由 shell
+    執行，由 shell 回報錯誤並回傳 127，與 *nix 平台找不到命令時的結果相同"""
+    try:
+        return spawn_command(args, shell=False)
+    except OSError:
+        command = subprocess.list2cmdline(args) if os.name == "nt" else shlex.join(args)
+        return spawn_command(command, shell=True)
+
+
+def launch_command(platform: str, shell_command: Optional[str] = None,
+                   argv: Optional[List[str]] = None,
+                   sandbox=None) -> Tuple[object, str]:
+    """依平台啟動命令，回傳 (process, mode)
+
+    mode 為 "exec"（直接執行 argv）或 "shell"（經由 shell 或 powershell 執行）。
+    直接執行失敗（例如找不到執行檔）時改由 shell 執行，讓錯誤訊息與返回碼
+    （127）與原本相同；Windows 平台找不到 powershell 時也一樣。提供 sandbox 時在
+    資源限制下執行（見 api/sandbox.py）。
+    """
+    if platform == "Windows":
+        if argv:
+            return _spawn_or_report(argv), "exec"
+        return _spawn_or_report(['powershell', '-Command', shell_command]), "shell"
+
+    if argv:
+        shell_command = shlex.join(argv)
+    elif fastpath_enabled():
+        argv = split_simple_command(shell_command)
+    if argv:
+        try:
+            return _spawn(argv, False, sandbox), "exec"
+        except OSError:
+            pass
+    return _spawn(shell_command, True, sandbox), "shell"
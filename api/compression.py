@@ -0,0 +1,199 @@
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import zstandard
+except ImportError:  # zstandard 為選用套件，未安裝時只提供 gzip
+    zstandard = None
+
+# 依偏好順序排列的支援編碼
+SUPPORTED_ENCODINGS: List[str] = (["zstd"] if zstandard is not None else []) + ["gzip"]
+
+# 小於此大小（位元組）的完整回應不壓縮
+DEFAULT_MINIMUM_SIZE = 1024
+
+# 不壓縮的狀態碼：206 的內容是未壓縮表示的位元組範圍，304 沒有內容
+PASSTHROUGH_STATUS = (206, 304)
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """依 Accept-Encoding 標頭選出要使用的壓縮編碼
+
+    Args:
+        accept_encoding: 客戶端送出的 Accept-Encoding 標頭
+
+    Returns:
+        選用的編碼名稱，沒有可用編碼時回傳 None
+    """
+    if not accept_encoding:
+        return None
+
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        weights[name] = quality
+
+    candidates: List[Tuple[float, int, str]] = []
+    for index, encoding in enumerate(SUPPORTED_ENCODINGS):
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > 0:
+            candidates.append((quality, -index, encoding))
+
+    if not candidates:
+        return None
+    return max(candidates)[2]
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """以指定編碼一次壓縮完整資料"""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if encoding == "gzip":
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress(data) + compressor.flush()
+    raise ValueError(f"不支援的壓縮編碼: {encoding}")
+
+
+class StreamCompressor:
+    """串流壓縮器，每個區塊都會 flush，讓客戶端能即時解碼已送出的內容"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        elif encoding == "gzip":
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        else:
+            raise ValueError(f"不支援的壓縮編碼: {encoding}")
+
+    def compress(self, chunk: bytes) -> bytes:
+        """壓縮一個區塊並 flush"""
+        if self.encoding == "zstd":
+            return self._compressor.compress(chunk) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        """結束串流並取得剩餘資料"""
+        return self._compressor.flush()
+
+
+class CompressionMiddleware:
+    """依 Accept-Encoding 協商 zstd/gzip 壓縮的 ASGI 中介層
+
+    - 完整回應小於 minimum_size 時不壓縮
+    - 分塊（串流）回應逐塊壓縮並 flush，不會延遲 SSE 事件
+    - 已帶有 Content-Encoding 的回應（例如預先壓縮的內容）原樣送出
+    - 206/304 與帶有 Content-Range 的回應原樣送出，範圍是以未壓縮內容計算的位元組
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = DEFAULT_MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(encoding, self.minimum_size, send)
+        await self.app(scope, receive, responder)
+
+
+class _CompressionResponder:
+    """攔截單一回應的 send 呼叫並進行壓縮"""
+
+    def __init__(self, encoding: str, minimum_size: int, send: Send):
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send = send
+        self.start_message: Optional[Message] = None
+        self.passthrough = False
+        self.compressor: Optional[StreamCompressor] = None
+
+    async def __call__(self, message: Message) -> None:
+        message_type = message["type"]
+
+        if message_type == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            self.passthrough = (
+                message["status"] in PASSTHROUGH_STATUS
+                or "content-encoding" in headers
+                or "content-range" in headers
+            )
+            return
+
+        if message_type != "http.response.body":
+            await self.send(message)
+            return
+
+        if self.start_message is not None:
+            start_message, self.start_message = self.start_message, None
+            await self._start(start_message, message)
+            return
+
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        data = self.compressor.compress(body) if body else b""
+        if not more_body:
+            data += self.compressor.finish()
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    async def _start(self, start_message: Message, message: Message) -> None:
+        """依第一個 body 訊息決定整體或串流壓縮"""
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.passthrough or (not more_body and len(body) < self.minimum_size):
+            self.passthrough = True
+            await self.send(start_message)
+            await self.send(message)
+            return
+
+        headers = MutableHeaders(raw=start_message["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+
+        if not more_body:
+            data = compress(body, self.encoding)
+            headers["Content-Length"] = str(len(data))
+            await self.send(start_message)
+            await self.send({"type": "http.response.body", "body": data})
+            return
+
+        # 串流回應：長度未知，改用分塊傳輸
+        if "content-length" in headers:
+            del headers["Content-Length"]
+        self.compressor = StreamCompressor(self.encoding)
+        await self.send(start_message)
+        await self.send({
+            "type": "http.response.body",
+            "body": self.compressor.compress(body) if body else b"",
+            "more_body": True
+        })
@@ -0,0 +1,189 @@
+"""
+MCP 客戶端共用的 HTTP 連線池
+
+所有 SSE MCP 伺服器共用同一個 httpx.AsyncClient：keep-alive 連線在多次工具呼叫間重複
+使用，安裝 h2 套件時以 HTTP/2 在同一條連線上同時送出多個請求（https 伺服器以 ALPN
+協商，明文 http 仍使用 HTTP/1.1）。每台主機同時進行的請求數有上限，避免少數伺服器
+佔滿連線池；暫時性的失敗以指數退避重試。
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支援需要 h2 套件
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 每台主機同時進行的請求數上限
+MAX_PER_HOST_ENV = "SHELL_HELPER_HTTP_MAX_PER_HOST"
+DEFAULT_MAX_PER_HOST = 8
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE = 32
+KEEPALIVE_EXPIRY = 60.0
+
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.2
+MAX_BACKOFF = 5.0
+
+# 伺服器明確表示沒有處理請求的狀態碼，任何請求都可以重試
+RETRY_STATUS = frozenset({429, 503})
+# 請求可能已被處理的狀態碼，只重試不會改變狀態的 JSON-RPC 方法
+IDEMPOTENT_RETRY_STATUS = frozenset({502, 504})
+IDEMPOTENT_METHODS = frozenset({"initialize", "tools/list", "ping", "resources/list", "prompts/list"})
+
+# 請求還沒送出就失敗（例如無法建立連線），任何請求都可以重試
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# 請求可能已送出（伺服器可能已執行命令），只重試冪等的方法
+MAYBE_SENT_ERRORS = (httpx.ReadError, httpx.ReadTimeout, httpx.RemoteProtocolError, httpx.WriteError)
+
+
+def _max_per_host_from_env() -> int:
+    try:
+        return max(1, int(os.environ.get(MAX_PER_HOST_ENV, DEFAULT_MAX_PER_HOST)))
+    except ValueError:
+        return DEFAULT_MAX_PER_HOST
+
+
+class HTTPPool:
+    """多個 MCP 伺服器共用的 HTTP 連線池
+
+    Args:
+        http2: 是否使用 HTTP/2；None 表示安裝 h2 時自動啟用
+        max_per_host: 每台主機同時進行的請求數上限
+        retries: 暫時性失敗的重試次數
+        backoff: 第一次重試前的等待秒數，之後每次加倍（加上隨機抖動）
+        transport: 自訂的 httpx transport（例如測試用的 MockTransport）
+        uds: 經由此 Unix domain socket 連線（URL 的主機名稱只用於 Host 標頭）
+    """
+
+    def __init__(self, http2: Optional[bool] = None, max_per_host: Optional[int] = None,
+                 max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 max_keepalive: int = DEFAULT_MAX_KEEPALIVE,
+                 timeout: float = 30.0, retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF,
+                 transport: Optional[httpx.AsyncBaseTransport] = None, uds: Optional[str] = None):
+        if http2 and not HTTP2_AVAILABLE:
+            logger.warning("未安裝 h2 套件，改用 HTTP/1.1（pip install 'httpx[http2]'）")
+        self.http2 = HTTP2_AVAILABLE if http2 is None else (http2 and HTTP2_AVAILABLE)
+        self.max_per_host = max_per_host or _max_per_host_from_env()
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=KEEPALIVE_EXPIRY
+        )
+        self.timeout = httpx.Timeout(timeout, connect=10.0)
+        self.retries = retries
+        self.backoff = backoff
+        self.uds = uds
+        self.transport = transport
+        self.retried = 0
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """共用的 httpx.AsyncClient，第一次使用時建立"""
+        if self._client is None or self._client.is_closed:
+            transport = self.transport
+            if transport is None and self.uds:
+                # 自訂 transport 時 AsyncClient 不會套用 limits，需在 transport 上設定
+                transport = httpx.AsyncHTTPTransport(uds=self.uds, http2=self.http2, limits=self.limits)
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=self.limits,
+                timeout=self.timeout,
+                transport=transport,
+                headers={"Content-Type": "application/json", "Accept": "application/json"}
+            )
+        return self._client
+
+    def _slots(self, url: str) -> asyncio.Semaphore:
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc}"
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.max_per_host)
+        return self._host_slots[host]
+
+    def _delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        if response is not None and "retry-after" in response.headers:
+            try:
+                return min(float(response.headers["retry-after"]), MAX_BACKOFF)
+            except ValueError:
+                pass
+        delay = min(self.backoff * (2 ** attempt), MAX_BACKOFF)
+        return delay * (0.5 + random.random() / 2)
+
+    async def post_json(self, url: str, payload: Any,
+                        headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """POST 一個 JSON-RPC 請求（或批次），暫時性失敗時以指數退避重試
+
+        無法建立連線、429 與 503 一律重試；請求可能已被伺服器處理的失敗
+        （讀取逾時、連線中斷、502、504）只重試 IDEMPOTENT_METHODS，
+        避免同一個 shell 命令被執行兩次。
+        """
+        async with self._slots(url):
+            return await self._send("POST", url, payload, headers, stream=False)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, payload: Any = None,
+                     headers: Optional[Dict[str, str]] = None) -> AsyncIterator[httpx.Response]:
+        """送出請求並以串流讀取回應（例如 SSE），重試規則與 post_json 相同
+
+        開始讀取回應本文後不再重試；讀取期間佔用該主機的一個請求名額。
+        """
+        async with self._slots(url):
+            response = await self._send(method, url, payload, headers, stream=True)
+            try:
+                yield response
+            finally:
+                await response.aclose()
+
+    async def _send(self, method: str, url: str, payload: Any,
+                    headers: Optional[Dict[str, str]], stream: bool) -> httpx.Response:
+        messages = payload if isinstance(payload, list) else [payload]
+        # 沒有本文的請求（GET、DELETE）與只含冪等方法的請求可以安全重送
+        idempotent = payload is None or all(
+            isinstance(message, dict) and message.get("method") in IDEMPOTENT_METHODS for message in messages)
+        content = None if payload is None else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        attempt = 0
+        while True:
+            response = None
+            try:
+                request = self.client.build_request(method, url, content=content, headers=headers)
+                response = await self.client.send(request, stream=stream)
+                retry = response.status_code in RETRY_STATUS or (
+                    idempotent and response.status_code in IDEMPOTENT_RETRY_STATUS)
+                if not retry or attempt >= self.retries:
+                    return response
+                if stream:
+                    await response.aclose()
+            except NOT_SENT_ERRORS:
+                if attempt >= self.retries:
+                    raise
+            except MAYBE_SENT_ERRORS:
+                if not idempotent or attempt >= self.retries:
+                    raise
+            delay = self._delay(attempt, response)
+            attempt += 1
+            self.retried += 1
+            logger.debug("重試 %s %s（第 %d 次，%.2f 秒後）", method, url, attempt, delay)
+            await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# 所有 SSEMCPClient 預設共用的連線池
+SHARED_POOL = HTTPPool()
@@ -0,0 +1,87 @@
+"""
+以 Unix domain socket 提供服務
+
+同一台機器上的代理程式經由 Unix domain socket 連線，省去 TCP/IP 堆疊的處理，也不必
+佔用任何埠號。socket 檔案權限為 0600，只有啟動伺服器的使用者可以連線執行命令
+（uvicorn 的 --uds 預設為 0666，任何本機使用者都能連線，因此不直接使用）。
+"""
+import argparse
+import os
+import signal
+import socket
+import stat
+import sys
+from typing import Optional
+
+UDS_ENV = "SHELL_HELPER_UDS"
+UDS_MODE = 0o600
+
+
+def _remove_stale_socket(path: str) -> None:
+    """移除前一次執行留下的 socket 檔案；仍有伺服器在監聽時拒絕啟動"""
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise OSError(f"{path} 已存在且不是 socket 檔案")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(path)
+            return
+    raise OSError(f"{path} 已有伺服器在監聽")
+
+
+def bind_unix_socket(path: str, mode: int = UDS_MODE, backlog: int = 2048) -> socket.socket:
+    """建立並監聽 Unix domain socket，建立時即套用 mode，不會有短暫可被他人連線的時間"""
+    _remove_stale_socket(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o777 & ~mode)
+    try:
+        sock.bind(path)
+    except OSError:
+        sock.close()
+        raise
+    finally:
+        os.umask(old_umask)
+    os.chmod(path, mode)
+    sock.listen(backlog)
+    return sock
+
+
+def add_listen_arguments(parser: argparse.ArgumentParser, port: int = 8000) -> None:
+    """加入 --host、--port 與 --uds 參數"""
+    parser.add_argument("--host", default="0.0.0.0", help="TCP 監聽位址（預設：0.0.0.0）")
+    parser.add_argument("--port", type=int, default=port, help=f"TCP 埠號（預設：{port}）")
+    parser.add_argument("--uds", default=os.environ.get(UDS_ENV),
+                        help=f"改為監聽此 Unix domain socket 路徑（環境變數：{UDS_ENV}）")
+
+
+def _exit_on_sigterm(signum, frame):
+    sys.exit(0)
+
+
+def serve(app, host: str = "0.0.0.0", port: int = 8000, uds: Optional[str] = None, **kwargs) -> None:
+    """以 uvicorn 啟動 app；指定 uds 時監聽 Unix domain socket，結束時移除 socket 檔案
+
+    app 可以是應用程式物件或 "module:attribute" 字串（reload=True 時必須是字串）。
+    """
+    import uvicorn
+
+    if not uds:
+        uvicorn.run(app, host=host, port=port, **kwargs)
+        return
+
+    sock = bind_unix_socket(uds)
+    # uvicorn 結束時會重新送出收到的 SIGTERM；改為 SystemExit 才會執行下面的清理
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    try:
+        uvicorn.run(app, fd=sock.fileno(), **kwargs)
+    finally:
+        sock.close()
+        try:
+            os.unlink(uds)
+        except FileNotFoundError:
+            pass
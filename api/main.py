@@ -1,55 +1,184 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import HTMLResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+from fastapi import Body, FastAPI, Header, HTTPException, Query
+from fastapi.responses import HTMLResponse, Response
 from starlette.requests import Request
-import aiofiles
 import os
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from pathlib import Path
+from typing import Any, Dict, Literal, Optional
+from .accounting import SORT_KEYS, USAGE
+from .admission import (
+    ADMIN_TOKEN_HEADER, ADMISSION, AdmissionError, ClientIdentityMiddleware, admin_allowed, resolve_rate_limits
+)
 from .agent import ShellAgent
-from .models import ShellCommand, ShellResponse, PlatformResponse
+from .models import ShellCommand, ShellResponse, PlatformResponse, QuickResponse
+from .responses import FastJSONResponse
+from .compression import CompressionMiddleware, DEFAULT_MINIMUM_SIZE, choose_encoding
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY, MetricsMiddleware
+from .profiling import PROFILES, ProfilingMiddleware, checkpoint
+from .tracing import TracingMiddleware
+from .results_cache import ResultsFileCache, is_not_modified, parse_byte_range
+from .results_store import ResultsStore, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from .results_watcher import ResultsWatcher
+from .spawner import start_spawner, stop_spawner
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 使用 forkserver 時於啟動時建立輔助行程（SHELL_HELPER_SPAWNER=forkserver）
+    start_spawner()
+    yield
+    stop_spawner()
 
 app = FastAPI(
     title="Shell Helper API",
     description="提供跨平台執行 shell 命令的 API 服務",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# 依 Accept-Encoding 協商壓縮回應（zstd/gzip）
+app.add_middleware(CompressionMiddleware, minimum_size=DEFAULT_MINIMUM_SIZE)
+# 選擇性剖析 /execute 與 /quick（X-Profile 標頭或 SHELL_HELPER_PROFILE 環境變數）
+app.add_middleware(ProfilingMiddleware)
+# 記錄各端點的請求數與處理時間（最外層，包含壓縮時間）
+app.add_middleware(MetricsMiddleware)
+# 依 traceparent 標頭延續呼叫端的追蹤（設定 OTEL_EXPORTER_OTLP_ENDPOINT 或 SHELL_HELPER_TRACE_FILE 時啟用）
+app.add_middleware(TracingMiddleware)
+# 識別客戶端（API 金鑰或來源位址），供速率限制與公平排程使用
+app.add_middleware(ClientIdentityMiddleware)
+
 # 設定靜態文件和模板目錄
 BASE_DIR = Path(__file__).resolve().parent
-app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
-templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
+
+
+class LazyStaticFiles:
+    """第一次請求時才建立 StaticFiles，只使用 API 時不需要載入"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._app = None
+
+    async def __call__(self, scope, receive, send):
+        if self._app is None:
+            from starlette.staticfiles import StaticFiles
+            self._app = StaticFiles(directory=self.directory)
+        await self._app(scope, receive, send)
+
+
+@lru_cache(maxsize=None)
+def get_templates():
+    """儀表板模板（第一次使用時才載入 Jinja2）"""
+    from fastapi.templating import Jinja2Templates
+    return Jinja2Templates(directory=str(BASE_DIR / "templates"))
+
+
+app.mount("/static", LazyStaticFiles(str(BASE_DIR / "static")), name="static")
 
 # 測試結果文件路徑（位於專案根目錄）
 TEST_RESULTS_FILE = BASE_DIR.parent / "quick_endpoint_test_results.md"
+test_results_cache = ResultsFileCache(TEST_RESULTS_FILE)
+
+# 結構化的監控結果資料庫（由 test_quick_endpoint.py 寫入）
+RESULTS_DB_FILE = BASE_DIR.parent / "quick_endpoint_results.db"
+results_store = ResultsStore(RESULTS_DB_FILE)
+# 所有儀表板連線共用的結果監看器
+results_watcher = ResultsWatcher(results_store)
 
 shell_agent = ShellAgent()
 
-@app.get("/platform", response_model=PlatformResponse)
+# 以下端點的結果皆由伺服器內部產生，使用 model_construct 建立模型並直接
+# 回傳 FastJSONResponse，略過 response_model 的重複驗證與序列化
+@app.get("/platform", response_model=PlatformResponse, response_class=FastJSONResponse)
 async def get_platform():
     """取得作業系統平台資訊"""
-    return {"platform": shell_agent.get_platform()}
+    return FastJSONResponse(PlatformResponse.model_construct(platform=shell_agent.get_platform()))
 
-@app.post("/execute", response_model=ShellResponse)
+@app.post("/execute", response_model=ShellResponse, response_class=FastJSONResponse)
 async def execute_command(command: ShellCommand):
     """執行 shell 命令"""
-    return await shell_agent.execute_command(command.platform, command.shell_command)
+    checkpoint("validate")
+    result = await shell_agent.execute_command(command.platform, command.shell_command,
+                                               command.output_format, command.argv, command.compact,
+                                               command.limits)
+    return FastJSONResponse(ShellResponse.model_construct(**result))
 
-@app.post("/quick")
+@app.post("/quick", response_model=QuickResponse, response_class=FastJSONResponse)
 async def quick_execute(command: ShellCommand):
     """同時取得平台並執行命令，回傳平台與執行結果"""
+    checkpoint("validate")
     platform = command.platform or shell_agent.get_platform()
-    result = await shell_agent.execute_command(platform, command.shell_command)
-    return {"platform": platform, "result": result}
+    result = await shell_agent.execute_command(platform, command.shell_command,
+                                               command.output_format, command.argv, command.compact,
+                                               command.limits)
+    return FastJSONResponse(QuickResponse.model_construct(
+        platform=platform,
+        result=ShellResponse.model_construct(**result)
+    ))
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 文字格式的執行指標"""
+    return Response(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/debug/profiles")
+async def list_profiles(limit: int = Query(50, ge=1, le=200)):
+    """最近的請求剖析摘要（各階段耗時）"""
+    return FastJSONResponse(PROFILES.recent(limit))
+
+@app.get("/debug/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: Literal["json", "text"] = "json"):
+    """單一請求的剖析結果；format=text 只回傳呼叫追蹤文字"""
+    profile = PROFILES.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="找不到剖析結果")
+    if format == "text":
+        return Response(profile.trace or "", media_type="text/plain; charset=utf-8")
+    return FastJSONResponse(profile.as_dict())
+
+@app.get("/debug/usage")
+async def command_usage(
+    sort: str = Query("cpu", pattern="^(" + "|".join(SORT_KEYS) + ")$", description="排序方式"),
+    limit: int = Query(20, ge=1, le=500)
+):
+    """最近一段時間內各命令樣式的資源用量，找出成本最高的命令"""
+    return FastJSONResponse({"window_s": USAGE.window, "patterns": USAGE.summary(sort, limit)})
+
+@app.get("/admin/rate-limits")
+async def get_rate_limits():
+    """目前的速率限制設定、執行中與排隊中的命令數"""
+    return FastJSONResponse(ADMISSION.snapshot())
+
+@app.patch("/admin/rate-limits")
+async def update_rate_limits(changes: Dict[str, Any] = Body(...),
+                             admin_token: Optional[str] = Header(None, alias=ADMIN_TOKEN_HEADER)):
+    """修改速率限制設定；只更新請求中提供的欄位，需要 X-Admin-Token（SHELL_HELPER_ADMIN_TOKEN）"""
+    if not admin_allowed(admin_token):
+        raise HTTPException(status_code=403, detail="需要有效的管理權杖")
+    try:
+        ADMISSION.configure(resolve_rate_limits(changes, ADMISSION.config))
+    except AdmissionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(ADMISSION.snapshot())
 
 @app.get("/dashboard", response_class=HTMLResponse)
 async def dashboard(request: Request):
     """儀表板頁面"""
-    return templates.TemplateResponse("dashboard.html", {"request": request})
+    return get_templates().TemplateResponse("dashboard.html", {"request": request})
 
 @app.get("/api/test-results/raw")
-async def get_test_results_raw():
-    """獲取原始 Markdown 格式的測試結果"""
+async def get_test_results_raw(
+    request: Request,
+    after_offset: Optional[int] = Query(None, ge=0, description="只回傳此位元組位置之後追加的內容"),
+    generation: Optional[int] = Query(None, ge=0, description="上次回應的 generation，檔案改寫後會要求重新讀取")
+):
+    """獲取原始 Markdown 格式的測試結果
+
+    - 完整內容支援 ETag / Last-Modified 條件請求，內容未變更時回傳 304
+    - `after_offset` 模式只回傳自上次讀取後追加的內容與下一次的位置
+    - `Range: bytes=N-` 模式以 206 回傳原始 Markdown 的指定位元組範圍
+
+    增量與範圍回應的內容與完整回應不同，不帶驗證標頭，也不做條件請求判斷。
+    """
     if not TEST_RESULTS_FILE.exists():
         raise HTTPException(
             status_code=404,
@@ -57,11 +186,103 @@ async def get_test_results_raw():
         )
 
     try:
-        async with aiofiles.open(TEST_RESULTS_FILE, 'r', encoding='utf-8') as f:
-            content = await f.read()
-        return content
+        cached = await test_results_cache.load()
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"讀取測試結果文件時發生錯誤：{str(e)}"
         )
+
+    headers = {
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding"
+    }
+
+    if after_offset is not None:
+        # 檔案在上次讀取後被改寫（generation 不同），或比客戶端記錄的位置還短，需要重新讀取全部內容
+        reset = after_offset > cached.size or (generation is not None and generation != cached.generation)
+        start, data = cached.tail(0 if reset else after_offset)
+        return FastJSONResponse({
+            "offset": start,
+            "next_offset": cached.size,
+            "generation": cached.generation,
+            "reset": reset,
+            "content": data.decode("utf-8", errors="replace")
+        }, headers=headers)
+
+    try:
+        byte_range = parse_byte_range(request.headers.get("range"), cached.size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{cached.size}"})
+    if byte_range is not None:
+        start, end = byte_range
+        return Response(
+            content=cached.data[start:end + 1],
+            status_code=206,
+            media_type="text/markdown; charset=utf-8",
+            headers={**headers, "Content-Range": f"bytes {start}-{end}/{cached.size}"}
+        )
+
+    headers.update({"ETag": cached.etag, "Last-Modified": cached.last_modified})
+    if is_not_modified(request.headers, cached):
+        return Response(status_code=304, headers=headers)
+
+    # 使用快取的預先壓縮副本，CompressionMiddleware 不會重複壓縮
+    encoding = None
+    if len(cached.body) >= DEFAULT_MINIMUM_SIZE:
+        encoding = choose_encoding(request.headers.get("accept-encoding"))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(
+        content=cached.encoded(encoding),
+        media_type="application/json",
+        headers=headers
+    )
+
+@app.get("/api/test-results")
+def list_test_results(
+    since: Optional[int] = Query(None, ge=0, description="只回傳 ID 大於此值的紀錄"),
+    before: Optional[int] = Query(None, ge=1, description="只回傳 ID 小於此值的紀錄（往前翻頁）"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="最多筆數"),
+    status: Optional[Literal["success", "failure"]] = Query(None, description="只回傳指定狀態"),
+    host: Optional[str] = Query(None, description="只回傳指定主機（host:port）的紀錄")
+):
+    """分頁查詢結構化的監控結果（由新到舊排列）"""
+    tests = results_store.query(since=since, before=before, limit=limit, status=status, host=host)
+    return FastJSONResponse({
+        "tests": tests,
+        "summary": results_store.summary(),
+        "last_id": results_store.last_id(),
+        "next_before": tests[-1]["id"] if len(tests) == limit else None
+    })
+
+@app.get("/api/test-results/hosts")
+def list_test_result_hosts():
+    """列出有監控紀錄的主機（艦隊模式）"""
+    return FastJSONResponse({"hosts": results_store.hosts()})
+
+@app.get("/api/test-results/events")
+async def test_results_events(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0, description="先補送 ID 大於此值的紀錄")
+):
+    """監控結果的 SSE 串流
+
+    連線後先補送 `since` 之後的紀錄，接著送出 `ready` 事件，之後每當有新的
+    監控結果寫入資料庫時送出 `tests` 事件。瀏覽器重新連線時會帶上
+    `Last-Event-ID`，從中斷的位置繼續。
+    """
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    queue = await results_watcher.subscribe(since)
+
+    async def event_generator():
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            results_watcher.unsubscribe(queue)
+
+    from sse_starlette.sse import EventSourceResponse
+    return EventSourceResponse(event_generator(), ping=15)
@@ -0,0 +1,133 @@
+import asyncio
+import inspect
+import json
+import sys
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# 依偏好順序排列；客戶端要求的版本不在清單中時回覆第一個（見 negotiate_protocol_version）
+SUPPORTED_PROTOCOL_VERSIONS = ("2025-06-18", "2025-03-26", "2024-11-05")
+
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+PARSE_ERROR = -32700
+
+
+def negotiate_protocol_version(requested: Any) -> str:
+    """initialize 回覆的協定版本：支援客戶端要求的版本時沿用，否則回覆最新的支援版本
+
+    stdio 與 SSE／Streamable HTTP 伺服器共用此規則，同一個客戶端在各傳輸方式協商出相同的版本。
+    """
+    return requested if requested in SUPPORTED_PROTOCOL_VERSIONS else SUPPORTED_PROTOCOL_VERSIONS[0]
+
+
+class StdioMCPServer:
+    """精簡的 MCP stdio 伺服器
+
+    只實作工具相關的方法（initialize、tools/list、tools/call、ping），不載入 mcp 套件，
+    讓每次對話都重新啟動的 stdio 伺服器能更快回應 initialize。
+    訊息格式為以換行分隔的 JSON-RPC，多個 tools/call 可同時處理。
+    """
+
+    def __init__(self, name: str, version: str = "0.1.0"):
+        self.name = name
+        self.version = version
+        self._tools: Dict[str, Tuple[Callable[..., Awaitable[Any]], Dict[str, Any]]] = {}
+
+    def tool(self, input_schema: Dict[str, Any]):
+        """註冊工具的裝飾器，以函式的 docstring 作為工具說明，回傳原函式"""
+        def decorator(func: Callable[..., Awaitable[Any]]):
+            self._tools[func.__name__] = (func, {
+                "name": func.__name__,
+                "description": inspect.cleandoc(func.__doc__ or ""),
+                "inputSchema": input_schema
+            })
+            return func
+        return decorator
+
+    async def handle(self, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """處理一個 JSON-RPC 訊息；通知（沒有 id）不回應"""
+        method = message.get("method")
+        params = message.get("params") or {}
+        if "id" not in message:
+            return None
+
+        if method == "initialize":
+            result = {
+                "protocolVersion": negotiate_protocol_version(params.get("protocolVersion")),
+                "capabilities": {"tools": {"listChanged": False}},
+                "serverInfo": {"name": self.name, "version": self.version}
+            }
+        elif method == "ping":
+            result = {}
+        elif method == "tools/list":
+            result = {"tools": [schema for _, schema in self._tools.values()]}
+        elif method == "tools/call":
+            result = await self._call_tool(params.get("name"), params.get("arguments") or {})
+        else:
+            return _error(message["id"], METHOD_NOT_FOUND, f"Method not found: {method}")
+        return {"jsonrpc": "2.0", "id": message["id"], "result": result}
+
+    async def _call_tool(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """執行工具；與 FastMCP 相同，工具的錯誤以 isError 結果回傳"""
+        if name not in self._tools:
+            return _tool_result(f"Unknown tool: {name}", is_error=True)
+        func, _ = self._tools[name]
+        try:
+            result = await func(**arguments)
+        except Exception as e:
+            return _tool_result(f"Error executing tool {name}: {e}", is_error=True)
+        return _tool_result(result if isinstance(result, str) else json.dumps(result, ensure_ascii=False))
+
+    def run(self) -> None:
+        """從 stdin 讀取訊息並將回應寫到 stdout，直到 stdin 關閉"""
+        asyncio.run(self._serve())
+
+    async def _serve(self) -> None:
+        loop = asyncio.get_running_loop()
+        lines: asyncio.Queue = asyncio.Queue()
+
+        def read_stdin():
+            # 以執行緒讀取 stdin，Windows 上的管線也能使用
+            for line in sys.stdin.buffer:
+                loop.call_soon_threadsafe(lines.put_nowait, line)
+            loop.call_soon_threadsafe(lines.put_nowait, None)
+
+        threading.Thread(target=read_stdin, name="stdin-reader", daemon=True).start()
+        tasks = set()
+        while True:
+            line = await lines.get()
+            if line is None:
+                break
+            if not line.strip():
+                continue
+            task = asyncio.create_task(self._handle_line(line))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _handle_line(self, line: bytes) -> None:
+        try:
+            message = json.loads(line)
+        except ValueError:
+            self._write(_error(None, PARSE_ERROR, "Parse error"))
+            return
+        if not isinstance(message, dict):
+            self._write(_error(None, INVALID_PARAMS, "Batch requests are not supported"))
+            return
+        response = await self.handle(message)
+        if response is not None:
+            self._write(response)
+
+    def _write(self, message: Dict[str, Any]) -> None:
+        sys.stdout.buffer.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+        sys.stdout.buffer.flush()
+
+
+def _tool_result(text: str, is_error: bool = False) -> Dict[str, Any]:
+    return {"content": [{"type": "text", "text": text}], "isError": is_error}
+
+
+def _error(request_id: Any, code: int, message: str) -> Dict[str, Any]:
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
@@ -0,0 +1,346 @@
+import bisect
+import math
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Prometheus 文字格式的 Content-Type
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 請求開始時間（由 MetricsMiddleware 設定），用來計算命令的排隊等待時間
+REQUEST_START: ContextVar[Optional[float]] = ContextVar("request_start", default=None)
+
+
+def log_linear_buckets(
+    low_exponent: int = -4,
+    high_exponent: int = 2,
+    mantissas: Sequence[float] = (1, 1.25, 1.5, 2, 2.5, 3, 4, 5, 6, 8)
+) -> List[float]:
+    """產生 HDR 風格的對數線性分桶：每個數量級內固定數個分桶，相對誤差約 25% 以內
+
+    預設範圍為 100 微秒到 800 秒。
+    """
+    return [float(f"{m}e{e}") for e in range(low_exponent, high_exponent + 1) for m in mantissas]
+
+
+LATENCY_BUCKETS = log_linear_buckets()
+
+
+class _Sharded:
+    """依執行緒分片的數值
+
+    每個執行緒只寫入自己的分片，熱路徑上不需要鎖；讀取時再加總所有分片。
+    只有執行緒第一次寫入、建立分片時才需要鎖。
+    """
+
+    def __init__(self, size: int):
+        self._size = size
+        self._shards: Dict[int, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def shard(self) -> List[float]:
+        ident = threading.get_ident()
+        shard = self._shards.get(ident)
+        if shard is None:
+            with self._lock:
+                shard = self._shards.setdefault(ident, [0.0] * self._size)
+        return shard
+
+    def totals(self) -> List[float]:
+        totals = [0.0] * self._size
+        for shard in list(self._shards.values()):
+            for i, value in enumerate(shard):
+                totals[i] += value
+        return totals
+
+
+class _Metric:
+    """指標家族：依標籤值建立子指標"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} 需要標籤 {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _label_text(self, values: Tuple[str, ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class _CounterChild:
+    def __init__(self):
+        self._value = _Sharded(1)
+
+    def inc(self, amount: float = 1) -> None:
+        self._value.shard()[0] += amount
+
+    @property
+    def value(self) -> float:
+        return self._value.totals()[0]
+
+
+class Counter(_Metric):
+    """只會增加的計數器"""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def samples(self) -> Iterator[str]:
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{self._label_text(values)} {_format(child.value)}"
+
+
+class _GaugeChild(_CounterChild):
+    def dec(self, amount: float = 1) -> None:
+        self._value.shard()[0] -= amount
+
+
+class Gauge(_Metric):
+    """可增可減的量測值；指定 func 時於輸出時呼叫 func 取得數值"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 func: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.func = func
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self.labels().dec(amount)
+
+    def samples(self) -> Iterator[str]:
+        if self.func is not None:
+            yield f"{self.name} {_format(self.func())}"
+            return
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{self._label_text(values)} {_format(child.value)}"
+
+
+class _HistogramChild:
+    def __init__(self, buckets: List[float]):
+        self._buckets = buckets
+        # 分片內容：各分桶計數、最後一個為 +Inf 分桶，之後是總和
+        self._values = _Sharded(len(buckets) + 2)
+
+    def observe(self, value: float) -> None:
+        shard = self._values.shard()
+        shard[bisect.bisect_left(self._buckets, value)] += 1
+        shard[-1] += value
+
+    def snapshot(self) -> Tuple[List[float], float, float]:
+        """回傳（累計分桶計數, 總和, 總數）"""
+        totals = self._values.totals()
+        cumulative, running = [], 0.0
+        for count in totals[:-1]:
+            running += count
+            cumulative.append(running)
+        return cumulative, totals[-1], running
+
+
+class Histogram(_Metric):
+    """固定分桶的直方圖"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = sorted(buckets)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self) -> Iterator[str]:
+        for values, child in list(self._children.items()):
+            cumulative, total, count = child.snapshot()
+            bounds = [_format(bound) for bound in self.buckets] + ["+Inf"]
+            for bound, bucket_count in zip(bounds, cumulative):
+                yield f"{self.name}_bucket{self._label_text(values, (('le', bound),))} {_format(bucket_count)}"
+            yield f"{self.name}_sum{self._label_text(values)} {_format(total)}"
+            yield f"{self.name}_count{self._label_text(values)} {_format(count)}"
+
+
+def _escape(value: str) -> str:
+    """跳脫標籤值中的反斜線、雙引號與換行"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Registry:
+    """指標登錄表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """輸出 Prometheus 文字格式"""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+COMMANDS = REGISTRY.register(Counter(
+    "shell_commands_total", "執行的 shell 命令數", ("source", "status")
+))
+COMMANDS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "shell_commands_in_flight", "執行中的 shell 命令數", ("source",)
+))
+COMMAND_OUTPUT_BYTES = REGISTRY.register(Counter(
+    "shell_command_output_bytes_total", "命令標準輸出的位元組數（UTF-8）", ("source",)
+))
+COMMAND_QUEUE_WAIT = REGISTRY.register(Histogram(
+    "shell_command_queue_wait_seconds", "收到請求到開始啟動子行程的等待時間", ("source",)
+))
+COMMAND_SPAWN = REGISTRY.register(Histogram(
+    "shell_command_spawn_seconds", "啟動子行程所需的時間", ("source",)
+))
+COMMAND_FIRST_BYTE = REGISTRY.register(Histogram(
+    "shell_command_time_to_first_byte_seconds", "啟動子行程到收到第一行輸出的時間", ("source",)
+))
+COMMAND_DURATION = REGISTRY.register(Histogram(
+    "shell_command_duration_seconds", "命令從啟動到結束的總時間", ("source",)
+))
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "http_requests_total", "HTTP 請求數", ("endpoint", "method", "status")
+))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "處理中的 HTTP 請求數"
+))
+HTTP_DURATION = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP 請求處理時間（不含串流回應的傳送）", ("endpoint",)
+))
+TOOL_CALLS = REGISTRY.register(Counter(
+    "mcp_tool_calls_total", "MCP 工具呼叫數", ("tool", "status")
+))
+TOOL_DURATION = REGISTRY.register(Histogram(
+    "mcp_tool_call_duration_seconds", "MCP 工具呼叫時間", ("tool",)
+))
+
+
+class CommandTimer:
+    """記錄單一 shell 命令的各階段時間
+
+    用法：建立後呼叫 spawned()（子行程已啟動）、first_byte()（讀到第一行輸出），
+    最後呼叫 finish()。
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.start = time.perf_counter()
+        self._first_byte = False
+        self._finished = False
+        request_start = REQUEST_START.get()
+        if request_start is not None:
+            COMMAND_QUEUE_WAIT.labels(source).observe(max(0.0, self.start - request_start))
+        COMMANDS_IN_FLIGHT.labels(source).inc()
+
+    def spawned(self) -> None:
+        COMMAND_SPAWN.labels(self.source).observe(time.perf_counter() - self.start)
+
+    def first_byte(self) -> None:
+        if not self._first_byte:
+            self._first_byte = True
+            COMMAND_FIRST_BYTE.labels(self.source).observe(time.perf_counter() - self.start)
+
+    def finish(self, status: str, output_bytes: int = 0) -> None:
+        if self._finished:
+            return
+        self._finished = True
+        COMMAND_DURATION.labels(self.source).observe(time.perf_counter() - self.start)
+        COMMAND_OUTPUT_BYTES.labels(self.source).inc(output_bytes)
+        COMMANDS.labels(self.source, status).inc()
+        COMMANDS_IN_FLIGHT.labels(self.source).dec()
+
+
+class MetricsMiddleware:
+    """記錄各端點 HTTP 請求數與處理時間的 ASGI 中介層
+
+    端點以路由樣板（例如 /api/test-results）為標籤，避免標籤數量無限增長。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        token = REQUEST_START.set(start)
+        status = 500
+        HTTP_IN_FLIGHT.inc()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # 以回應標頭送出的時間為準，SSE 等長時間串流不會拉長處理時間
+                HTTP_DURATION.labels(_endpoint(scope)).observe(time.perf_counter() - start)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_START.reset(token)
+            HTTP_IN_FLIGHT.dec()
+            HTTP_REQUESTS.labels(_endpoint(scope), scope["method"], str(status)).inc()
+
+
+def _endpoint(scope) -> str:
+    """取得路由樣板；掛載的子應用程式（例如 /static）以掛載路徑代表"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or scope.get("root_path") or "<unmatched>"
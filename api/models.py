@@ -1,14 +1,46 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, model_validator
+from typing import Any, Dict, List, Literal, Optional, Union
 
 class ShellCommand(BaseModel):
     platform: Optional[str] = None
-    shell_command: str
+    shell_command: Optional[str] = None
+    # 直接執行的命令與參數，不經過 shell；與 shell_command 擇一提供
+    argv: Optional[List[str]] = None
+    output_format: Literal["text", "table"] = "text"
+    # 輸出精簡設定（見 api/output_compaction.py），true 使用預設設定；未提供時回傳完整輸出
+    compact: Optional[Union[bool, Dict[str, Any]]] = None
+    # 資源限制（見 api/sandbox.py）：cpu_quota、cpu_seconds、memory_mb、max_pids、io_weight
+    limits: Optional[Dict[str, float]] = None
+
+    @model_validator(mode="after")
+    def check_command(self):
+        if not self.argv and self.shell_command is None:
+            raise ValueError("必須提供 shell_command 或 argv")
+        return self
+
+class TableColumn(BaseModel):
+    name: str
+    type: str
+
+class OutputTable(BaseModel):
+    source: str
+    columns: List[TableColumn]
+    rows: List[List[Any]]
+    start_line: Optional[int] = None
+    end_line: Optional[int] = None
 
 class ShellResponse(BaseModel):
     output: str
     error: Optional[str] = None
     return_code: int
+    tables: Optional[List[OutputTable]] = None
+    compaction: Optional[Dict[str, int]] = None
+    # 資源用量：執行時間、CPU 時間、最大 RSS、讀寫位元組數；在資源限制下執行時另有限制與後端
+    usage: Optional[Dict[str, Any]] = None
 
 class PlatformResponse(BaseModel):
-    platform: str
\ No newline at end of file
+    platform: str
+
+class QuickResponse(BaseModel):
+    platform: str
+    result: ShellResponse
\ No newline at end of file
@@ -0,0 +1,207 @@
+"""
+回傳給 LLM 前的命令輸出精簡
+
+shell_helper 的結果會原封不動地作為 function_call_output 送回模型，重複的日誌或
+進度列會在每一輪對話消耗大量 token。本模組依序：
+
+1. 移除 ANSI 控制碼，並只保留 `\\r` 覆寫後的最後內容（進度列）
+2. 合併連續重複的行，以及只有數字不同的連續相似行（時間戳記、計數器）
+3. 截斷過長的行
+4. 超過位元組上限時只保留開頭與結尾，中間以一行說明省略的內容
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# CSI（顏色、游標移動）、OSC（視窗標題、超連結）與其他兩字元的跳脫序列
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-?]*[ -/]*[@-~]|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)|\x1b[@-Z\\-_]")
+DIGITS = re.compile(r"\d+")
+
+DEFAULT_COMPACTION: Dict[str, Any] = {
+    "strip_ansi": True,
+    "dedupe": True,
+    "max_line_length": 2000,
+    "max_bytes": 64 * 1024,
+    # 超過 max_bytes 時保留給結尾的比例；錯誤訊息通常在最後
+    "tail_ratio": 0.6,
+}
+
+# 至少連續幾行相似內容才合併（保留第一行與最後一行）
+MIN_SIMILAR_RUN = 3
+# 超過位元組上限時，為省略說明保留的位元組數
+MARKER_RESERVE = 64
+
+
+class CompactionError(ValueError):
+    """compact 參數的型別或範圍無效"""
+
+
+def _validate_option(key: str, value: Any) -> None:
+    if key in ("enabled", "strip_ansi", "dedupe"):
+        if not isinstance(value, bool):
+            raise CompactionError(f"{key} 必須是布林值")
+    elif key in ("max_line_length", "max_bytes"):
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            raise CompactionError(f"{key} 必須是非負整數")
+    elif key == "tail_ratio":
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= 1:
+            raise CompactionError("tail_ratio 必須介於 0 與 1 之間")
+
+
+def resolve_compaction(value: Union[None, bool, Dict[str, Any]],
+                       default_enabled: bool = True) -> Optional[Dict[str, Any]]:
+    """將工具或 API 的 compact 參數轉為完整設定；回傳 None 表示不精簡
+
+    value 為 None 時依 default_enabled 決定；true / false 使用預設設定或停用；
+    {"enabled": false} 停用；其他鍵覆寫 DEFAULT_COMPACTION 的對應設定，
+    max_line_length 或 max_bytes 為 0 表示不限制。
+
+    Raises:
+        CompactionError: 設定的型別或範圍無效
+    """
+    if value is None:
+        return dict(DEFAULT_COMPACTION) if default_enabled else None
+    if isinstance(value, bool):
+        return dict(DEFAULT_COMPACTION) if value else None
+    if not isinstance(value, dict):
+        raise CompactionError("compact 必須是物件或布林值")
+    for key in ("enabled", *DEFAULT_COMPACTION):
+        if key in value:
+            _validate_option(key, value[key])
+    if not value.get("enabled", True):
+        return None
+    options = dict(DEFAULT_COMPACTION)
+    options.update({key: value[key] for key in DEFAULT_COMPACTION if key in value})
+    return options
+
+
+def strip_terminal_codes(text: str) -> str:
+    """移除 ANSI 控制碼；以 \\r 覆寫的行只保留最後顯示的內容"""
+    text = ANSI_ESCAPE.sub("", text)
+    if "\r" not in text:
+        return text
+    text = text.replace("\r\n", "\n")
+    return "\n".join(line.rsplit("\r", 1)[-1] if "\r" in line else line for line in text.split("\n"))
+
+
+def dedupe_lines(lines: List[str]) -> Tuple[List[str], int]:
+    """合併連續重複或只有數字不同的行，回傳 (結果, 省略的行數)"""
+    # 一次替換整段文字的數字，比逐行替換快得多
+    keys = DIGITS.sub("0", "\n".join(lines)).split("\n")
+    result: List[str] = []
+    omitted = 0
+    index = 0
+    while index < len(lines):
+        line = lines[index]
+        end = index + 1
+        while end < len(lines) and lines[end] == line:
+            end += 1
+        if end - index > 1:
+            result.append(line)
+            result.append(f"[上一行重複 {end - index - 1} 次]")
+            omitted += end - index - 1
+            index = end
+            continue
+        key = keys[index]
+        if key != line:
+            while end < len(lines) and keys[end] == key:
+                end += 1
+        if end - index >= MIN_SIMILAR_RUN:
+            result.append(line)
+            result.append(f"[省略 {end - index - 2} 行只有數字不同的相似內容]")
+            result.append(lines[end - 1])
+            omitted += end - index - 2
+        else:
+            result.extend(lines[index:end])
+        index = end
+    return result, omitted
+
+
+def truncate_lines(lines: List[str], max_length: int) -> Tuple[List[str], int]:
+    """截斷超過 max_length 個字元的行，回傳 (結果, 截斷的行數)"""
+    truncated = 0
+    result = []
+    for line in lines:
+        if len(line) > max_length:
+            line = f"{line[:max_length]}…[截斷 {len(line) - max_length} 字元]"
+            truncated += 1
+        result.append(line)
+    return result, truncated
+
+
+def _take_bytes(lines: List[str], budget: int) -> int:
+    """從 lines 開頭起算，在 budget 位元組內可以完整保留幾行"""
+    used = 0
+    for count, line in enumerate(lines):
+        used += len(line.encode("utf-8")) + 1
+        if used > budget:
+            return count
+    return len(lines)
+
+
+def head_tail(lines: List[str], max_bytes: int, tail_ratio: float) -> Tuple[List[str], int]:
+    """總長度超過 max_bytes 時只保留開頭與結尾的行，回傳 (結果, 省略的行數)"""
+    if sum(len(line.encode("utf-8")) + 1 for line in lines) <= max_bytes:
+        return lines, 0
+    # 預留省略說明那一行的空間
+    budget = max(max_bytes - MARKER_RESERVE, 0)
+    tail_budget = int(budget * tail_ratio)
+    head_count = _take_bytes(lines, budget - tail_budget)
+    tail_count = min(_take_bytes(lines[::-1], tail_budget), len(lines) - head_count)
+    head = lines[:head_count]
+    tail = lines[len(lines) - tail_count:]
+    if not head and not tail:
+        # 開頭與結尾的行都超過上限（未限制行長度時），改以位元組截取
+        data = "\n".join(lines).encode("utf-8")
+        head = [data[:budget - tail_budget].decode("utf-8", "ignore")]
+        tail = [data[len(data) - tail_budget:].decode("utf-8", "ignore")] if tail_budget else []
+        return head + [f"[省略 {len(data) - budget} 位元組]"] + tail, 0
+    middle = lines[head_count:len(lines) - tail_count]
+    omitted_bytes = sum(len(line.encode("utf-8")) + 1 for line in middle)
+    return head + [f"[省略 {len(middle)} 行，共 {omitted_bytes} 位元組]"] + tail, len(middle)
+
+
+def compact_output(text: str, options: Optional[Dict[str, Any]]) -> Tuple[str, Dict[str, int]]:
+    """依 options 精簡命令輸出，回傳 (精簡後的文字, 統計)
+
+    options 為 None 時原樣回傳。統計包含原始與精簡後的位元組數，以及合併、
+    截斷與省略的行數。
+    """
+    original_bytes = len(text.encode("utf-8"))
+    stats = {"original_bytes": original_bytes, "compacted_bytes": original_bytes,
+             "deduped_lines": 0, "truncated_lines": 0, "omitted_lines": 0}
+    if options is None or not text:
+        return text, stats
+
+    if options["strip_ansi"]:
+        text = strip_terminal_codes(text)
+    trailing_newline = text.endswith("\n")
+    lines = text.split("\n")
+    if trailing_newline:
+        lines.pop()
+
+    if options["dedupe"]:
+        lines, stats["deduped_lines"] = dedupe_lines(lines)
+    if options["max_line_length"]:
+        lines, stats["truncated_lines"] = truncate_lines(lines, int(options["max_line_length"]))
+    if options["max_bytes"] and lines:
+        lines, stats["omitted_lines"] = head_tail(lines, int(options["max_bytes"]), float(options["tail_ratio"]))
+
+    text = "\n".join(lines) + ("\n" if trailing_newline else "")
+    stats["compacted_bytes"] = len(text.encode("utf-8"))
+    return text, stats
+
+
+def compaction_note(stats: Dict[str, int]) -> str:
+    """精簡有效果時附加在工具結果中的說明，讓模型知道輸出並不完整"""
+    if stats["compacted_bytes"] >= stats["original_bytes"]:
+        return ""
+    details = []
+    if stats["deduped_lines"]:
+        details.append(f"合併 {stats['deduped_lines']} 行重複內容")
+    if stats["truncated_lines"]:
+        details.append(f"截斷 {stats['truncated_lines']} 行過長內容")
+    if stats["omitted_lines"]:
+        details.append(f"省略中間 {stats['omitted_lines']} 行")
+    suffix = f"（{'、'.join(details)}）" if details else ""
+    return (f"\n\n輸出已精簡：{stats['original_bytes']} → {stats['compacted_bytes']} 位元組{suffix}，"
+            f"需要完整輸出時以 compact={{\"enabled\": false}} 重新執行")
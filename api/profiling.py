@@ -0,0 +1,280 @@
+import io
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import nullcontext
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+try:
+    import pyinstrument
+except ImportError:  # pyinstrument 為選用套件，未安裝時只提供 cProfile
+    pyinstrument = None
+
+# 以請求標頭或環境變數開啟剖析
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+PROFILE_ENV = "SHELL_HELPER_PROFILE"
+# 呼叫追蹤會記錄同時執行的其他請求，且有額外成本，請求標頭與 _meta.profile 預設不接受
+PROFILE_REQUESTS_ENV = "SHELL_HELPER_PROFILE_REQUESTS"
+# 需要完整呼叫追蹤（cProfile / pyinstrument）的請求中，實際取樣的比例
+PROFILE_SAMPLE_ENV = "SHELL_HELPER_PROFILE_SAMPLE"
+
+# phases 只記錄階段時間；cprofile / pyinstrument 另外記錄呼叫追蹤
+PROFILE_MODES = ("phases", "cprofile", "pyinstrument")
+MAX_PROFILES = 200
+TRACE_LINES = 40
+
+CURRENT_PROFILE: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+
+# 關閉剖析時 phase() 回傳的共用空操作
+_NULL_PHASE = nullcontext()
+
+# 同一時間只能有一個請求啟用呼叫追蹤（cProfile 一個執行緒只能啟用一個）
+_trace_lock = threading.Lock()
+
+
+class RequestProfile:
+    """單一請求的剖析結果：各階段耗時與選用的呼叫追蹤"""
+
+    def __init__(self, name: str, mode: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.mode = mode
+        self.timestamp = datetime.now().isoformat()
+        self.start = time.perf_counter()
+        self.total: Optional[float] = None
+        self.phases: List[Dict[str, Any]] = []
+        self.trace: Optional[str] = None
+        self._depth = 0
+
+    def record(self, name: str, started: float, ended: float, depth: int) -> None:
+        self.phases.append({
+            "name": name,
+            "start_ms": round((started - self.start) * 1000, 3),
+            "duration_ms": round((ended - started) * 1000, 3),
+            "depth": depth
+        })
+
+    def checkpoint(self, name: str) -> None:
+        """記錄從請求開始到目前為止的時間（例如讀取請求本文與驗證）"""
+        self.record(name, self.start, time.perf_counter(), self._depth)
+
+    def as_dict(self, include_trace: bool = True) -> Dict[str, Any]:
+        data = {
+            "id": self.id,
+            "name": self.name,
+            "mode": self.mode,
+            "timestamp": self.timestamp,
+            "total_ms": round(self.total * 1000, 3) if self.total is not None else None,
+            "phases": sorted(self.phases, key=lambda item: item["start_ms"])
+        }
+        if include_trace:
+            data["trace"] = self.trace
+        return data
+
+
+class _Phase:
+    def __init__(self, profile: RequestProfile, name: str):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.depth = self.profile._depth
+        self.profile._depth += 1
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile._depth -= 1
+        self.profile.record(self.name, self.started, time.perf_counter(), self.depth)
+        return False
+
+
+def phase(name: str):
+    """記錄一個階段的耗時；目前請求未開啟剖析時幾乎沒有額外成本
+
+    用法：with phase("spawn"): ...
+    """
+    profile = CURRENT_PROFILE.get()
+    if profile is None:
+        return _NULL_PHASE
+    return _Phase(profile, name)
+
+
+def checkpoint(name: str) -> None:
+    """記錄從請求開始到目前為止的時間"""
+    profile = CURRENT_PROFILE.get()
+    if profile is not None:
+        profile.checkpoint(name)
+
+
+class ProfileStore:
+    """保留最近 max_size 筆剖析結果"""
+
+    def __init__(self, max_size: int = MAX_PROFILES):
+        self.max_size = max_size
+        self._profiles: "OrderedDict[str, RequestProfile]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._profiles[profile.id] = profile
+            while len(self._profiles) > self.max_size:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        return self._profiles.get(profile_id)
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """最新的剖析摘要（不含呼叫追蹤）"""
+        with self._lock:
+            profiles = list(self._profiles.values())[-limit:]
+        return [profile.as_dict(include_trace=False) for profile in reversed(profiles)]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._profiles.clear()
+
+
+PROFILES = ProfileStore()
+
+
+def requests_allowed() -> bool:
+    """是否接受客戶端以請求標頭或 _meta.profile 開啟剖析（SHELL_HELPER_PROFILE_REQUESTS）"""
+    return os.environ.get(PROFILE_REQUESTS_ENV, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def resolve_mode(header_value: Optional[str]) -> Optional[str]:
+    """決定請求的剖析模式：請求標頭優先，其次是環境變數
+
+    "1" / "true" 等同 phases；無法辨識或 "0" 表示不剖析。
+    未設定 SHELL_HELPER_PROFILE_REQUESTS 時忽略請求標頭，只依 SHELL_HELPER_PROFILE。
+    """
+    if header_value is not None and not requests_allowed():
+        header_value = None
+    value = header_value if header_value is not None else os.environ.get(PROFILE_ENV)
+    if not value:
+        return None
+    value = value.strip().lower()
+    if value in ("1", "true", "yes", "on"):
+        return "phases"
+    if value not in PROFILE_MODES:
+        return None
+    if value == "pyinstrument" and pyinstrument is None:
+        return "cprofile"
+    if value != "phases":
+        try:
+            sample_rate = float(os.environ.get(PROFILE_SAMPLE_ENV, "1"))
+        except ValueError:
+            sample_rate = 1.0
+        if random.random() >= sample_rate:
+            return "phases"
+    return value
+
+
+class _Tracer:
+    """包裝 cProfile / pyinstrument，輸出文字格式的呼叫追蹤
+
+    cProfile 記錄的是事件迴圈執行緒上的所有呼叫，追蹤期間同時處理的其他請求
+    也會出現在結果中，不能當作單一請求的成本。
+    """
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        if mode == "pyinstrument":
+            self._profiler = pyinstrument.Profiler(async_mode="enabled")
+        else:
+            import cProfile
+            self._profiler = cProfile.Profile()
+
+    def start(self) -> None:
+        if self.mode == "pyinstrument":
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def stop(self) -> str:
+        if self.mode == "pyinstrument":
+            self._profiler.stop()
+            return self._profiler.output_text(unicode=True)
+        self._profiler.disable()
+        import pstats
+        stream = io.StringIO()
+        pstats.Stats(self._profiler, stream=stream).sort_stats("cumulative").print_stats(TRACE_LINES)
+        return stream.getvalue()
+
+
+class ProfiledRequest:
+    """剖析一個請求的 context manager：設定目前的剖析對象，結束後存入 PROFILES"""
+
+    def __init__(self, name: str, mode: str, store: ProfileStore = PROFILES):
+        self.profile = RequestProfile(name, mode)
+        self.store = store
+        self._tracer: Optional[_Tracer] = None
+
+    def __enter__(self) -> RequestProfile:
+        self._token = CURRENT_PROFILE.set(self.profile)
+        if self.profile.mode != "phases":
+            if _trace_lock.acquire(blocking=False):
+                self._tracer = _Tracer(self.profile.mode)
+                self._tracer.start()
+            else:
+                # 其他請求正在追蹤，本次只記錄階段時間
+                self.profile.mode = "phases"
+        return self.profile
+
+    def __exit__(self, *exc_info):
+        if self._tracer is not None:
+            try:
+                self.profile.trace = self._tracer.stop()
+            finally:
+                _trace_lock.release()
+        CURRENT_PROFILE.reset(self._token)
+        self.profile.total = time.perf_counter() - self.profile.start
+        self.store.add(self.profile)
+        return False
+
+
+class ProfilingMiddleware:
+    """依 X-Profile 標頭或 SHELL_HELPER_PROFILE 環境變數剖析 HTTP 請求
+
+    剖析的請求在回應標頭加上 X-Profile-Id，可由 /debug/profiles/{id} 取得結果。
+    X-Profile 標頭只在設定 SHELL_HELPER_PROFILE_REQUESTS 時有效，
+    呼叫追蹤會包含同時在事件迴圈上執行的其他請求。未開啟時只多一次標頭查找。
+    """
+
+    def __init__(self, app, paths: tuple = ("/execute", "/quick", "/sse/messages")):
+        self.app = app
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        header_value = None
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                header_value = value.decode("latin-1")
+                break
+        mode = resolve_mode(header_value)
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        request = ProfiledRequest(f"{scope['method']} {scope['path']}", mode)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((PROFILE_ID_HEADER, request.profile.id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        with request:
+            await self.app(scope, receive, send_wrapper)
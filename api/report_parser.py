@@ -0,0 +1,61 @@
+import re
+from typing import Any, Dict, List, Optional
+
+# test_quick_endpoint.py 以一行 80 個 "=" 分隔每次監控的報告
+REPORT_SEPARATOR = re.compile(r"={10,}")
+TEST_TIME_PATTERN = re.compile(r"測試時間:\s*(.+)")
+TEST_PATTERN = re.compile(r"### 測試 (\d+)([\s\S]*?)(?=### 測試 \d+|$)")
+OUTPUT_PATTERN = re.compile(r"\*\*輸出結果\*\*:\s*```\n?([\s\S]*?)```")
+ERROR_BLOCK_PATTERN = re.compile(r"\*\*錯誤訊息\*\*:\s*```\n?([\s\S]*?)```")
+
+
+def _field(content: str, label: str, pattern: str = r"(.+)") -> str:
+    """擷取 `- **標籤**: 值` 格式的欄位"""
+    match = re.search(rf"\*\*{label}\*\*:\s*{pattern}", content)
+    return match.group(1) if match else ""
+
+
+def parse_test(number: str, content: str) -> Dict[str, Any]:
+    """解析單一測試項目"""
+    status_text = _field(content, "狀態")
+    output_match = OUTPUT_PATTERN.search(content)
+    error_match = ERROR_BLOCK_PATTERN.search(content)
+    error: Optional[str] = error_match.group(1).strip() if error_match else (_field(content, "錯誤訊息") or None)
+
+    return {
+        "number": int(number),
+        "exec_time": _field(content, "執行時間"),
+        "command": _field(content, "執行命令", r"`(.+)`"),
+        "platform": _field(content, "指定平台"),
+        "status": "success" if ("✅" in status_text or "成功" in status_text) else "failure",
+        "status_text": status_text,
+        "actual_platform": _field(content, "實際平台"),
+        "return_code": _field(content, "返回碼", r"(-?\d+)"),
+        "output": output_match.group(1).strip() if output_match else "",
+        "error": error,
+        "latency_ms": _field(content, "回應延遲", r"([\d.]+)")
+    }
+
+
+def parse_report(section: str) -> Optional[Dict[str, Any]]:
+    """解析一次監控的報告，沒有測試項目時回傳 None"""
+    tests = [parse_test(number, content) for number, content in TEST_PATTERN.findall(section)]
+    if not tests:
+        return None
+    time_match = TEST_TIME_PATTERN.search(section)
+    return {
+        "time": time_match.group(1).strip() if time_match else "",
+        "tests": tests
+    }
+
+
+def parse_reports(markdown: str) -> List[Dict[str, Any]]:
+    """將 Markdown 測試報告解析為結構化的監控紀錄（依時間先後排列）"""
+    reports = []
+    for section in REPORT_SEPARATOR.split(markdown):
+        if not section.strip():
+            continue
+        report = parse_report(section)
+        if report is not None:
+            reports.append(report)
+    return reports
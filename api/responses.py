@@ -0,0 +1,44 @@
+import json
+from typing import Any
+
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+from .profiling import phase
+
+try:
+    import orjson
+except ImportError:  # orjson 為選用套件，未安裝時退回標準函式庫
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """序列化 pydantic 模型（不重新驗證）"""
+    if isinstance(obj, BaseModel):
+        # model_construct 建立的模型內可能是原始 dict，略過型別不符的警告
+        return obj.model_dump(warnings=False)
+    raise TypeError(f"無法序列化的型別: {type(obj).__name__}")
+
+
+class FastJSONResponse(JSONResponse):
+    """使用 orjson 編碼的 JSON 回應
+
+    用於伺服器內部產生、已知格式正確的結果：端點直接回傳此回應時，
+    FastAPI 不會再以 response_model 重新驗證與序列化內容。
+    未安裝 orjson 時改用標準 json 模組，輸出格式維持相同。
+    """
+
+    def render(self, content: Any) -> bytes:
+        with phase("encode"):
+            return self._render(content)
+
+    def _render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, default=_default)
+        return json.dumps(
+            content,
+            default=_default,
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
@@ -0,0 +1,158 @@
+import json
+from dataclasses import dataclass, field
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, Mapping, Optional, Tuple
+
+import aiofiles
+
+from .compression import compress
+
+# 增量讀取前比對的舊內容尾端長度，用來確認檔案只是被追加
+APPEND_CHECK_BYTES = 64
+
+
+@dataclass
+class CachedResults:
+    """測試結果文件的快取內容，以 (mtime, size) 識別版本"""
+    mtime_ns: int
+    size: int
+    data: bytes
+    # 檔案被改寫（而非追加）的次數，增量讀取的客戶端以此判斷是否需要重新讀取
+    generation: int = 0
+    compressed: Dict[str, bytes] = field(default_factory=dict)
+    _body: Optional[bytes] = None
+
+    @property
+    def etag(self) -> str:
+        """以修改時間與大小組成的弱 ETag"""
+        return f'W/"{self.mtime_ns:x}-{self.size:x}"'
+
+    @property
+    def last_modified(self) -> str:
+        """HTTP 日期格式的修改時間"""
+        return formatdate(self.mtime_ns / 1e9, usegmt=True)
+
+    @property
+    def body(self) -> bytes:
+        """以 JSON 字串編碼的完整內容（延遲產生）"""
+        if self._body is None:
+            content = self.data.decode("utf-8", errors="replace")
+            self._body = json.dumps(content, ensure_ascii=False).encode("utf-8")
+        return self._body
+
+    def encoded(self, encoding: Optional[str]) -> bytes:
+        """取得指定編碼的內容，壓縮結果只計算一次"""
+        if encoding is None:
+            return self.body
+        if encoding not in self.compressed:
+            self.compressed[encoding] = compress(self.body, encoding)
+        return self.compressed[encoding]
+
+    def tail(self, offset: int) -> Tuple[int, bytes]:
+        """取得從 offset 之後追加的內容
+
+        offset 落在多位元組 UTF-8 字元中間時會往前對齊到字元開頭。
+
+        Returns:
+            (實際起始位置, 內容) 的 tuple
+        """
+        start = max(0, min(offset, self.size))
+        while 0 < start < self.size and (self.data[start] & 0xC0) == 0x80:
+            start -= 1
+        return start, self.data[start:]
+
+
+class ResultsFileCache:
+    """測試結果文件的快取
+
+    檔案版本以 (mtime, size) 識別；檔案只是被追加時僅讀取新增的部分，
+    因此每次更新的成本與新資料量成正比，而非整個檔案大小。
+    每次重新讀取整個檔案時 generation 加一。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._entry: Optional[CachedResults] = None
+        self.generation = 0
+
+    async def load(self) -> CachedResults:
+        """取得目前檔案內容
+
+        Raises:
+            FileNotFoundError: 測試結果文件不存在
+        """
+        stat = self.path.stat()
+        entry = self._entry
+        if entry is not None and (entry.mtime_ns, entry.size) == (stat.st_mtime_ns, stat.st_size):
+            return entry
+
+        async with aiofiles.open(self.path, 'rb') as f:
+            if entry is not None and stat.st_size > entry.size and await self._is_append(f, entry):
+                await f.seek(entry.size)
+                data = entry.data + await f.read(stat.st_size - entry.size)
+            else:
+                # _is_append 可能已移動讀取位置
+                await f.seek(0)
+                data = await f.read(stat.st_size)
+                self.generation += 1
+
+        self._entry = CachedResults(mtime_ns=stat.st_mtime_ns, size=len(data), data=data,
+                                    generation=self.generation)
+        return self._entry
+
+    @staticmethod
+    async def _is_append(f, entry: CachedResults) -> bool:
+        """比對舊內容的尾端，確認檔案是被追加而非整個改寫"""
+        check_start = max(0, entry.size - APPEND_CHECK_BYTES)
+        await f.seek(check_start)
+        return await f.read(entry.size - check_start) == entry.data[check_start:]
+
+
+def is_not_modified(headers: Mapping[str, str], entry: CachedResults) -> bool:
+    """依 If-None-Match / If-Modified-Since 判斷客戶端的副本是否仍有效"""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        # 弱比對：忽略 W/ 前綴
+        current = entry.etag[2:]
+        return "*" in tags or any(tag.removeprefix("W/") == current for tag in tags)
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(entry.mtime_ns // 1_000_000_000) <= since
+    return False
+
+
+def parse_byte_range(value: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """解析單一範圍的 Range 標頭（bytes=start-end 或 bytes=start-）
+
+    Returns:
+        (start, end) 包含兩端的位元組範圍；標頭不存在或格式不支援時回傳 None
+
+    Raises:
+        ValueError: 範圍超出檔案大小，無法滿足
+    """
+    if not value or not value.startswith("bytes="):
+        return None
+    spec = value[len("bytes="):].strip()
+    if "," in spec:
+        return None
+    start_text, _, end_text = spec.partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            # bytes=-N：最後 N 個位元組
+            start = max(0, size - int(end_text))
+            end = size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise ValueError(f"範圍無法滿足: {value}")
+    return start, min(end, size - 1)
@@ -0,0 +1,294 @@
+import argparse
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .report_parser import parse_reports
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    time TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    number INTEGER NOT NULL,
+    exec_time TEXT NOT NULL,
+    command TEXT NOT NULL,
+    platform TEXT,
+    status TEXT NOT NULL,
+    actual_platform TEXT,
+    return_code INTEGER,
+    output TEXT NOT NULL DEFAULT '',
+    error TEXT,
+    tables TEXT,
+    latency_ms REAL,
+    host TEXT
+);
+CREATE INDEX IF NOT EXISTS tests_status_id ON tests(status, id);
+CREATE TABLE IF NOT EXISTS totals (
+    status TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+"""
+
+TEST_COLUMNS = (
+    "tests.id, tests.run_id, runs.time AS run_time, tests.number, tests.exec_time, "
+    "tests.command, tests.platform, tests.status, tests.actual_platform, "
+    "tests.return_code, tests.output, tests.error, tests.tables, tests.latency_ms, tests.host"
+)
+
+# 舊版資料庫缺少時以 ALTER TABLE 補上的欄位
+ADDED_COLUMNS = {
+    "tables": "TEXT",
+    "latency_ms": "REAL",
+    "host": "TEXT"
+}
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def result_to_test(number: int, result: Dict[str, Any]) -> Dict[str, Any]:
+    """將 test_quick_endpoint.py 的單筆結果轉換為 tests 資料列"""
+    command = result["command"]
+    test = {
+        "number": number,
+        "exec_time": result["timestamp"],
+        "command": command["shell_command"],
+        "platform": command["platform"] or "自動偵測",
+        "actual_platform": None,
+        "return_code": None,
+        "output": "",
+        "error": None,
+        "tables": None,
+        "latency_ms": result.get("latency_ms")
+    }
+    if "error" in result:
+        test.update(status="failure", error=result["error"])
+        return test
+
+    response = result["response"]
+    shell_result = response["result"]
+    test.update(
+        status="success" if shell_result["return_code"] == 0 else "failure",
+        actual_platform=response["platform"],
+        return_code=shell_result["return_code"],
+        # 只去除結尾空白，保留行索引與 tables 的 start_line / end_line 對應
+        output=(shell_result["output"] or "").rstrip(),
+        error=shell_result["error"],
+        tables=shell_result.get("tables")
+    )
+    return test
+
+
+class ResultsStore:
+    """以 SQLite（WAL 模式）保存的監控結果
+
+    取代不斷追加的 Markdown 報告：查詢透過 (status, id) 索引分頁，
+    摘要統計另存於 totals 表，因此查詢成本不隨歷史紀錄增長。
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """取得目前執行緒的資料庫連線"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(SCHEMA)
+                    self._migrate(conn)
+                    self._initialized = True
+        yield conn
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection) -> None:
+        """為舊版資料庫補上新增的欄位"""
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(tests)")}
+        for name, column_type in ADDED_COLUMNS.items():
+            if name not in columns:
+                conn.execute(f"ALTER TABLE tests ADD COLUMN {name} {column_type}")
+        # 依主機分區查詢（艦隊模式）；欄位可能是剛補上的，因此不放在 SCHEMA 中
+        conn.execute("CREATE INDEX IF NOT EXISTS tests_host_id ON tests(host, id)")
+
+    def close(self) -> None:
+        """關閉目前執行緒的資料庫連線"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def add_run(
+        self,
+        tests: List[Dict[str, Any]],
+        time: Optional[str] = None,
+        host: Optional[str] = None
+    ) -> int:
+        """新增一次監控紀錄
+
+        Args:
+            tests: 測試資料列（見 result_to_test）
+            time: 監控時間，預設為現在
+            host: 受監控的主機（host:port），作為查詢分區
+
+        Returns:
+            監控紀錄 ID
+        """
+        time = time or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._connect() as conn, conn:
+            run_id = conn.execute("INSERT INTO runs (time) VALUES (?)", (time,)).lastrowid
+            conn.executemany(
+                "INSERT INTO tests (run_id, number, exec_time, command, platform, status, "
+                "actual_platform, return_code, output, error, tables, latency_ms, host) VALUES "
+                "(:run_id, :number, :exec_time, :command, :platform, :status, "
+                ":actual_platform, :return_code, :output, :error, :tables, :latency_ms, :host)",
+                [
+                    {
+                        **test,
+                        "run_id": run_id,
+                        "host": host,
+                        "latency_ms": test.get("latency_ms"),
+                        "tables": json.dumps(test["tables"], ensure_ascii=False)
+                        if test.get("tables") else None
+                    }
+                    for test in tests
+                ]
+            )
+            for status in ("success", "failure"):
+                count = sum(1 for test in tests if test["status"] == status)
+                if count:
+                    conn.execute(
+                        "INSERT INTO totals (status, count) VALUES (?, ?) "
+                        "ON CONFLICT(status) DO UPDATE SET count = count + excluded.count",
+                        (status, count)
+                    )
+        return run_id
+
+    def add_results(
+        self,
+        results: List[Dict[str, Any]],
+        time: Optional[str] = None,
+        host: Optional[str] = None
+    ) -> int:
+        """新增 test_quick_endpoint.py 一輪的測試結果"""
+        return self.add_run([result_to_test(i, r) for i, r in enumerate(results, 1)], time, host)
+
+    def query(
+        self,
+        since: Optional[int] = None,
+        before: Optional[int] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        status: Optional[str] = None,
+        host: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """分頁查詢測試紀錄，結果一律由新到舊排列
+
+        Args:
+            since: 只回傳 ID 大於此值的紀錄（取得新紀錄，從最舊的開始取）
+            before: 只回傳 ID 小於此值的紀錄（往前翻頁）
+            limit: 最多筆數
+            status: 只回傳指定狀態（success / failure）
+            host: 只回傳指定主機（host:port）的紀錄
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        conditions, params = [], []
+        if status is not None:
+            conditions.append("tests.status = ?")
+            params.append(status)
+        if host is not None:
+            conditions.append("tests.host = ?")
+            params.append(host)
+        if since is not None:
+            conditions.append("tests.id > ?")
+            params.append(since)
+        if before is not None:
+            conditions.append("tests.id < ?")
+            params.append(before)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        # 指定 since 時從 since 之後最舊的開始取，避免新紀錄過多時漏掉中間的部分
+        order = "ASC" if since is not None and before is None else "DESC"
+
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT {TEST_COLUMNS} FROM tests JOIN runs ON runs.id = tests.run_id "
+                f"{where} ORDER BY tests.id {order} LIMIT ?",
+                (*params, limit)
+            ).fetchall()
+        tests = [dict(row) for row in rows]
+        for test in tests:
+            if test["tables"] is not None:
+                test["tables"] = json.loads(test["tables"])
+        if order == "ASC":
+            tests.reverse()
+        return tests
+
+    def summary(self) -> Dict[str, int]:
+        """取得總測試數、成功數與失敗數"""
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT status, count FROM totals").fetchall())
+        success = counts.get("success", 0)
+        failure = counts.get("failure", 0)
+        return {"total": success + failure, "success": success, "failure": failure}
+
+    def last_id(self) -> int:
+        """取得最新一筆測試紀錄的 ID，沒有紀錄時為 0"""
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(MAX(id), 0) FROM tests").fetchone()[0]
+
+    def hosts(self) -> List[str]:
+        """列出有紀錄的主機"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT DISTINCT host FROM tests WHERE host IS NOT NULL ORDER BY host"
+            ).fetchall()
+        return [row["host"] for row in rows]
+
+    def import_markdown(self, markdown: str) -> int:
+        """匯入舊版 Markdown 報告，回傳匯入的監控紀錄數"""
+        reports = parse_reports(markdown)
+        for report in reports:
+            tests = []
+            for test in report["tests"]:
+                return_code = test["return_code"]
+                tests.append({
+                    "number": test["number"],
+                    "exec_time": test["exec_time"],
+                    "command": test["command"],
+                    "platform": test["platform"],
+                    "status": test["status"],
+                    "actual_platform": test["actual_platform"] or None,
+                    "return_code": int(return_code) if return_code else None,
+                    "output": test["output"],
+                    "error": test["error"],
+                    "latency_ms": float(test["latency_ms"]) if test["latency_ms"] else None
+                })
+            self.add_run(tests, report["time"])
+        return len(reports)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="將 Markdown 測試報告匯入結果資料庫")
+    parser.add_argument("markdown", help="quick_endpoint_test_results.md 的路徑")
+    parser.add_argument("--store", default="quick_endpoint_results.db", help="結果資料庫路徑")
+    args = parser.parse_args()
+
+    store = ResultsStore(Path(args.store))
+    count = store.import_markdown(Path(args.markdown).read_text(encoding="utf-8"))
+    print(f"已匯入 {count} 次監控紀錄到 {args.store}")
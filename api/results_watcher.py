@@ -0,0 +1,195 @@
+import asyncio
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import struct
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from .results_store import MAX_PAGE_SIZE, ResultsStore
+
+logger = logging.getLogger(__name__)
+
+# 未使用 inotify 時的輪詢間隔（秒）
+POLL_INTERVAL = 1.0
+# inotify 模式下的保險輪詢間隔（秒），避免遺漏事件
+SAFETY_INTERVAL = 30.0
+
+# inotify 常數（見 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _PollingSource:
+    """以固定間隔輪詢的變更來源"""
+
+    def __init__(self, interval: float = POLL_INTERVAL):
+        self.interval = interval
+
+    async def wait(self) -> None:
+        await asyncio.sleep(self.interval)
+
+    def close(self) -> None:
+        pass
+
+
+class _InotifySource:
+    """以 Linux inotify 監看檔案所在目錄的變更來源"""
+
+    def __init__(self, fd: int, names: List[str]):
+        self.fd = fd
+        self.names = {os.fsencode(name) for name in names}
+        self.changed = asyncio.Event()
+        asyncio.get_running_loop().add_reader(fd, self._on_readable)
+
+    @classmethod
+    def create(cls, path: Path, names: List[str]) -> Optional["_InotifySource"]:
+        """建立監看 path 所在目錄中指定檔名的 inotify 來源，平台不支援時回傳 None"""
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                return None
+            mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+            # 監看目錄而非檔案本身，檔案尚未建立或被替換時也能收到事件
+            if libc.inotify_add_watch(fd, os.fsencode(str(path.parent)), mask) < 0:
+                os.close(fd)
+                return None
+        except (OSError, AttributeError):
+            return None
+        return cls(fd, names)
+
+    def _on_readable(self) -> None:
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buffer):
+            _, _, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+            start = offset + _EVENT_HEADER.size
+            name = buffer[start:start + length].rstrip(b"\0")
+            offset = start + length
+            if name in self.names:
+                self.changed.set()
+
+    async def wait(self) -> None:
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout=SAFETY_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        self.changed.clear()
+
+    def close(self) -> None:
+        asyncio.get_running_loop().remove_reader(self.fd)
+        os.close(self.fd)
+
+
+class ResultsWatcher:
+    """監看結果資料庫並將新的測試紀錄推送給所有訂閱者
+
+    所有 SSE 連線共用同一個監看工作：每次變更只查詢一次新紀錄，
+    沒有訂閱者時監看工作會停止。
+    """
+
+    def __init__(self, store: ResultsStore, use_inotify: bool = True):
+        self.store = store
+        self.use_inotify = use_inotify
+        self.last_id = 0
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    async def subscribe(self, since: Optional[int] = None) -> asyncio.Queue:
+        """訂閱新的測試紀錄
+
+        Args:
+            since: 先補送 ID 大於此值的紀錄；None 表示只接收之後的新紀錄
+        """
+        async with self._lock:
+            if self._task is None or self._task.done():
+                self.last_id = await asyncio.to_thread(self.store.last_id)
+                self._task = asyncio.create_task(self._run())
+            queue: asyncio.Queue = asyncio.Queue()
+            if since is not None:
+                for tests in await self._fetch_pages(since, self.last_id):
+                    queue.put_nowait(self._tests_event(tests))
+            queue.put_nowait({"event": "ready", "id": str(self.last_id), "data": json.dumps({"last_id": self.last_id})})
+            self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        """取消訂閱，沒有訂閱者時停止監看"""
+        self._subscribers.discard(queue)
+        if not self._subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _fetch_pages(self, since: int, until: int) -> List[List[Dict[str, Any]]]:
+        """以分頁查詢 (since, until] 範圍內的紀錄"""
+        pages = []
+        while since < until:
+            tests = await asyncio.to_thread(self.store.query, since=since, limit=MAX_PAGE_SIZE)
+            tests = [test for test in tests if test["id"] <= until]
+            if not tests:
+                break
+            since = tests[0]["id"]
+            pages.append(tests)
+        return pages
+
+    @staticmethod
+    def _tests_event(tests: List[Dict[str, Any]], summary: Optional[Dict[str, int]] = None) -> Dict[str, str]:
+        """建立 tests 事件，事件 ID 為該批最新的紀錄 ID，供 Last-Event-ID 續傳"""
+        data: Dict[str, Any] = {"tests": tests}
+        if summary is not None:
+            data["summary"] = summary
+        return {
+            "event": "tests",
+            "id": str(tests[0]["id"]),
+            "data": json.dumps(data, ensure_ascii=False)
+        }
+
+    async def _run(self) -> None:
+        names = [self.store.path.name, self.store.path.name + "-wal"]
+        source = (_InotifySource.create(self.store.path, names) if self.use_inotify else None) or _PollingSource()
+        logger.info("開始監看結果資料庫 (%s)", type(source).__name__)
+        try:
+            while True:
+                await source.wait()
+                try:
+                    await self._check()
+                except Exception:
+                    logger.exception("監看結果資料庫時發生錯誤")
+        finally:
+            source.close()
+
+    async def _check(self) -> None:
+        """查詢並推送新的測試紀錄"""
+        # 與 subscribe 互斥，新訂閱者補送的紀錄與推送的紀錄不會重疊或遺漏
+        async with self._lock:
+            last_id = await asyncio.to_thread(self.store.last_id)
+            if last_id <= self.last_id:
+                return
+            pages = await self._fetch_pages(self.last_id, last_id)
+            self.last_id = last_id
+            summary = await asyncio.to_thread(self.store.summary)
+            for index, tests in enumerate(pages):
+                # 摘要統計附在最後一批，讓儀表板不必另外查詢
+                message = self._tests_event(tests, summary if index == len(pages) - 1 else None)
+                for queue in self._subscribers:
+                    queue.put_nowait(message)
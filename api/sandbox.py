@@ -0,0 +1,361 @@
+"""
+命令的資源限制
+
+每個命令可以指定 CPU、記憶體、行程數與 I/O 的上限，避免失控的命令（例如整個
+檔案系統的 find 或大型編譯）拖垮同一台機器上的其他請求：
+
+- rlimit（預設）：設定 CPU 秒數（RLIMIT_CPU）與虛擬記憶體（RLIMIT_AS）上限；無法限制
+  CPU 配額、行程數與 I/O 權重。由 /bin/sh 的 ulimit 在 exec 前設定，命令建立的
+  子行程（管線、子 shell）都會繼承
+- cgroup：設定 SHELL_HELPER_CGROUP_ROOT（已委派給本服務的 cgroup v2 目錄）時，
+  每個命令在其下建立一個子 cgroup，以 cpu.max、memory.max、pids.max 與 io.weight
+  限制整個行程樹，命令結束後讀取用量並移除 cgroup（殘留的背景行程一併結束）
+
+命令由多個工作執行緒啟動，fork 與 exec 之間不能執行 Python 程式（preexec_fn 在多執行緒
+行程中可能死結），需要在 exec 前完成的設定一律由 /bin/sh 包裝命令執行。
+
+SHELL_HELPER_LIMITS 以 JSON 設定所有命令的預設上限，例如
+`{"memory_mb": 1024, "cpu_seconds": 60}`；請求中的 limits 只能收緊，不能放寬預設上限。
+沒有任何限制時不經過本模組，命令仍以原本最快的方式啟動。
+"""
+import json
+import logging
+import os
+import shlex
+import signal
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+LIMITS_ENV = "SHELL_HELPER_LIMITS"
+CGROUP_ROOT_ENV = "SHELL_HELPER_CGROUP_ROOT"
+
+SANDBOX_AVAILABLE = resource is not None and sys.platform != "win32"
+SHELL = "/bin/sh"
+
+# 可設定的上限：cpu_quota 為可使用的 CPU 數（0.5 表示半顆），io_weight 為 1-10000
+LIMIT_KEYS = ("cpu_quota", "cpu_seconds", "memory_mb", "max_pids", "io_weight")
+RLIMIT_KEYS = frozenset({"cpu_seconds", "memory_mb"})
+CGROUP_KEYS = frozenset(LIMIT_KEYS)
+CGROUP_CONTROLLERS = ("cpu", "memory", "pids", "io")
+CPU_PERIOD_US = 100000
+IO_WEIGHT_RANGE = (1, 10000)
+
+# 移除 cgroup 前等待殘留行程結束的時間（秒）
+CGROUP_REMOVE_TIMEOUT = 1.0
+
+
+class SandboxError(ValueError):
+    """限制的設定無效，或目前的平台無法套用"""
+
+
+def _validate(limits: Dict[str, Any]) -> Dict[str, float]:
+    unknown = set(limits) - set(LIMIT_KEYS)
+    if unknown:
+        raise SandboxError(f"不支援的資源限制: {', '.join(sorted(unknown))}")
+    result = {}
+    for key, value in limits.items():
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+            raise SandboxError(f"資源限制 {key} 必須是正數")
+        if key == "io_weight" and not IO_WEIGHT_RANGE[0] <= value <= IO_WEIGHT_RANGE[1]:
+            raise SandboxError(f"io_weight 必須介於 {IO_WEIGHT_RANGE[0]} 與 {IO_WEIGHT_RANGE[1]} 之間")
+        result[key] = value if key == "cpu_quota" else int(value)
+    return result
+
+
+def default_limits() -> Dict[str, float]:
+    """SHELL_HELPER_LIMITS 設定的預設上限；格式錯誤時忽略並記錄警告"""
+    value = os.environ.get(LIMITS_ENV, "").strip()
+    if not value:
+        return {}
+    try:
+        limits = json.loads(value)
+        if not isinstance(limits, dict):
+            raise SandboxError("必須是 JSON 物件")
+        return _validate(limits)
+    except (ValueError, SandboxError) as e:
+        logger.warning("%s 格式錯誤，忽略預設資源限制: %s", LIMITS_ENV, e)
+        return {}
+
+
+def resolve_limits(value: Optional[Dict[str, Any]]) -> Optional[Dict[str, float]]:
+    """合併預設上限與請求的 limits；回傳 None 表示不限制
+
+    兩者都有設定的項目取較小值，請求只能收緊預設上限。
+    """
+    limits = default_limits()
+    for key, requested in _validate(value or {}).items():
+        limits[key] = min(requested, limits[key]) if key in limits else requested
+    return limits or None
+
+
+def cgroup_limit_files(limits: Dict[str, float]) -> Dict[str, str]:
+    """將上限轉為 cgroup v2 介面檔案的內容"""
+    files = {}
+    if "cpu_quota" in limits:
+        files["cpu.max"] = f"{max(1000, int(limits['cpu_quota'] * CPU_PERIOD_US))} {CPU_PERIOD_US}"
+    if "memory_mb" in limits:
+        files["memory.max"] = str(int(limits["memory_mb"]) * 1024 * 1024)
+        # 不允許以 swap 繞過記憶體上限
+        files["memory.swap.max"] = "0"
+    if "max_pids" in limits:
+        files["pids.max"] = str(int(limits["max_pids"]))
+    if "io_weight" in limits:
+        files["io.weight"] = f"default {int(limits['io_weight'])}"
+    return files
+
+
+def _read_keyed(path: str) -> Dict[str, int]:
+    """讀取 `鍵 值` 格式的 cgroup 檔案（cpu.stat、memory.events）"""
+    values = {}
+    try:
+        with open(path, encoding="ascii") as f:
+            for line in f:
+                key, _, value = line.partition(" ")
+                if value.strip().isdigit():
+                    values[key] = int(value)
+    except OSError:
+        pass
+    return values
+
+
+def read_cgroup_usage(path: str) -> Dict[str, Any]:
+    """讀取 cgroup 的累計用量（整個行程樹，包含已結束的子行程）"""
+    usage: Dict[str, Any] = {}
+    cpu = _read_keyed(os.path.join(path, "cpu.stat"))
+    if "user_usec" in cpu:
+        usage["cpu_user_s"] = round(cpu["user_usec"] / 1_000_000, 6)
+        usage["cpu_system_s"] = round(cpu.get("system_usec", 0) / 1_000_000, 6)
+    if cpu.get("nr_throttled"):
+        usage["cpu_throttled_s"] = round(cpu.get("throttled_usec", 0) / 1_000_000, 6)
+    try:
+        with open(os.path.join(path, "memory.peak"), encoding="ascii") as f:
+            usage["memory_peak_bytes"] = int(f.read().strip())
+    except (OSError, ValueError):
+        pass
+    events = _read_keyed(os.path.join(path, "memory.events"))
+    if events.get("oom_kill"):
+        usage["oom_kills"] = events["oom_kill"]
+    read_bytes = write_bytes = 0
+    try:
+        with open(os.path.join(path, "io.stat"), encoding="ascii") as f:
+            for line in f:
+                for field in line.split()[1:]:
+                    key, _, value = field.partition("=")
+                    if key == "rbytes":
+                        read_bytes += int(value)
+                    elif key == "wbytes":
+                        write_bytes += int(value)
+        usage["io_read_bytes"] = read_bytes
+        usage["io_write_bytes"] = write_bytes
+    except (OSError, ValueError):
+        pass
+    return usage
+
+
+class Sandbox:
+    """以 setrlimit 限制單一命令
+
+    用法：
+        with open_sandbox(limits) as sandbox:
+            args, shell = sandbox.command(args, shell)
+            process = spawn_command(args, shell)
+            ...讀取輸出...
+            return_code, usage = finish_command(process, started, pattern, sandbox)
+    """
+
+    backend = "rlimit"
+    supported = RLIMIT_KEYS
+
+    def __init__(self, limits: Dict[str, float]):
+        self.limits = limits
+        self.usage: Dict[str, Any] = {}
+        self._rlimits = []
+        if "cpu_seconds" in limits:
+            seconds = int(limits["cpu_seconds"])
+            # 超過軟上限時先收到 SIGXCPU，仍未結束再於硬上限時被 SIGKILL
+            self._rlimits.append((resource.RLIMIT_CPU, (seconds, seconds + 1)))
+        if "memory_mb" in limits:
+            size = int(limits["memory_mb"]) * 1024 * 1024
+            self._rlimits.append((resource.RLIMIT_AS, (size, size)))
+
+    @property
+    def unenforced(self) -> List[str]:
+        """此後端無法套用的限制"""
+        return [key for key in self.limits if key not in self.supported]
+
+    def _setup_steps(self) -> List[str]:
+        """命令 exec 前由 shell 執行的設定"""
+        steps = []
+        if "cpu_seconds" in self.limits:
+            steps.append(f"ulimit -t {int(self.limits['cpu_seconds'])}")
+        if "memory_mb" in self.limits and any(kind == resource.RLIMIT_AS for kind, _ in self._rlimits):
+            steps.append(f"ulimit -v {int(self.limits['memory_mb']) * 1024}")
+        return steps
+
+    def command(self, args: Union[str, List[str]], shell: bool) -> Tuple[Union[str, List[str]], bool]:
+        """需要在 exec 前完成設定時，以 /bin/sh 包裝命令；回傳 (args, shell)"""
+        steps = self._setup_steps()
+        if not steps:
+            return args, shell
+        argv = [SHELL, "-c", args] if shell else list(args)
+        return [SHELL, "-c", " && ".join(steps + ['exec "$@"']), "sh", *argv], False
+
+    def annotate(self, usage: Dict[str, Any], return_code: int) -> Dict[str, Any]:
+        """在命令的用量（api/accounting.py 的 wait_for_exit）中加上後端、上限與是否超過上限"""
+        usage.update({"backend": self.backend, "limits": dict(self.limits)})
+        if self.unenforced:
+            usage["unenforced"] = self.unenforced
+        self.usage = usage
+        exceeded = self._exceeded(return_code)
+        if exceeded:
+            usage["limit_exceeded"] = exceeded
+        return usage
+
+    def _exceeded(self, return_code: int) -> Optional[str]:
+        if "cpu_seconds" not in self.limits:
+            return None
+        # SIGXCPU 只會因 RLIMIT_CPU 送出；SIGKILL 則須確認 CPU 時間已接近上限（計時精度不同）
+        cpu = self.usage.get("cpu_user_s", 0.0) + self.usage.get("cpu_system_s", 0.0)
+        if return_code == -signal.SIGXCPU or (
+                return_code == -signal.SIGKILL and cpu >= self.limits["cpu_seconds"] * 0.9):
+            return "cpu_seconds"
+        return None
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "Sandbox":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class CgroupSandbox(Sandbox):
+    """在 cgroup v2 的子 cgroup 中執行單一命令
+
+    命令由 /bin/sh 包裝，shell 先將自己寫入 cgroup.procs 再 exec 命令，命令從第一個
+    指令開始就受到限制，之後建立的子行程也都在同一個 cgroup 中。
+    """
+
+    backend = "cgroup"
+    supported = CGROUP_KEYS
+
+    def __init__(self, limits: Dict[str, float], root: str):
+        super().__init__(limits)
+        # CPU 秒數仍以 rlimit 限制；記憶體改由 memory.max 限制整個行程樹
+        self._rlimits = [(kind, value) for kind, value in self._rlimits if kind != resource.RLIMIT_AS]
+        prepare_cgroup_root(root)
+        self.path = os.path.join(root, f"cmd-{uuid.uuid4().hex[:12]}")
+        os.mkdir(self.path)
+        try:
+            for name, value in cgroup_limit_files(limits).items():
+                try:
+                    with open(os.path.join(self.path, name), "w", encoding="ascii") as f:
+                        f.write(value)
+                except FileNotFoundError:
+                    # 例如核心未啟用 swap 帳務時沒有 memory.swap.max
+                    if name != "memory.swap.max":
+                        raise SandboxError(f"cgroup 沒有 {name}，請確認已啟用對應的控制器")
+        except Exception:
+            self.close()
+            raise
+
+    def _setup_steps(self) -> List[str]:
+        # $$ 為 shell 本身的 PID，exec 後即為命令的 PID；無法加入 cgroup 時不執行命令
+        procs = shlex.quote(os.path.join(self.path, "cgroup.procs"))
+        return [f"echo $$ > {procs}"] + super()._setup_steps()
+
+    def annotate(self, usage: Dict[str, Any], return_code: int) -> Dict[str, Any]:
+        # cgroup 的用量包含背景子行程，取代 wait4 的數值
+        usage.update(read_cgroup_usage(self.path))
+        super().annotate(usage, return_code)
+        if usage.get("oom_kills"):
+            usage["limit_exceeded"] = "memory_mb"
+        return usage
+
+    def close(self) -> None:
+        _remove_cgroup(self.path)
+
+
+def _remove_cgroup(path: str) -> None:
+    """結束 cgroup 中殘留的行程並移除 cgroup"""
+    kill_file = os.path.join(path, "cgroup.kill")
+    if os.path.exists(kill_file):
+        try:
+            with open(kill_file, "w", encoding="ascii") as f:
+                f.write("1")
+        except OSError:
+            pass
+    deadline = time.monotonic() + CGROUP_REMOVE_TIMEOUT
+    while True:
+        try:
+            os.rmdir(path)
+            return
+        except FileNotFoundError:
+            return
+        except OSError:
+            if time.monotonic() >= deadline:
+                logger.warning("無法移除 cgroup %s（仍有行程）", path)
+                return
+            time.sleep(0.01)
+
+
+_prepared_roots = set()
+
+
+def prepare_cgroup_root(root: str) -> None:
+    """在委派的 cgroup 目錄中啟用子 cgroup 需要的控制器（每個目錄只做一次）"""
+    if root in _prepared_roots:
+        return
+    try:
+        with open(os.path.join(root, "cgroup.controllers"), encoding="ascii") as f:
+            available = set(f.read().split())
+    except OSError as e:
+        raise SandboxError(f"{root} 不是可用的 cgroup v2 目錄: {e}") from e
+    wanted = [name for name in CGROUP_CONTROLLERS if name in available]
+    try:
+        with open(os.path.join(root, "cgroup.subtree_control"), "w", encoding="ascii") as f:
+            f.write(" ".join(f"+{name}" for name in wanted))
+    except OSError as e:
+        # cgroup v2 不允許在仍有行程的 cgroup 啟用子控制器
+        raise SandboxError(f"無法在 {root} 啟用 cgroup 控制器（該 cgroup 中不能有行程）: {e}") from e
+    _prepared_roots.add(root)
+
+
+def open_sandbox(limits: Optional[Dict[str, float]]) -> Optional[Sandbox]:
+    """依 resolve_limits 的結果建立沙箱；limits 為 None 時回傳 None（不限制）"""
+    if not limits:
+        return None
+    if not SANDBOX_AVAILABLE:
+        raise SandboxError("此平台不支援資源限制")
+    root = os.environ.get(CGROUP_ROOT_ENV)
+    if root:
+        return CgroupSandbox(limits, root)
+    return Sandbox(limits)
+
+
+def usage_note(usage: Optional[Dict[str, Any]]) -> str:
+    """附加在工具結果後的資源用量說明"""
+    if not usage:
+        return ""
+    parts = [f"CPU {usage['cpu_user_s'] + usage['cpu_system_s']:.2f} 秒"]
+    if "memory_peak_bytes" in usage:
+        parts.append(f"記憶體峰值 {usage['memory_peak_bytes'] / 1024 / 1024:.1f} MB")
+    elif "max_rss_kb" in usage:
+        parts.append(f"最大 RSS {usage['max_rss_kb'] / 1024:.1f} MB")
+    note = f"\n\n[資源用量（{usage['backend']}）：{'，'.join(parts)}]"
+    if usage.get("limit_exceeded"):
+        note += f"\n[命令超過資源限制 {usage['limit_exceeded']}，已被終止]"
+    return note
@@ -0,0 +1,334 @@
+"""
+命令啟動器
+
+預設直接以 subprocess.Popen 啟動命令。設定 SHELL_HELPER_SPAWNER=forkserver 時，
+改由啟動時建立的小型輔助行程（forkserver）以 posix_spawn 啟動命令，再透過
+Unix socket（SCM_RIGHTS）將輸出管線交回伺服器，啟動時間不受伺服器記憶體大小影響。
+"""
+import io
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+SPAWNER_ENV = "SHELL_HELPER_SPAWNER"
+SPAWNER_MODES = ("popen", "forkserver")
+SHELL = "/bin/sh"
+MAX_MESSAGE = 65536
+
+# forkserver 需要 SCM_RIGHTS 傳遞檔案描述元與 posix_spawn
+FORKSERVER_AVAILABLE = (
+    sys.platform != "win32" and hasattr(socket, "send_fds") and hasattr(os, "posix_spawn")
+)
+
+
+class ForkServerError(RuntimeError):
+    """forkserver 本身無法使用（不是命令啟動失敗）"""
+
+
+def _send_message(sock: socket.socket, message: dict, fds: Optional[List[int]] = None) -> None:
+    data = json.dumps(message).encode("utf-8") + b"\n"
+    if fds:
+        socket.send_fds(sock, [data], fds)
+    else:
+        sock.sendall(data)
+
+
+class ForkServerProcess:
+    """由 forkserver 啟動的命令，提供與 subprocess.Popen 相同的常用介面"""
+
+    def __init__(self, conn: socket.socket, pid: int, stdout_fd: int, stderr_fd: int,
+                 text: bool, buffered: bytes):
+        self.pid = pid
+        self.returncode: Optional[int] = None
+        # forkserver 回收命令時記錄的資源用量（見 reap_with_usage）
+        self.usage: Dict[str, float] = {}
+        self._conn = conn
+        self._buffer = buffered
+        self.stdout = _open_pipe(stdout_fd, text)
+        self.stderr = _open_pipe(stderr_fd, text)
+        self._parse_buffer()
+
+    def _parse_buffer(self) -> None:
+        while b"\n" in self._buffer:
+            line, self._buffer = self._buffer.split(b"\n", 1)
+            message = json.loads(line)
+            if "returncode" in message:
+                self.returncode = message["returncode"]
+                self.usage = message.get("usage", {})
+                self._conn.close()
+
+    def _receive(self, timeout: Optional[float]) -> None:
+        self._conn.settimeout(timeout)
+        try:
+            data = self._conn.recv(MAX_MESSAGE)
+        except (BlockingIOError, socket.timeout):
+            return
+        if not data:
+            # forkserver 已結束，無法得知返回碼
+            self.returncode = -signal.SIGKILL
+            self._conn.close()
+            return
+        self._buffer += data
+        self._parse_buffer()
+
+    def poll(self) -> Optional[int]:
+        if self.returncode is None:
+            self._receive(0)
+        return self.returncode
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        # 返回碼訊息可能分成多次 recv 送達，持續讀取到完整一行或逾時為止
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.returncode is None:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            self._receive(remaining)
+            if self.returncode is None and deadline is not None and time.monotonic() >= deadline:
+                raise subprocess.TimeoutExpired(str(self.pid), timeout)
+        return self.returncode
+
+    def kill(self) -> None:
+        if self.returncode is None:
+            try:
+                os.kill(self.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+
+def _open_pipe(fd: int, text: bool):
+    stream = io.open(fd, "rb")
+    return io.TextIOWrapper(stream) if text else stream
+
+
+class ForkServer:
+    """forkserver 的用戶端
+
+    輔助行程只載入標準函式庫，記憶體用量小且固定。每次啟動命令時建立一組新的
+    socketpair，將其中一端交給輔助行程，輔助行程啟動命令後回傳 PID 與輸出管線，
+    命令結束時再回傳返回碼。
+    """
+
+    def __init__(self):
+        self._process: Optional[subprocess.Popen] = None
+        self._control: Optional[socket.socket] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def start(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._process = subprocess.Popen(
+                [sys.executable, "-S", "-I", __file__, str(child.fileno())],
+                pass_fds=[child.fileno()],
+                stdin=subprocess.DEVNULL
+            )
+            child.close()
+            self._control = parent
+
+    def spawn(self, args: Union[str, List[str]], shell: bool = True, text: bool = True) -> ForkServerProcess:
+        """以 forkserver 啟動命令，標準輸入為 /dev/null"""
+        if not self.running:
+            self.start()
+        conn, remote = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            with self._lock:
+                _send_message(self._control, {"args": args, "shell": shell}, [remote.fileno()])
+            data, fds, _, _ = socket.recv_fds(conn, MAX_MESSAGE, 2)
+        except OSError as e:
+            conn.close()
+            raise ForkServerError(f"無法與 forkserver 通訊: {e}") from e
+        finally:
+            remote.close()
+
+        line, _, rest = data.partition(b"\n")
+        if not line:
+            conn.close()
+            raise ForkServerError("forkserver 沒有回應")
+        message = json.loads(line)
+        if "errno" in message:
+            # 命令本身無法啟動（例如找不到執行檔），與 subprocess.Popen 一樣拋出 OSError
+            for fd in fds:
+                os.close(fd)
+            conn.close()
+            raise OSError(message["errno"], message["error"], message.get("filename"))
+        return ForkServerProcess(conn, message["pid"], fds[0], fds[1], text, rest)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._control is not None:
+                self._control.close()
+                self._control = None
+            if self._process is not None:
+                self._process.wait(timeout=5)
+                self._process = None
+
+
+FORKSERVER = ForkServer()
+
+
+def start_spawner() -> None:
+    """伺服器啟動時呼叫：使用 forkserver 時預先啟動輔助行程"""
+    if spawner_mode() == "forkserver":
+        FORKSERVER.start()
+
+
+def stop_spawner() -> None:
+    if FORKSERVER.running:
+        FORKSERVER.close()
+
+
+def spawner_mode() -> str:
+    mode = os.environ.get(SPAWNER_ENV, "popen").strip().lower()
+    if mode == "forkserver" and not FORKSERVER_AVAILABLE:
+        return "popen"
+    return mode if mode in SPAWNER_MODES else "popen"
+
+
+def spawn_command(args: Union[str, List[str]], shell: bool = True):
+    """啟動命令並擷取標準輸出與錯誤輸出（文字模式）
+
+    forkserver 無法使用時退回 subprocess.Popen。
+    """
+    if spawner_mode() == "forkserver" and isinstance(args, str) == shell:
+        try:
+            return FORKSERVER.spawn(args, shell)
+        except ForkServerError:
+            logger.warning("forkserver 無法啟動命令，改用 subprocess", exc_info=True)
+    return subprocess.Popen(
+        args,
+        shell=shell,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+
+
+def _spawn(request: dict, conn: socket.socket) -> Optional[int]:
+    """在 forkserver 中以 posix_spawn 啟動命令，將 PID 與輸出管線送回；失敗時回傳 None"""
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    file_actions = [
+        (os.POSIX_SPAWN_OPEN, 0, os.devnull, os.O_RDONLY, 0),
+        (os.POSIX_SPAWN_DUP2, out_w, 1),
+        (os.POSIX_SPAWN_DUP2, err_w, 2),
+    ]
+    try:
+        if request["shell"]:
+            pid = os.posix_spawn(SHELL, [SHELL, "-c", request["args"]], os.environ,
+                                 file_actions=file_actions)
+        else:
+            pid = os.posix_spawnp(request["args"][0], request["args"], os.environ,
+                                  file_actions=file_actions)
+    except OSError as e:
+        _send_message(conn, {"errno": e.errno, "error": e.strerror, "filename": e.filename})
+        return None
+    finally:
+        os.close(out_w)
+        os.close(err_w)
+    try:
+        _send_message(conn, {"pid": pid}, [out_r, err_r])
+    finally:
+        os.close(out_r)
+        os.close(err_r)
+    return pid
+
+
+def _read_proc_io(pid: int) -> Dict[str, int]:
+    """讀取 /proc/<pid>/io（包含已回收的子行程），無法讀取時回傳空字典"""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/io", encoding="ascii") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                values[key] = int(value)
+    except (OSError, ValueError):
+        return {}
+    return values
+
+
+def reap_with_usage(pid: int) -> Tuple[int, Dict[str, float]]:
+    """等待子行程結束並回收，回傳 (返回碼, 資源用量)
+
+    先以 WNOWAIT 等待結束但不回收，趁行程仍存在時讀取 /proc/<pid>/io，
+    再以 wait4 回收並取得 CPU 時間與最大 RSS。用量包含命令已回收的子行程
+    （例如 sh -c 啟動的管線）。最大 RSS 包含 exec 前複製自父行程的位址空間。
+    """
+    io_counters = {}
+    if hasattr(os, "waitid"):
+        while True:
+            try:
+                os.waitid(os.P_PID, pid, os.WEXITED | os.WNOWAIT)
+                break
+            except InterruptedError:
+                continue
+        io_counters = _read_proc_io(pid)
+    _, status, rusage = os.wait4(pid, 0)
+    # Linux 的 ru_maxrss 單位為 KiB，macOS 為位元組
+    usage = {
+        "cpu_user_s": round(rusage.ru_utime, 6),
+        "cpu_system_s": round(rusage.ru_stime, 6),
+        "max_rss_kb": rusage.ru_maxrss // 1024 if sys.platform == "darwin" else rusage.ru_maxrss,
+    }
+    if io_counters:
+        usage["io_read_bytes"] = io_counters.get("read_bytes", 0)
+        usage["io_write_bytes"] = io_counters.get("write_bytes", 0)
+        # 包含快取命中與管線的讀寫字元數
+        usage["read_chars"] = io_counters.get("rchar", 0)
+        usage["write_chars"] = io_counters.get("wchar", 0)
+    else:
+        # 沒有 /proc 時以區塊數估計（512 位元組）
+        usage["io_read_bytes"] = rusage.ru_inblock * 512
+        usage["io_write_bytes"] = rusage.ru_oublock * 512
+    return os.waitstatus_to_exitcode(status), usage
+
+
+def _wait(pid: int, conn: socket.socket) -> None:
+    """等待命令結束並送回返回碼與資源用量"""
+    with conn:
+        returncode, usage = reap_with_usage(pid)
+        try:
+            _send_message(conn, {"returncode": returncode, "usage": usage})
+        except OSError:
+            pass
+
+
+def _serve(control_fd: int) -> None:
+    """forkserver 主迴圈：在主執行緒啟動命令，每個命令以一個執行緒等待結束"""
+    control = socket.socket(fileno=control_fd)
+    buffer = b""
+    pending_fds: List[int] = []
+    while True:
+        data, fds, _, _ = socket.recv_fds(control, MAX_MESSAGE, 16)
+        if not data:
+            break
+        buffer += data
+        pending_fds.extend(fds)
+        # 每個請求一行 JSON 並附帶一個 socket
+        while b"\n" in buffer and pending_fds:
+            line, buffer = buffer.split(b"\n", 1)
+            conn = socket.socket(fileno=pending_fds.pop(0))
+            try:
+                pid = _spawn(json.loads(line), conn)
+            except OSError:
+                pid = None
+            if pid is None:
+                conn.close()
+            else:
+                threading.Thread(target=_wait, args=(pid, conn), daemon=True).start()
+
+
+if __name__ == "__main__":
+    _serve(int(sys.argv[1]))
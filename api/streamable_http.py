@@ -0,0 +1,212 @@
+"""
+MCP Streamable HTTP transport（2025-03-26 版規格）
+
+單一端點接受 JSON-RPC 訊息：
+- POST：送出請求、通知或批次。只含通知時回應 202；只有 initialize、tools/list 等
+  快速的請求時直接回應 JSON；含有 tools/call 且客戶端接受 text/event-stream 時，
+  以 SSE 串流在同一條連線上回傳結果，每個事件都有 id
+- GET：帶 Last-Event-ID 標頭時從該事件之後續傳同一個串流（斷線續傳）；
+  本伺服器不會主動推送訊息，不帶 Last-Event-ID 時回應 405
+- DELETE：結束工作階段
+
+initialize 的回應帶有 Mcp-Session-Id 標頭，之後的請求都必須帶上；
+未知或已過期的工作階段回應 404，客戶端應重新 initialize。
+"""
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from sse_starlette.sse import EventSourceResponse
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+SESSION_HEADER = "mcp-session-id"
+PROTOCOL_VERSION_HEADER = "mcp-protocol-version"
+LAST_EVENT_ID_HEADER = "last-event-id"
+
+# 工作階段閒置多久後失效（秒）與同時保留的數量上限
+SESSION_TTL = 3600.0
+MAX_SESSIONS = 1000
+# 每個工作階段保留最近幾個串流的事件，供斷線續傳
+MAX_STREAMS_PER_SESSION = 32
+
+# 以 SSE 串流回應的方法（可能執行很久）
+STREAMING_METHODS = frozenset({"tools/call"})
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+def _error(code: int, message: str, status_code: int, request_id: Any = None) -> JSONResponse:
+    return JSONResponse(status_code=status_code, content={
+        "jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}
+    })
+
+
+class _Stream:
+    """一次 POST 的 SSE 串流：依序保存送出的事件，連線中斷後仍繼續收集結果"""
+
+    def __init__(self, stream_id: str, expected: int):
+        self.id = stream_id
+        self.expected = expected
+        self.events: List[Tuple[str, Dict[str, Any]]] = []
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return len(self.events) >= self.expected
+
+    def add(self, message: Dict[str, Any]) -> None:
+        self.events.append((f"{self.id}-{len(self.events)}", message))
+        self.changed.set()
+
+    async def replay(self, start: int = 0):
+        """從第 start 個事件開始送出，直到所有回應都送出為止"""
+        index = start
+        while True:
+            while index < len(self.events):
+                event_id, message = self.events[index]
+                index += 1
+                yield {"id": event_id, "event": "message", "data": json.dumps(message, ensure_ascii=False)}
+            if self.done:
+                return
+            self.changed.clear()
+            if index >= len(self.events):
+                await self.changed.wait()
+
+
+class Session:
+    def __init__(self, protocol_version: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.protocol_version = protocol_version
+        self.last_used = time.monotonic()
+        self.streams: "OrderedDict[str, _Stream]" = OrderedDict()
+
+    def new_stream(self, expected: int) -> _Stream:
+        stream = _Stream(uuid.uuid4().hex[:12], expected)
+        self.streams[stream.id] = stream
+        while len(self.streams) > MAX_STREAMS_PER_SESSION:
+            self.streams.popitem(last=False)
+        return stream
+
+
+class StreamableHTTPTransport:
+    """以 handler（處理單一 JSON-RPC 請求、回傳回應的協程）提供 Streamable HTTP 端點
+
+    用法：
+        transport = StreamableHTTPTransport(handle_jsonrpc_request)
+        app.add_api_route("/mcp", transport.handle_post, methods=["POST"])
+        app.add_api_route("/mcp", transport.handle_get, methods=["GET"])
+        app.add_api_route("/mcp", transport.handle_delete, methods=["DELETE"])
+    """
+
+    def __init__(self, handler: Handler, session_ttl: float = SESSION_TTL):
+        self.handler = handler
+        self.session_ttl = session_ttl
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+
+    def _expire_sessions(self) -> None:
+        deadline = time.monotonic() - self.session_ttl
+        while self.sessions:
+            session = next(iter(self.sessions.values()))
+            if session.last_used >= deadline and len(self.sessions) <= MAX_SESSIONS:
+                break
+            self.sessions.popitem(last=False)
+
+    def _session(self, request: Request) -> Union[Session, JSONResponse]:
+        self._expire_sessions()
+        session_id = request.headers.get(SESSION_HEADER)
+        if not session_id:
+            return _error(INVALID_REQUEST, "缺少 Mcp-Session-Id 標頭，請先呼叫 initialize", 400)
+        session = self.sessions.get(session_id)
+        if session is None:
+            return _error(INVALID_REQUEST, "工作階段不存在或已過期，請重新 initialize", 404)
+        session.last_used = time.monotonic()
+        self.sessions.move_to_end(session_id)
+        return session
+
+    async def handle_post(self, request: Request) -> Response:
+        try:
+            payload = json.loads(await request.body())
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return _error(PARSE_ERROR, "解析錯誤：無效的 JSON", 400)
+
+        batch = isinstance(payload, list)
+        messages = payload if batch else [payload]
+        if not messages or not all(isinstance(message, dict) for message in messages):
+            return _error(INVALID_REQUEST, "無效的 JSON-RPC 訊息", 400)
+
+        if any(message.get("method") == "initialize" for message in messages):
+            if batch:
+                return _error(INVALID_REQUEST, "initialize 不能放在批次中", 400)
+            return await self._initialize(messages[0])
+
+        session = self._session(request)
+        if isinstance(session, JSONResponse):
+            return session
+
+        # 只有帶 id 的請求需要回應；通知與客戶端送來的回應直接接受
+        requests = [message for message in messages if "id" in message and "method" in message]
+        if not requests:
+            return Response(status_code=202)
+
+        accept = request.headers.get("accept", "")
+        if "text/event-stream" in accept and any(req["method"] in STREAMING_METHODS for req in requests):
+            return self._stream_response(session, requests)
+
+        responses = await asyncio.gather(*(self.handler(req) for req in requests))
+        return JSONResponse(content=list(responses) if batch else responses[0],
+                            headers={SESSION_HEADER: session.id})
+
+    async def _initialize(self, message: Dict[str, Any]) -> Response:
+        response = await self.handler(message)
+        if "error" in response:
+            return JSONResponse(content=response)
+        self._expire_sessions()
+        session = Session(response.get("result", {}).get("protocolVersion"))
+        self.sessions[session.id] = session
+        return JSONResponse(content=response, headers={SESSION_HEADER: session.id})
+
+    def _stream_response(self, session: Session, requests: List[Dict[str, Any]]) -> Response:
+        stream = session.new_stream(len(requests))
+
+        async def run(req: Dict[str, Any]) -> None:
+            try:
+                stream.add(await self.handler(req))
+            except Exception as e:
+                stream.add({"jsonrpc": "2.0", "id": req.get("id"),
+                            "error": {"code": -32603, "message": f"內部錯誤: {e}"}})
+
+        async def run_all() -> None:
+            # 每個請求完成就送出，不必等待整個批次
+            await asyncio.gather(*(run(req) for req in requests))
+
+        # 以獨立的 task 執行：客戶端斷線後仍會完成並保存結果，可用 GET 續傳
+        stream.task = asyncio.create_task(run_all())
+        return EventSourceResponse(stream.replay(), headers={SESSION_HEADER: session.id})
+
+    async def handle_get(self, request: Request) -> Response:
+        session = self._session(request)
+        if isinstance(session, JSONResponse):
+            return session
+        last_event_id = request.headers.get(LAST_EVENT_ID_HEADER)
+        if not last_event_id:
+            return Response(status_code=405, headers={"Allow": "POST, DELETE"})
+        stream_id, _, index = last_event_id.rpartition("-")
+        stream = session.streams.get(stream_id)
+        if stream is None or not index.isdigit():
+            return _error(INVALID_REQUEST, "無法續傳：找不到事件", 404)
+        return EventSourceResponse(stream.replay(int(index) + 1), headers={SESSION_HEADER: session.id})
+
+    async def handle_delete(self, request: Request) -> Response:
+        session = self._session(request)
+        if isinstance(session, JSONResponse):
+            return session
+        del self.sessions[session.id]
+        return Response(status_code=204)
@@ -0,0 +1,183 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# PowerShell Format-Table 的分隔線：只由 "-" 與空白組成
+SEPARATOR_LINE = re.compile(r"^[-\s]+$")
+TOKEN = re.compile(r"\S+")
+INTEGER = re.compile(r"^[+-]?\d+$")
+NUMBER = re.compile(r"^[+-]?(\d+\.\d*|\.\d+|\d+)([eE][+-]?\d+)?$")
+
+
+def _column_spans(separator: str) -> List[Tuple[int, int]]:
+    """由分隔線的連續 "-" 區段取得各欄位的位置"""
+    return [match.span() for match in re.finditer(r"-+", separator)]
+
+
+def _assign_column(spans: List[Tuple[int, int]], start: int, end: int) -> int:
+    """決定一個單詞屬於哪個欄位
+
+    數值欄位靠右對齊，較長的值（例如 6 位數的 PID）會超出分隔線左側，
+    因此優先以單詞最後一個字元所在的欄位為準，其次是第一個字元，
+    都不在任何欄位內時選擇最接近的欄位。
+    """
+    for position in (end - 1, start):
+        for index, (col_start, col_end) in enumerate(spans):
+            if col_start <= position < col_end:
+                return index
+    distances = [
+        min(abs(start - col_end), abs(col_start - end))
+        for col_start, col_end in spans
+    ]
+    return distances.index(min(distances))
+
+
+def _infer_type(values: List[Optional[str]]) -> str:
+    """推斷欄位型別：integer、number 或 string"""
+    present = [value for value in values if value is not None]
+    if present and all(INTEGER.match(value) for value in present):
+        return "integer"
+    if present and all(NUMBER.match(value) for value in present):
+        return "number"
+    return "string"
+
+
+def _convert(value: Optional[str], column_type: str) -> Any:
+    if value is None:
+        return None
+    if column_type == "integer":
+        return int(value)
+    if column_type == "number":
+        return float(value)
+    return value
+
+
+def parse_fixed_width_table(lines: List[str], start: int) -> Tuple[Optional[Dict[str, Any]], int]:
+    """解析從 start 行開始（表頭、分隔線、資料列）的固定寬度表格
+
+    Returns:
+        (表格, 表格結束後的下一行索引)；無法解析時表格為 None
+    """
+    header, separator = lines[start], lines[start + 1]
+    spans = _column_spans(separator)
+    if not spans:
+        return None, start + 1
+
+    names = [header[col_start:col_end].strip() for col_start, col_end in spans]
+    raw_rows: List[List[Optional[str]]] = []
+    index = start + 2
+    while index < len(lines):
+        line = lines[index]
+        if not line.strip():
+            break
+        cells: List[List[str]] = [[] for _ in spans]
+        for match in TOKEN.finditer(line):
+            cells[_assign_column(spans, match.start(), match.end())].append(match.group())
+        raw_rows.append([" ".join(words) if words else None for words in cells])
+        index += 1
+
+    types = [_infer_type([row[i] for row in raw_rows]) for i in range(len(spans))]
+    return {
+        "source": "fixed_width",
+        "start_line": start,
+        "end_line": index,
+        "columns": [{"name": name, "type": column_type} for name, column_type in zip(names, types)],
+        "rows": [[_convert(value, types[i]) for i, value in enumerate(row)] for row in raw_rows]
+    }, index
+
+
+def _json_type(values: List[Any]) -> str:
+    present = [value for value in values if value is not None]
+    if not present:
+        return "string"
+    if all(isinstance(value, bool) for value in present):
+        return "boolean"
+    if all(isinstance(value, int) and not isinstance(value, bool) for value in present):
+        return "integer"
+    if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+        return "number"
+    if all(isinstance(value, str) for value in present):
+        return "string"
+    return "json"
+
+
+def parse_json_table(output: str) -> Optional[Dict[str, Any]]:
+    """解析 ConvertTo-Json / --json 等 JSON 輸出（物件或物件陣列）"""
+    text = output.strip()
+    if not text or text[0] not in "[{":
+        return None
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+
+    records = [data] if isinstance(data, dict) else data
+    if not isinstance(records, list) or not records or not all(isinstance(r, dict) for r in records):
+        return None
+
+    names: List[str] = []
+    for record in records:
+        for key in record:
+            if key not in names:
+                names.append(key)
+    rows = [[record.get(name) for name in names] for record in records]
+    return {
+        "source": "json",
+        "columns": [
+            {"name": name, "type": _json_type([row[i] for row in rows])}
+            for i, name in enumerate(names)
+        ],
+        "rows": rows
+    }
+
+
+def parse_tables(output: str) -> List[Dict[str, Any]]:
+    """解析命令輸出中的表格
+
+    整段輸出為 JSON 時視為單一表格；否則找出所有 PowerShell Format-Table
+    風格的固定寬度表格（表頭下一行為 "-" 分隔線）。固定寬度表格附帶
+    start_line / end_line（以 "\\n" 分行的行索引），供呈現時替換原始文字。
+
+    Returns:
+        表格列表，每個表格包含 columns（名稱與型別）與 rows
+    """
+    if not output:
+        return []
+
+    json_table = parse_json_table(output)
+    if json_table is not None:
+        return [json_table]
+
+    lines = [line.rstrip("\r") for line in output.split("\n")]
+    tables = []
+    index = 0
+    while index < len(lines) - 1:
+        if lines[index].strip() and SEPARATOR_LINE.match(lines[index + 1]) and "-" in lines[index + 1]:
+            table, index = parse_fixed_width_table(lines, index)
+            if table is not None:
+                tables.append(table)
+            continue
+        index += 1
+    return tables
+
+
+def remaining_text(output: str, tables: List[Dict[str, Any]]) -> str:
+    """移除已解析為表格的行，取得其餘的文字內容"""
+    if any(table["source"] == "json" for table in tables):
+        return ""
+    lines = [line.rstrip("\r") for line in output.split("\n")]
+    covered = set()
+    for table in tables:
+        covered.update(range(table["start_line"], table["end_line"]))
+    return "\n".join(line for i, line in enumerate(lines) if i not in covered).strip()
+
+
+def compact_tables(output: str, tables: List[Dict[str, Any]]) -> str:
+    """將表格與其餘文字轉為精簡的 JSON 字串（供 LLM 客戶端使用）"""
+    return json.dumps({
+        "text": remaining_text(output, tables),
+        "tables": [
+            {"columns": table["columns"], "rows": table["rows"]}
+            for table in tables
+        ]
+    }, ensure_ascii=False, separators=(",", ":"))
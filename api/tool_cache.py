@@ -0,0 +1,328 @@
+"""
+聊天客戶端的工具結果快取
+
+模型經常在後續對話中重複執行完全相同的 shell_helper 呼叫。ToolResultCache 以
+(工具名稱, 參數) 為鍵保存同一個聊天工作階段中的結果，重複的呼叫直接回傳快取，
+不再送到 MCP 伺服器。
+
+只有可以確定不會修改系統狀態的命令會被快取（classify_tool_call 回傳 "read"）；
+其他命令執行前會清除整個快取，因為無法得知它影響了哪些先前的結果。
+"""
+import json
+import os
+import re
+import shlex
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 快取有效秒數，設為 0 時停用快取
+TOOL_CACHE_TTL_ENV = "SHELL_HELPER_TOOL_CACHE_TTL"
+DEFAULT_TTL = 300.0
+MAX_ENTRIES = 256
+
+# 結果在工作階段中不會改變的工具，不設有效期限
+STATIC_TOOLS = frozenset({"get_platform"})
+
+# 不修改系統狀態的命令（*nix 命令與 PowerShell 別名）
+READ_ONLY_COMMANDS = frozenset({
+    "arch", "basename", "cat", "column", "cut", "df", "diff", "dirname", "du", "echo",
+    "file", "find", "grep", "egrep", "fgrep", "groups", "head", "hostname", "id", "jq",
+    "locale", "ls", "lsb_release", "lsblk", "lscpu", "md5sum", "nproc", "printenv", "printf",
+    "pwd", "readlink", "realpath", "rg", "sed", "sha1sum", "sha256sum", "sort", "stat", "tail",
+    "tr", "tree", "type", "uname", "uniq", "wc", "whereis", "which", "whoami",
+    "dir", "gci", "gc", "gi", "select", "where", "ft", "fl", "measure",
+})
+
+# 唯讀但結果隨時間變化的命令：不快取，也不清除快取
+VOLATILE_COMMANDS = frozenset({
+    "date", "free", "iostat", "lsof", "netstat", "ps", "ss", "top", "uptime", "vmstat", "w", "who",
+    "get-date", "get-process", "get-counter", "get-service", "get-nettcpconnection",
+})
+
+# 以這些動詞開頭的 PowerShell cmdlet 不修改系統狀態
+READ_ONLY_CMDLET_VERBS = ("get-", "select-", "where-", "format-", "sort-", "measure-",
+                          "convertto-", "test-", "resolve-", "out-string", "write-output")
+
+# 唯讀命令中會寫入檔案、執行其他程式或持續執行的選項
+# （單一字母的短選項也比對合併寫法，例如 sort -uo out）
+UNSAFE_OPTIONS = {
+    "file": ("-C", "--compile"),
+    "find": ("-delete", "-exec", "-execdir", "-ok", "-fprint", "-fls"),
+    "rg": ("--pre",),
+    "sed": ("-i", "--in-place"),
+    "sort": ("-o", "--output", "--compress-program"),
+    "tail": ("-f", "-F", "--follow"),
+    "tree": ("-o", "-R"),
+}
+
+# 第二個位置參數為輸出檔的命令（uniq IN OUT），以及其帶有參數值的短選項
+OUTPUT_OPERAND_COMMANDS = {
+    "uniq": frozenset({"-f", "-s", "-w"}),
+}
+
+# 只讀取儲存庫狀態的 git 子命令
+READ_ONLY_GIT = frozenset({"status", "log", "diff", "show", "rev-parse", "ls-files", "blame", "describe"})
+
+# 執行後面參數中的命令，依被執行的命令判斷
+WRAPPER_COMMANDS = frozenset({"sudo", "time", "nice"})
+# env 帶有參數值的選項；-S（--split-string）會再拆解成命令，無法判斷
+ENV_VALUE_OPTIONS = frozenset({"-u", "--unset", "-C", "--chdir"})
+
+# sed 腳本中寫入檔案或執行命令的指令：w、W、e，以及 s 指令的 w、e 旗標
+# （例如 `w out`、`1,5W out`、`s/a/b/gw out`）；寧可誤判為 write
+SED_WRITE_COMMAND = re.compile(r"(?:^|[;{}\n/\d$,!])\s*[gpiImM\d]*[wWe](?:\s|$|;|})")
+
+# 分隔命令的運算子；其後的第一個字詞是下一個命令
+COMMAND_SEPARATORS = frozenset({"|", "||", "&&", ";", "&", "(", ")", "\n"})
+# 不寫入檔案的重新導向目標
+SAFE_REDIRECT_TARGETS = frozenset({"/dev/null", "$null"})
+
+
+def _env_read_kind(args: List[str]) -> str:
+    """env 只列出環境變數時為 read；執行命令時依該命令判斷"""
+    index = 0
+    while index < len(args):
+        word = args[index]
+        if word.startswith(("-S", "--split-string")):
+            return "write"
+        if word in ENV_VALUE_OPTIONS:
+            index += 2
+        elif word.startswith("-") or "=" in word:
+            index += 1
+        else:
+            return _command_read_kind(args[index:])
+    return "read"
+
+
+def _sed_writes(args: List[str]) -> bool:
+    """sed 是否可能寫入檔案或執行命令：就地編輯、腳本檔或腳本中的 w／e 指令"""
+    scripts: List[str] = []
+    operands: List[str] = []
+    index = 0
+    while index < len(args):
+        word = args[index]
+        if word in ("-e", "--expression"):
+            scripts.append(args[index + 1] if index + 1 < len(args) else "")
+            index += 1
+        elif word.startswith("--expression="):
+            scripts.append(word.split("=", 1)[1])
+        elif word in ("-f", "--file") or word.startswith(("--file=", "--in-place")):
+            return True
+        elif word.startswith("-") and not word.startswith("--") and len(word) > 1:
+            # 合併的短選項，例如 -ne 'p'、-ni
+            for position, flag in enumerate(word[1:], 1):
+                if flag in "if":
+                    return True
+                if flag == "e":
+                    rest = word[position + 1:]
+                    if rest:
+                        scripts.append(rest)
+                    else:
+                        scripts.append(args[index + 1] if index + 1 < len(args) else "")
+                        index += 1
+                    break
+        elif not word.startswith("-"):
+            operands.append(word)
+        index += 1
+    if not scripts and operands:
+        scripts.append(operands[0])
+    return any(SED_WRITE_COMMAND.search(script) for script in scripts)
+
+
+def _has_unsafe_option(args: List[str], options: Tuple[str, ...]) -> bool:
+    """args 中是否有 options 之一；單一字母的選項也會在合併的短選項中找到"""
+    for word in args:
+        if word == "--":
+            return False
+        if any(word.startswith(option) for option in options):
+            return True
+        if word.startswith("-") and not word.startswith("--") and any(
+                len(option) == 2 and option[1] in word[1:] for option in options):
+            return True
+    return False
+
+
+def _operand_count(args: List[str], value_options: frozenset) -> int:
+    """位置參數的數量，略過選項與其參數值"""
+    count = 0
+    index = 0
+    options_done = False
+    while index < len(args):
+        word = args[index]
+        if options_done or word == "-" or not word.startswith("-"):
+            count += 1
+        elif word == "--":
+            options_done = True
+        elif word in value_options:
+            index += 1
+        index += 1
+    return count
+
+
+def _command_read_kind(words: List[str]) -> str:
+    """判斷單一命令（argv）的類型：read、volatile 或 write"""
+    name = words[0].lower()
+    if name in WRAPPER_COMMANDS and len(words) > 1:
+        return _command_read_kind(words[1:])
+    if name == "env":
+        return _env_read_kind(words[1:])
+    if name in VOLATILE_COMMANDS:
+        return "volatile"
+    if name == "git":
+        if any(word.startswith("--output") for word in words[2:]):
+            return "write"
+        return "read" if len(words) > 1 and words[1] in READ_ONLY_GIT else "write"
+    if name == "sed" and _sed_writes(words[1:]):
+        return "write"
+    if name in OUTPUT_OPERAND_COMMANDS and _operand_count(words[1:], OUTPUT_OPERAND_COMMANDS[name]) > 1:
+        return "write"
+    if name in READ_ONLY_COMMANDS or name.startswith(READ_ONLY_CMDLET_VERBS):
+        if _has_unsafe_option(words[1:], UNSAFE_OPTIONS.get(name, ())):
+            return "write"
+        return "read"
+    return "write"
+
+
+def classify_shell_command(shell_command: Optional[str] = None, argv: Optional[List[str]] = None) -> str:
+    """判斷 shell_helper 命令的類型
+
+    回傳 "read"（可以快取）、"volatile"（唯讀但不快取）或 "write"（可能修改系統狀態，
+    或無法確定）。管線與 ; / && 串接的每個命令都是唯讀時整體才是唯讀；
+    寫入檔案的重新導向、命令替換或無法解析的命令都視為 write。
+    """
+    if argv:
+        return _command_read_kind(argv)
+    if not shell_command or "`" in shell_command or "$(" in shell_command:
+        return "write"
+    try:
+        lexer = shlex.shlex(shell_command, posix=True, punctuation_chars=True)
+        lexer.whitespace_split = True
+        tokens = list(lexer)
+    except ValueError:
+        return "write"
+
+    kinds = []
+    words: List[str] = []
+    index = 0
+    while index <= len(tokens):
+        token = tokens[index] if index < len(tokens) else ";"
+        if token in COMMAND_SEPARATORS:
+            if words:
+                kinds.append(_command_read_kind(words))
+                words = []
+        elif token in (">", ">>", ">|", "&>"):
+            target = tokens[index + 1] if index + 1 < len(tokens) else ""
+            if target.lower() not in SAFE_REDIRECT_TARGETS:
+                return "write"
+            index += 1
+        elif token in (">&", "<", "<&"):
+            # 2>&1 與輸入重新導向不寫入檔案
+            index += 1
+        elif not words and "=" in token and not token.startswith("="):
+            return "write"
+        else:
+            words.append(token)
+        index += 1
+
+    if not kinds or "write" in kinds:
+        return "write"
+    return "volatile" if "volatile" in kinds else "read"
+
+
+def classify_tool_call(tool_name: str, arguments: Dict[str, Any]) -> str:
+    """判斷工具呼叫的類型：read、volatile 或 write；未知的工具視為 write"""
+    if tool_name in STATIC_TOOLS:
+        return "read"
+    if tool_name == "shell_helper":
+        return classify_shell_command(arguments.get("shell_command"), arguments.get("argv"))
+    return "write"
+
+
+def cache_ttl_from_env() -> float:
+    try:
+        return float(os.environ.get(TOOL_CACHE_TTL_ENV, DEFAULT_TTL))
+    except ValueError:
+        return DEFAULT_TTL
+
+
+class ToolResultCache:
+    """一個聊天工作階段的工具結果快取
+
+    用法：
+        cached = cache.lookup(name, args)
+        if cached is None:
+            result = await call_tool(...)
+            cache.store(name, args, result)   # 非唯讀命令會清除快取且不保存
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: int = MAX_ENTRIES,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl = cache_ttl_from_env() if ttl is None else ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    @staticmethod
+    def _key(tool_name: str, arguments: Dict[str, Any]) -> str:
+        return tool_name + "\0" + json.dumps(arguments, sort_keys=True, ensure_ascii=False)
+
+    def lookup(self, tool_name: str, arguments: Dict[str, Any]) -> Optional[Tuple[str, float]]:
+        """回傳 (結果, 距今秒數)；沒有快取或已過期時回傳 None
+
+        可能修改系統狀態的呼叫在此清除整個快取，執行前就讓舊結果失效。
+        """
+        if not self.enabled:
+            return None
+        kind = classify_tool_call(tool_name, arguments)
+        if kind == "write":
+            self.invalidate()
+        if kind != "read":
+            return None
+        key = self._key(tool_name, arguments)
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, result = entry
+            age = self.clock() - stored_at
+            if tool_name in STATIC_TOOLS or age < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result, age
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def store(self, tool_name: str, arguments: Dict[str, Any], result: str) -> None:
+        """保存唯讀呼叫的結果；其他呼叫在執行後再清除一次快取"""
+        if not self.enabled:
+            return
+        kind = classify_tool_call(tool_name, arguments)
+        if kind == "write":
+            self.invalidate()
+        if kind != "read":
+            return
+        key = self._key(tool_name, arguments)
+        self._entries[key] = (self.clock(), result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        if self._entries:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def cached_note(age: float) -> str:
+    """附加在快取結果之後，讓模型知道這是先前的執行結果"""
+    return f"\n\n（快取結果：{age:.0f} 秒前執行過相同的工具呼叫）"
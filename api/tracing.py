@@ -0,0 +1,387 @@
+import atexit
+import json
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+# W3C Trace Context 標頭（同時用於 HTTP 標頭與 JSON-RPC params._meta）
+TRACEPARENT = "traceparent"
+TRACE_FILE_ENV = "SHELL_HELPER_TRACE_FILE"
+OTLP_ENDPOINT_ENV = "OTEL_EXPORTER_OTLP_ENDPOINT"
+SERVICE_NAME_ENV = "OTEL_SERVICE_NAME"
+
+# span 屬性中保留的命令長度
+TRACE_COMMAND_LENGTH = 200
+
+OTLP_BATCH_SIZE = 256
+OTLP_FLUSH_INTERVAL = 1.0
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+_SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+
+@dataclass(frozen=True)
+class SpanContext:
+    """跨行程傳遞的追蹤識別"""
+    trace_id: str
+    span_id: str
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+
+class Span:
+    """一段有開始與結束時間的工作"""
+
+    def __init__(self, name: str, context: SpanContext, parent_id: Optional[str],
+                 kind: str, service: str, attributes: Optional[Dict[str, Any]]):
+        self.name = name
+        self.context = context
+        self.parent_id = parent_id
+        self.kind = kind
+        self.service = service
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status = "error"
+        self.error = f"{type(exc).__name__}: {exc}"
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.context.trace_id,
+            "spanId": self.context.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "service": self.service,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+            "status": self.status,
+            "error": self.error
+        }
+
+
+class _NullSpan:
+    """未啟用追蹤時使用的空 span"""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_exception(self, exc: BaseException) -> None:
+        pass
+
+
+class _NullScope:
+    def __enter__(self):
+        return _NULL_SPAN
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+_NULL_SCOPE = _NullScope()
+
+CURRENT_SPAN: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class _SpanScope:
+    def __init__(self, tracer: "Tracer", span: Span):
+        self.tracer = tracer
+        self.span = span
+
+    def __enter__(self) -> Span:
+        self._token = CURRENT_SPAN.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, traceback):
+        CURRENT_SPAN.reset(self._token)
+        if exc is not None:
+            self.span.record_exception(exc)
+        self.span.end_ns = time.time_ns()
+        self.tracer.export(self.span)
+        return False
+
+
+class FileExporter:
+    """將 span 以 JSON Lines 追加寫入本機檔案"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Dict[str, Any]]) -> None:
+        lines = "".join(json.dumps(span, ensure_ascii=False) + "\n" for span in spans)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+    def shutdown(self) -> None:
+        pass
+
+
+class InMemoryExporter:
+    """保留在記憶體中的 span（測試用）"""
+
+    def __init__(self):
+        self.spans: List[Dict[str, Any]] = []
+
+    def export(self, spans: List[Dict[str, Any]]) -> None:
+        self.spans.extend(spans)
+
+    def shutdown(self) -> None:
+        pass
+
+
+class OTLPExporter:
+    """以 OTLP/HTTP JSON 批次送出 span
+
+    在背景執行緒中送出，不阻塞事件迴圈；送出失敗的批次直接捨棄。
+    行程結束時送出剩餘的 span。
+    """
+
+    def __init__(self, endpoint: str):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def export(self, spans: List[Dict[str, Any]]) -> None:
+        for span in spans:
+            self._queue.put(span)
+
+    def shutdown(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        import httpx
+
+        with httpx.Client(timeout=5.0) as client:
+            running = True
+            while running:
+                batch = []
+                deadline = time.monotonic() + OTLP_FLUSH_INTERVAL
+                while len(batch) < OTLP_BATCH_SIZE:
+                    try:
+                        span = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if span is None:
+                        running = False
+                        break
+                    batch.append(span)
+                if batch:
+                    try:
+                        client.post(self.url, json=to_otlp(batch))
+                    except httpx.HTTPError:
+                        pass
+
+
+def exporter_from_env():
+    """依環境變數建立匯出器；都未設定時回傳 None（不啟用追蹤）"""
+    endpoint = os.environ.get(OTLP_ENDPOINT_ENV)
+    if endpoint:
+        return OTLPExporter(endpoint)
+    path = os.environ.get(TRACE_FILE_ENV)
+    if path:
+        return FileExporter(path)
+    return None
+
+
+class Tracer:
+    """建立 span 並交給匯出器；未設定匯出器時所有操作都是空操作"""
+
+    def __init__(self, exporter=None, service_name: Optional[str] = None):
+        self.exporter = exporter
+        self.service_name = service_name or os.environ.get(SERVICE_NAME_ENV, "shell_helper")
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def start_span(self, name: str, kind: str = "internal",
+                   attributes: Optional[Dict[str, Any]] = None,
+                   parent: Optional[SpanContext] = None):
+        """開始一個 span，以 with 使用；未指定 parent 時延續目前的 span"""
+        if self.exporter is None:
+            return _NULL_SCOPE
+        if parent is None:
+            current = CURRENT_SPAN.get()
+            parent = current.context if current is not None else None
+        context = SpanContext(parent.trace_id if parent else secrets.token_hex(16), secrets.token_hex(8))
+        span = Span(name, context, parent.span_id if parent else None, kind, self.service_name, attributes)
+        return _SpanScope(self, span)
+
+    def export(self, span: Span) -> None:
+        try:
+            self.exporter.export([span.as_dict()])
+        except Exception:
+            # 追蹤失敗不影響請求本身
+            pass
+
+
+TRACER = Tracer(exporter_from_env())
+
+
+def start_span(name: str, kind: str = "internal",
+               attributes: Optional[Dict[str, Any]] = None,
+               parent: Optional[SpanContext] = None):
+    """以全域 TRACER 開始一個 span"""
+    return TRACER.start_span(name, kind, attributes, parent)
+
+
+def inject(carrier: Dict[str, Any]) -> Dict[str, Any]:
+    """將目前的追蹤識別寫入 carrier（HTTP 標頭或 params._meta）"""
+    span = CURRENT_SPAN.get()
+    if span is not None:
+        carrier[TRACEPARENT] = span.context.traceparent()
+    return carrier
+
+
+def extract(carrier: Optional[Dict[str, Any]]) -> Optional[SpanContext]:
+    """從 carrier 讀取 traceparent，格式不符時回傳 None"""
+    if not carrier:
+        return None
+    value = carrier.get(TRACEPARENT)
+    match = _TRACEPARENT_RE.match(value.strip().lower()) if isinstance(value, str) else None
+    if match is None:
+        return None
+    return SpanContext(match.group(1), match.group(2))
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _from_otlp_value(value: Dict[str, Any]) -> Any:
+    if "intValue" in value:
+        return int(value["intValue"])
+    return next(iter(value.values()), None)
+
+
+def to_otlp(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """將 span 轉為 OTLP/JSON 的 ExportTraceServiceRequest"""
+    by_service: Dict[str, List[Dict[str, Any]]] = {}
+    for span in spans:
+        attributes = [{"key": key, "value": _otlp_value(value)} for key, value in span["attributes"].items()]
+        status = {"code": 2, "message": span["error"]} if span["status"] == "error" else {"code": 1}
+        by_service.setdefault(span["service"], []).append({
+            "traceId": span["traceId"],
+            "spanId": span["spanId"],
+            "parentSpanId": span["parentSpanId"] or "",
+            "name": span["name"],
+            "kind": _SPAN_KINDS.get(span["kind"], 1),
+            "startTimeUnixNano": str(span["startTimeUnixNano"]),
+            "endTimeUnixNano": str(span["endTimeUnixNano"]),
+            "attributes": attributes,
+            "status": status
+        })
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service}}]},
+        "scopeSpans": [{"scope": {"name": "shell_helper"}, "spans": service_spans}]
+    } for service, service_spans in by_service.items()]}
+
+
+def from_otlp(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """將 OTLP/JSON 轉回本模組的 span 格式（供本機收集器使用）"""
+    kinds = {number: name for name, number in _SPAN_KINDS.items()}
+    spans = []
+    for resource_spans in payload.get("resourceSpans", []):
+        service = "unknown"
+        for attribute in resource_spans.get("resource", {}).get("attributes", []):
+            if attribute["key"] == "service.name":
+                service = attribute["value"].get("stringValue", service)
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            for span in scope_spans.get("spans", []):
+                status = span.get("status", {})
+                spans.append({
+                    "traceId": span["traceId"],
+                    "spanId": span["spanId"],
+                    "parentSpanId": span.get("parentSpanId") or None,
+                    "name": span["name"],
+                    "kind": kinds.get(span.get("kind"), "internal"),
+                    "service": service,
+                    "startTimeUnixNano": int(span["startTimeUnixNano"]),
+                    "endTimeUnixNano": int(span["endTimeUnixNano"]),
+                    "attributes": {
+                        item["key"]: _from_otlp_value(item["value"]) for item in span.get("attributes", [])
+                    },
+                    "status": "error" if status.get("code") == 2 else "ok",
+                    "error": status.get("message")
+                })
+    return spans
+
+
+def format_trace_tree(spans: List[Dict[str, Any]]) -> str:
+    """將 span 依追蹤與父子關係排成樹狀文字，顯示各段耗時"""
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    ids = {span["spanId"] for span in spans}
+    for span in sorted(spans, key=lambda item: item["startTimeUnixNano"]):
+        # 父 span 不在檔案中（例如尚未匯出）時視為根節點
+        parent = span["parentSpanId"] if span["parentSpanId"] in ids else None
+        children.setdefault(parent, []).append(span)
+
+    lines = []
+
+    def walk(span: Dict[str, Any], depth: int, root_start: int) -> None:
+        duration = (span["endTimeUnixNano"] - span["startTimeUnixNano"]) / 1e6
+        offset = (span["startTimeUnixNano"] - root_start) / 1e6
+        marker = " ✗" if span["status"] == "error" else ""
+        lines.append(f"{'  ' * depth}{span['name']} [{span['service']}] "
+                     f"+{offset:.1f} ms {duration:.1f} ms{marker}")
+        for child in children.get(span["spanId"], []):
+            walk(child, depth + 1, root_start)
+
+    for root in children.get(None, []):
+        lines.append(f"trace {root['traceId']}")
+        walk(root, 1, root["startTimeUnixNano"])
+    return "\n".join(lines)
+
+
+class TracingMiddleware:
+    """為每個 HTTP 請求建立伺服器端 span，延續 traceparent 標頭的追蹤"""
+
+    def __init__(self, app, tracer: Tracer = TRACER):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+        attributes = {"http.method": scope["method"], "http.target": scope["path"]}
+
+        with self.tracer.start_span(f"{scope['method']} {scope['path']}", "server", attributes,
+                                    extract(headers)) as span:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.status = "error"
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
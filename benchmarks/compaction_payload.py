@@ -0,0 +1,89 @@
+"""
+輸出精簡對工具結果大小的影響
+
+以實際的日誌與命令輸出為樣本，比較 shell_helper 原始輸出與精簡後的位元組數
+（安裝 tiktoken 時另外計算 token 數）以及精簡所需的時間。
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from api.output_compaction import compact_output, resolve_compaction
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken 為選用套件，未安裝時只比較位元組數
+    tiktoken = None
+
+# 預設樣本：找不到的檔案或沒有輸出的命令會略過
+DEFAULT_SAMPLES = [
+    "cat /var/log/dpkg.log",
+    "cat /var/log/apt/term.log",
+    "dmesg",
+    "journalctl --no-pager -n 20000",
+    "ls -laR /usr/lib/python3*",
+    f"{sys.executable} -m pip list -v",
+]
+
+
+def collect(command: str) -> str:
+    result = subprocess.run(command, shell=True, capture_output=True, text=True, errors="replace")
+    return result.stdout
+
+
+def measure(name: str, text: str, options: dict, encoding) -> dict:
+    start = time.perf_counter()
+    compacted, stats = compact_output(text, options)
+    elapsed = time.perf_counter() - start
+    result = {
+        "sample": name,
+        "original_bytes": stats["original_bytes"],
+        "compacted_bytes": stats["compacted_bytes"],
+        "reduction": round(1 - stats["compacted_bytes"] / stats["original_bytes"], 4),
+        "compact_ms": round(elapsed * 1000, 3)
+    }
+    if encoding is not None:
+        result["original_tokens"] = len(encoding.encode(text, disallowed_special=()))
+        result["compacted_tokens"] = len(encoding.encode(compacted, disallowed_special=()))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="輸出精簡對工具結果大小的影響")
+    parser.add_argument("samples", nargs="*", help="要量測的命令（預設使用系統日誌等樣本）")
+    parser.add_argument("--file", action="append", default=[], help="以檔案內容作為樣本，可重複指定")
+    parser.add_argument("--compact", default="{}", help="精簡設定（JSON），例如 '{\"max_bytes\": 16384}'")
+    parser.add_argument("--save", help="將結果儲存為 JSON")
+    args = parser.parse_args()
+
+    options = resolve_compaction(json.loads(args.compact))
+    encoding = tiktoken.get_encoding("o200k_base") if tiktoken is not None else None
+
+    samples = [(path, Path(path).read_text(encoding="utf-8", errors="replace")) for path in args.file]
+    for command in args.samples or ([] if args.file else DEFAULT_SAMPLES):
+        samples.append((command, collect(command)))
+
+    results = []
+    for name, text in samples:
+        if not text:
+            print(f"{name:<40} 沒有輸出，略過")
+            continue
+        stats = measure(name, text, options, encoding)
+        results.append(stats)
+        line = (f"{name[:40]:<40} {stats['original_bytes']:>10} → {stats['compacted_bytes']:>8} 位元組 "
+                f"（減少 {stats['reduction']:>6.1%}） {stats['compact_ms']:>8.2f} ms")
+        if encoding is not None:
+            line += f"  tokens {stats['original_tokens']} → {stats['compacted_tokens']}"
+        print(line)
+
+    if args.save:
+        Path(args.save).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
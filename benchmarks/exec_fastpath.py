@@ -0,0 +1,83 @@
+"""
+直接執行與經由 shell 執行的比較
+
+對幾個常見的簡單命令分別以 `sh -c`（原本的方式）與 shlex 拆分後直接執行量測
+完整執行時間，並量測 split_simple_command 判斷命令是否需要 shell 的成本。
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from api.command_line import split_simple_command
+from api.spawner import spawn_command
+
+DEFAULT_COMMANDS = ["true", "uname -a", "ls -la /tmp", "date +%s"]
+
+
+def run(args, shell: bool) -> float:
+    start = time.perf_counter()
+    process = spawn_command(args, shell=shell)
+    process.stdout.read()
+    process.stderr.read()
+    process.wait()
+    return time.perf_counter() - start
+
+
+def measure(command: str, rounds: int) -> dict:
+    argv = split_simple_command(command)
+    if argv is None:
+        raise SystemExit(f"命令需要 shell，無法直接執行: {command}")
+    shell_times, exec_times = [], []
+    for _ in range(rounds):
+        # 交錯執行，讓兩種方式受到相同的系統負載影響
+        shell_times.append(run(command, shell=True))
+        exec_times.append(run(argv, shell=False))
+    shell_ms = statistics.median(shell_times) * 1000
+    exec_ms = statistics.median(exec_times) * 1000
+    return {
+        "command": command,
+        "shell_ms": round(shell_ms, 3),
+        "exec_ms": round(exec_ms, 3),
+        "speedup": round(shell_ms / exec_ms, 2)
+    }
+
+
+def detection_cost(commands, rounds: int = 10000) -> float:
+    """split_simple_command 的平均耗時（微秒）"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for command in commands:
+            split_simple_command(command)
+    return (time.perf_counter() - start) / (rounds * len(commands)) * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="直接執行與經由 shell 執行的比較")
+    parser.add_argument("commands", nargs="*", default=DEFAULT_COMMANDS, help="要比較的簡單命令")
+    parser.add_argument("--rounds", type=int, default=200, help="每個命令的執行次數（預設：200）")
+    parser.add_argument("--save", help="將結果儲存為 JSON")
+    args = parser.parse_args()
+
+    results = []
+    for command in args.commands:
+        stats = measure(command, args.rounds)
+        results.append(stats)
+        print(f"{command:<16} sh -c {stats['shell_ms']:>7.3f} ms  直接執行 {stats['exec_ms']:>7.3f} ms  "
+              f"{stats['speedup']:>5.2f}x")
+
+    samples = args.commands + ["ps aux | grep python", "echo $HOME"]
+    cost = detection_cost(samples)
+    print(f"判斷命令是否需要 shell：每次 {cost:.2f} µs")
+
+    if args.save:
+        Path(args.save).write_text(json.dumps({"commands": results, "detection_us": round(cost, 3)},
+                                              indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
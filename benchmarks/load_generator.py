@@ -0,0 +1,508 @@
+"""
+非同步負載產生器 - 對三種伺服器進行壓力測試
+
+- api：api/main.py 的 HTTP /execute 端點
+- sse：server_shell_helper_sse.py 的 MCP over SSE/HTTP
+- stdio：server_shell_helper.py 的 MCP over stdio
+
+回報吞吐量、p50/p95/p99 延遲與伺服器 RSS，並可儲存 JSON 基準值供之後比較。
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+try:
+    import psutil
+except ImportError:  # psutil 為選用套件，Linux 上改讀 /proc
+    psutil = None
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+TARGETS = ("api", "sse", "stdio")
+DEFAULT_MIX = "0:8,65536:2,1048576:1"
+RSS_SAMPLE_INTERVAL = 0.2
+
+# 各目標由負載產生器自行啟動時使用的命令
+SERVER_COMMANDS = {
+    "api": ["-m", "uvicorn", "api.main:app", "--host", "127.0.0.1", "--log-level", "warning"],
+    "sse": ["-m", "uvicorn", "server_shell_helper_sse:app", "--host", "127.0.0.1", "--log-level", "warning"],
+    "stdio": ["server_shell_helper.py"],
+}
+
+
+def current_platform() -> str:
+    return "Windows" if platform.system() == "Windows" else "*nix"
+
+
+# MCP 工具預設會精簡輸出；基準測試量測完整輸出的傳輸成本
+RAW_OUTPUT = {"enabled": False}
+
+
+def build_command(output_size: int, target_platform: str) -> str:
+    """產生輸出約 output_size 位元組的命令（0 為只輸出一行的 echo）"""
+    if output_size <= 0:
+        return "echo ok"
+    if target_platform == "Windows":
+        return f"Write-Output ('x' * {output_size})"
+    return f"head -c {output_size} /dev/zero | tr '\\0' x"
+
+
+def parse_mix(spec: str) -> List[Tuple[int, int]]:
+    """解析命令組合，格式為 `輸出位元組:權重`，以逗號分隔"""
+    mix = []
+    for item in spec.split(","):
+        size, _, weight = item.strip().partition(":")
+        mix.append((int(size), int(weight or 1)))
+    if not mix or any(weight <= 0 for _, weight in mix):
+        raise ValueError(f"無效的命令組合: {spec}")
+    return mix
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """以最近排名法計算百分位數"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def read_rss(pid: Optional[int]) -> Optional[int]:
+    """讀取行程的 RSS（位元組），無法取得時回傳 None"""
+    if pid is None:
+        return None
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def http_client(concurrency: int, uds: Optional[str] = None) -> httpx.AsyncClient:
+    """基準測試用的 httpx 客戶端；指定 uds 時經由 Unix domain socket 連線"""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    transport = httpx.AsyncHTTPTransport(uds=uds, limits=limits) if uds else None
+    return httpx.AsyncClient(timeout=120.0, limits=limits, transport=transport)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class HttpApiTarget:
+    """api/main.py 的 POST /execute"""
+
+    def __init__(self, url: str, concurrency: int, pid: Optional[int] = None, uds: Optional[str] = None):
+        self.url = url.rstrip("/")
+        self.pid = pid
+        self.client = http_client(concurrency, uds)
+
+    async def start(self) -> None:
+        response = await self.client.get(f"{self.url}/platform")
+        response.raise_for_status()
+
+    async def call(self, command: str) -> int:
+        response = await self.client.post(
+            f"{self.url}/execute",
+            json={"platform": current_platform(), "shell_command": command}
+        )
+        response.raise_for_status()
+        return len(response.content)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class SseMcpTarget:
+    """server_shell_helper_sse.py：先連線 /sse 取得訊息端點，再以 POST 呼叫工具"""
+
+    def __init__(self, url: str, concurrency: int, pid: Optional[int] = None, uds: Optional[str] = None):
+        self.url = url.rstrip("/")
+        self.pid = pid
+        self.message_url: Optional[str] = None
+        self._ids = 0
+        self._stream_task: Optional[asyncio.Task] = None
+        self.client = http_client(concurrency + 1, uds)
+
+    async def start(self) -> None:
+        endpoint = asyncio.get_running_loop().create_future()
+
+        async def listen():
+            async with self.client.stream("GET", f"{self.url}/sse") as response:
+                event = None
+                async for line in response.aiter_lines():
+                    if line.startswith("event:"):
+                        event = line.split(":", 1)[1].strip()
+                    elif line.startswith("data:") and event == "endpoint" and not endpoint.done():
+                        endpoint.set_result(json.loads(line.split(":", 1)[1])["url"])
+
+        # 與一般客戶端相同，測試期間保持 SSE 連線
+        self._stream_task = asyncio.create_task(listen())
+        self.message_url = await asyncio.wait_for(endpoint, timeout=10)
+        await self._request("initialize", {
+            "protocolVersion": "2024-11-05",
+            "capabilities": {},
+            "clientInfo": {"name": "load_generator", "version": "0.1.0"}
+        })
+
+    async def _request(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        self._ids += 1
+        response = await self.client.post(
+            self.message_url,
+            json={"jsonrpc": "2.0", "id": self._ids, "method": method, "params": params}
+        )
+        response.raise_for_status()
+        data = response.json()
+        if "error" in data:
+            raise RuntimeError(data["error"]["message"])
+        return data["result"]
+
+    async def call(self, command: str) -> int:
+        result = await self._request("tools/call", {
+            "name": "shell_helper",
+            "arguments": {"platform": current_platform(), "shell_command": command, "compact": RAW_OUTPUT}
+        })
+        return sum(len(item.get("text", "")) for item in result["content"])
+
+    async def close(self) -> None:
+        if self._stream_task is not None:
+            self._stream_task.cancel()
+            try:
+                await self._stream_task
+            except (asyncio.CancelledError, httpx.HTTPError):
+                pass
+        await self.client.aclose()
+
+
+class StdioMcpTarget:
+    """server_shell_helper.py：以換行分隔的 JSON-RPC 經由 stdin/stdout 通訊
+
+    同一個工作階段可同時送出多個請求，依 id 對應回應。
+    """
+
+    def __init__(self, command: List[str]):
+        self.command = command
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.pid: Optional[int] = None
+        self._ids = 0
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._reader: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            cwd=ROOT_DIR,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            limit=64 * 1024 * 1024
+        )
+        self.pid = self.process.pid
+        self._reader = asyncio.create_task(self._read_responses())
+        await self._request("initialize", {
+            "protocolVersion": "2024-11-05",
+            "capabilities": {},
+            "clientInfo": {"name": "load_generator", "version": "0.1.0"}
+        })
+        await self._send({"jsonrpc": "2.0", "method": "notifications/initialized"})
+
+    async def _send(self, message: Dict[str, Any]) -> None:
+        self.process.stdin.write(json.dumps(message).encode() + b"\n")
+        await self.process.stdin.drain()
+
+    async def _read_responses(self) -> None:
+        while True:
+            line = await self.process.stdout.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            future = self._pending.pop(message.get("id"), None)
+            if future is not None and not future.done():
+                future.set_result(message)
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("stdio 伺服器已結束"))
+
+    async def _request(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        self._ids += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[self._ids] = future
+        await self._send({"jsonrpc": "2.0", "id": self._ids, "method": method, "params": params})
+        message = await future
+        if "error" in message:
+            raise RuntimeError(message["error"]["message"])
+        return message["result"]
+
+    async def call(self, command: str) -> int:
+        result = await self._request("tools/call", {
+            "name": "shell_helper",
+            "arguments": {"platform": current_platform(), "shell_command": command, "compact": RAW_OUTPUT}
+        })
+        if result.get("isError"):
+            raise RuntimeError(result["content"][0].get("text", "工具執行失敗"))
+        return sum(len(item.get("text", "")) for item in result["content"])
+
+    async def close(self) -> None:
+        if self.process is not None and self.process.returncode is None:
+            self.process.stdin.close()
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                self.process.kill()
+                await self.process.wait()
+        if self._reader is not None:
+            self._reader.cancel()
+
+
+def spawn_http_server(target: str, uds: Optional[str] = None) -> Tuple[subprocess.Popen, str]:
+    """在背景啟動 api 或 sse 伺服器，等待可連線後回傳（行程, URL）
+
+    指定 uds 時監聽該 Unix domain socket，URL 的主機名稱只用於 Host 標頭。
+    """
+    port = free_port()
+    listen = ["--uds", uds] if uds else ["--port", str(port)]
+    process = subprocess.Popen([sys.executable, *SERVER_COMMANDS[target], *listen], cwd=ROOT_DIR)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{target} 伺服器啟動失敗（返回碼 {process.returncode}）")
+        try:
+            if uds:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    sock.settimeout(0.2)
+                    sock.connect(uds)
+                return process, "http://localhost"
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"{target} 伺服器未在時間內啟動")
+
+
+async def sample_rss(pid: Optional[int], samples: List[int], stop: asyncio.Event) -> None:
+    """定期記錄伺服器 RSS"""
+    while not stop.is_set():
+        rss = read_rss(pid)
+        if rss is not None:
+            samples.append(rss)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=RSS_SAMPLE_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_load(
+    target,
+    mix: List[Tuple[int, int]],
+    concurrency: int = 8,
+    requests: Optional[int] = 200,
+    duration: Optional[float] = None,
+    warmup: int = 5,
+    seed: int = 0
+) -> Dict[str, Any]:
+    """以固定的同時請求數送出負載，直到送完 requests 個請求或超過 duration 秒
+
+    Returns:
+        吞吐量、延遲百分位數、錯誤數與 RSS 統計
+    """
+    rng = random.Random(seed)
+    target_platform = current_platform()
+    sizes = [size for size, _ in mix]
+    weights = [weight for _, weight in mix]
+    commands = {size: build_command(size, target_platform) for size in sizes}
+
+    for _ in range(warmup):
+        await target.call(commands[sizes[0]])
+
+    latencies: List[float] = []
+    errors: List[str] = []
+    received = 0
+    issued = 0
+    rss_samples: List[int] = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_rss(target.pid, rss_samples, stop))
+    start = time.perf_counter()
+    deadline = start + duration if duration else None
+
+    async def worker():
+        nonlocal received, issued
+        while True:
+            if requests is not None and issued >= requests:
+                return
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            issued += 1
+            size = rng.choices(sizes, weights)[0]
+            began = time.perf_counter()
+            try:
+                size_received = await target.call(commands[size])
+                latencies.append(time.perf_counter() - began)
+                received += size_received
+            except Exception as e:
+                errors.append(str(e) or type(e).__name__)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await sampler
+
+    latencies.sort()
+    completed = len(latencies)
+    return {
+        "requests": completed + len(errors),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(completed / elapsed, 2) if elapsed else 0.0,
+        "received_mb": round(received / 1024 / 1024, 2),
+        "latency_ms": {
+            "mean": round(sum(latencies) / completed * 1000, 2) if completed else 0.0,
+            "p50": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99": round(percentile(latencies, 0.99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        },
+        "rss_mb": {
+            "start": round(rss_samples[0] / 1024 / 1024, 1) if rss_samples else None,
+            "peak": round(max(rss_samples) / 1024 / 1024, 1) if rss_samples else None,
+        }
+    }
+
+
+async def benchmark_target(name: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """啟動（或連線到）指定的伺服器並執行負載測試"""
+    server = None
+    if name == "stdio":
+        target = StdioMcpTarget([sys.executable, *SERVER_COMMANDS["stdio"]])
+    else:
+        url = args.url
+        if url is None:
+            server, url = spawn_http_server(name)
+        pid = server.pid if server is not None else args.pid
+        target_class = HttpApiTarget if name == "api" else SseMcpTarget
+        target = target_class(url, args.concurrency, pid)
+
+    try:
+        await target.start()
+        return await run_load(
+            target, parse_mix(args.mix), args.concurrency,
+            None if args.duration else args.requests, args.duration, args.warmup, args.seed
+        )
+    finally:
+        await target.close()
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+
+def compare_with_baseline(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """與基準值比較，回傳退步的項目（延遲增加或吞吐量下降超過 tolerance）"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            continue
+        for key in ("p95", "p99"):
+            before, after = previous["latency_ms"][key], current["latency_ms"][key]
+            if before and after > before * (1 + tolerance):
+                regressions.append(f"{name} {key} 延遲 {before} → {after} ms")
+        before, after = previous["throughput_rps"], current["throughput_rps"]
+        if before and after < before * (1 - tolerance):
+            regressions.append(f"{name} 吞吐量 {before} → {after} req/s")
+    return regressions
+
+
+def print_report(name: str, stats: Dict[str, Any]) -> None:
+    latency = stats["latency_ms"]
+    rss = stats["rss_mb"]
+    print(f"\n[{name}] {stats['requests']} 個請求（{stats['errors']} 個錯誤），耗時 {stats['elapsed_s']} 秒")
+    print(f"  吞吐量: {stats['throughput_rps']} req/s，接收 {stats['received_mb']} MB")
+    print(f"  延遲: p50 {latency['p50']} ms / p95 {latency['p95']} ms / p99 {latency['p99']} ms（最大 {latency['max']} ms）")
+    if rss["peak"] is not None:
+        print(f"  伺服器 RSS: {rss['start']} MB → 峰值 {rss['peak']} MB")
+    for error in stats["error_samples"]:
+        print(f"  錯誤: {error}")
+
+
+def parse_arguments():
+    """解析命令列參數"""
+    parser = argparse.ArgumentParser(description="Shell Helper 伺服器負載測試")
+    parser.add_argument("--target", choices=TARGETS + ("all",), default="all", help="測試目標（預設：all）")
+    parser.add_argument("--url", help="已啟動的 api / sse 伺服器位址；不指定時自動啟動")
+    parser.add_argument("--pid", type=int, help="已啟動伺服器的 PID，用於記錄 RSS")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="同時請求數（預設：8）")
+    parser.add_argument("-n", "--requests", type=int, default=200, help="請求總數（預設：200）")
+    parser.add_argument("-d", "--duration", type=float, help="測試秒數；指定時取代 --requests")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"命令組合 `輸出位元組:權重`（預設：{DEFAULT_MIX}）")
+    parser.add_argument("--warmup", type=int, default=5, help="暖身請求數（預設：5）")
+    parser.add_argument("--seed", type=int, default=0, help="命令組合的亂數種子")
+    parser.add_argument("--save", help="將結果儲存為 JSON 基準值")
+    parser.add_argument("--compare", help="與 JSON 基準值比較，退步時返回碼為 1")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="比較時容許的退步比例（預設：0.2）")
+    return parser.parse_args()
+
+
+async def main() -> int:
+    args = parse_arguments()
+    names = TARGETS if args.target == "all" else (args.target,)
+    if args.url and len(names) > 1:
+        raise SystemExit("--url 只能搭配單一 --target 使用")
+
+    results = {}
+    for name in names:
+        results[name] = await benchmark_target(name, args)
+        print_report(name, results[name])
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "concurrency": args.concurrency,
+            "mix": args.mix,
+            "requests": args.requests,
+            "duration": args.duration,
+        },
+        "results": results
+    }
+    if args.save:
+        Path(args.save).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.save).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\n結果已儲存到 {args.save}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("\n⚠️  與基準值相比退步:")
+            for item in regressions:
+                print(f"  {item}")
+            return 1
+        print("\n✅ 與基準值相比沒有退步")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,88 @@
+"""
+命令啟動時間與伺服器 RSS 的關係
+
+逐步增加本行程的記憶體用量（模擬長時間執行、RSS 成長的伺服器），分別量測
+subprocess.Popen 與 forkserver 啟動命令所需的時間（spawn）與執行 `true` 的總時間。
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from api.spawner import FORKSERVER, FORKSERVER_AVAILABLE
+from benchmarks.load_generator import read_rss
+import os
+import subprocess
+
+PAGE_SIZE = 4096
+
+
+def popen(command: str):
+    return subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def measure(spawn, command: str, rounds: int) -> dict:
+    """回傳 spawn 與完整執行時間的中位數（毫秒）"""
+    spawn_times, total_times = [], []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        process = spawn(command)
+        spawned = time.perf_counter()
+        process.stdout.read()
+        process.stderr.read()
+        process.wait()
+        end = time.perf_counter()
+        spawn_times.append(spawned - start)
+        total_times.append(end - start)
+    return {
+        "spawn_ms": round(statistics.median(spawn_times) * 1000, 3),
+        "total_ms": round(statistics.median(total_times) * 1000, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="命令啟動時間與 RSS 的關係")
+    parser.add_argument("--sizes", default="0,512,2048", help="額外配置的記憶體（MB），以逗號分隔")
+    parser.add_argument("--rounds", type=int, default=200, help="每種情況的執行次數（預設：200）")
+    parser.add_argument("--command", default="true", help="執行的命令（預設：true）")
+    parser.add_argument("--save", help="將結果儲存為 JSON")
+    args = parser.parse_args()
+
+    spawners = {"popen": popen}
+    if FORKSERVER_AVAILABLE:
+        # 與伺服器相同，在記憶體成長前就啟動 forkserver
+        FORKSERVER.start()
+        spawners["forkserver"] = lambda command: FORKSERVER.spawn(command)
+
+    ballast = []
+    results = []
+    allocated = 0
+    try:
+        for size in (int(value) for value in args.sizes.split(",")):
+            if size > allocated:
+                block = bytearray((size - allocated) * 1024 * 1024)
+                # 寫入每一頁，讓記憶體實際計入 RSS
+                for offset in range(0, len(block), PAGE_SIZE):
+                    block[offset] = 1
+                ballast.append(block)
+                allocated = size
+            rss = round(read_rss(os.getpid()) / 1024 / 1024, 1)
+            for name, spawn in spawners.items():
+                stats = measure(spawn, args.command, args.rounds)
+                results.append({"spawner": name, "rss_mb": rss, **stats})
+                print(f"{name:<11} RSS {rss:>8.1f} MB  spawn {stats['spawn_ms']:>7.3f} ms  "
+                      f"總計 {stats['total_ms']:>7.3f} ms")
+    finally:
+        if FORKSERVER.running:
+            FORKSERVER.close()
+
+    if args.save:
+        Path(args.save).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
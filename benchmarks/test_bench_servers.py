@@ -0,0 +1,97 @@
+"""
+pytest-benchmark 基準測試
+
+執行方式：python -m pytest benchmarks --benchmark-autosave
+比較基準：python -m pytest benchmarks --benchmark-compare --benchmark-compare-fail=median:20%
+"""
+import asyncio
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+pytest.importorskip("pytest_benchmark")
+
+import server_shell_helper_sse
+from api import main
+from api.table_parser import parse_tables
+from benchmarks.load_generator import (
+    RAW_OUTPUT, SERVER_COMMANDS, StdioMcpTarget, build_command, current_platform
+)
+
+# (名稱, 輸出位元組)
+OUTPUT_SIZES = [("empty", 0), ("64KB", 64 * 1024), ("1MB", 1024 * 1024)]
+SIZE_IDS = [name for name, _ in OUTPUT_SIZES]
+SIZES = [size for _, size in OUTPUT_SIZES]
+
+
+@pytest.fixture(scope="module")
+def api_client():
+    return TestClient(main.app)
+
+
+@pytest.fixture(scope="module")
+def sse_client():
+    return TestClient(server_shell_helper_sse.app)
+
+
+@pytest.fixture(scope="module")
+def stdio_target():
+    """啟動一個 stdio 伺服器，整個模組共用"""
+    loop = asyncio.new_event_loop()
+    target = StdioMcpTarget([sys.executable, *SERVER_COMMANDS["stdio"]])
+    loop.run_until_complete(target.start())
+    yield loop, target
+    loop.run_until_complete(target.close())
+    loop.close()
+
+
+@pytest.mark.parametrize("size", SIZES, ids=SIZE_IDS)
+def test_api_execute(benchmark, api_client, size):
+    """api/main.py 的 /execute（含子行程啟動與回應編碼）"""
+    payload = {"platform": current_platform(), "shell_command": build_command(size, current_platform())}
+
+    response = benchmark(api_client.post, "/execute", json=payload)
+    assert response.status_code == 200
+    assert len(response.json()["output"]) >= size
+
+
+@pytest.mark.parametrize("size", SIZES, ids=SIZE_IDS)
+def test_sse_tools_call(benchmark, sse_client, size):
+    """server_shell_helper_sse.py 的 tools/call"""
+    payload = {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "tools/call",
+        "params": {
+            "name": "shell_helper",
+            "arguments": {
+                "platform": current_platform(),
+                "shell_command": build_command(size, current_platform()),
+                "compact": RAW_OUTPUT
+            }
+        }
+    }
+
+    response = benchmark(sse_client.post, "/sse/messages", json=payload)
+    assert response.status_code == 200
+    assert "result" in response.json()
+
+
+@pytest.mark.parametrize("size", SIZES, ids=SIZE_IDS)
+def test_stdio_tools_call(benchmark, stdio_target, size):
+    """server_shell_helper.py 經由 stdio 的 tools/call（含 JSON-RPC 往返）"""
+    loop, target = stdio_target
+    command = build_command(size, current_platform())
+
+    received = benchmark(lambda: loop.run_until_complete(target.call(command)))
+    assert received >= size
+
+
+def test_parse_tables(benchmark):
+    """解析約 1MB 的 Format-Table 輸出"""
+    header = "ProcessName      Id   CPU(s)\n-----------      --   ------\n"
+    rows = "".join(f"process{i:<9} {i:<4} {i * 0.5:.2f}\n" for i in range(40000))
+
+    tables = benchmark(parse_tables, header + rows)
+    assert len(tables[0]["rows"]) == 40000
@@ -0,0 +1,136 @@
+"""
+MCP 傳輸方式的每次呼叫額外成本
+
+以單一請求依序呼叫（不重疊），比較同一個伺服器在不同傳輸方式下的延遲：
+
+- stdio：server_shell_helper.py 子行程，經由 stdin/stdout
+- tcp：server_shell_helper_sse.py，經由 127.0.0.1 的 TCP 連線
+- uds：server_shell_helper_sse.py，經由 Unix domain socket
+- in-process：同一個行程內直接呼叫 handle_jsonrpc_request
+
+每種方式量測兩種呼叫：get_platform（不啟動子行程，幾乎只有傳輸成本）與
+`echo ok`（包含命令執行）。
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.load_generator import (
+    RAW_OUTPUT, SERVER_COMMANDS, SseMcpTarget, StdioMcpTarget, current_platform, spawn_http_server
+)
+
+TRANSPORTS = ("stdio", "tcp", "uds", "in-process")
+
+
+class InProcessTarget:
+    """直接呼叫 server_shell_helper_sse.handle_jsonrpc_request"""
+
+    def __init__(self):
+        from server_shell_helper_sse import handle_jsonrpc_request
+        self.handler = handle_jsonrpc_request
+        self._ids = 0
+
+    async def start(self) -> None:
+        await self._request("initialize", {
+            "protocolVersion": "2024-11-05",
+            "capabilities": {},
+            "clientInfo": {"name": "transport_overhead", "version": "0.1.0"}
+        })
+
+    async def _request(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        self._ids += 1
+        message = await self.handler({"jsonrpc": "2.0", "id": self._ids, "method": method, "params": params})
+        if "error" in message:
+            raise RuntimeError(message["error"]["message"])
+        return message["result"]
+
+    async def close(self) -> None:
+        pass
+
+
+CALLS = {
+    "get_platform": ("get_platform", {}),
+    "echo": ("shell_helper", {"platform": current_platform(), "shell_command": "echo ok", "compact": RAW_OUTPUT}),
+}
+
+
+async def measure(target, rounds: int, warmup: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for label, (tool, arguments) in CALLS.items():
+        params = {"name": tool, "arguments": arguments}
+        for _ in range(warmup):
+            await target._request("tools/call", params)
+        samples = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            await target._request("tools/call", params)
+            samples.append(time.perf_counter() - start)
+        samples.sort()
+        results[label] = {
+            "p50_us": round(statistics.median(samples) * 1_000_000, 1),
+            "p95_us": round(samples[int(len(samples) * 0.95) - 1] * 1_000_000, 1),
+            "mean_us": round(statistics.fmean(samples) * 1_000_000, 1),
+        }
+    return results
+
+
+async def benchmark(name: str, rounds: int, warmup: int, workdir: str) -> Dict[str, Dict[str, float]]:
+    server = None
+    if name == "stdio":
+        target = StdioMcpTarget([sys.executable, *SERVER_COMMANDS["stdio"]])
+    elif name == "in-process":
+        target = InProcessTarget()
+    else:
+        uds = str(Path(workdir) / "sse.sock") if name == "uds" else None
+        server, url = spawn_http_server("sse", uds=uds)
+        target = SseMcpTarget(url, 1, server.pid, uds=uds)
+    try:
+        await target.start()
+        return await measure(target, rounds, warmup)
+    finally:
+        await target.close()
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="MCP 傳輸方式的每次呼叫額外成本")
+    parser.add_argument("transports", nargs="*", default=list(TRANSPORTS),
+                        help=f"要比較的傳輸方式：{', '.join(TRANSPORTS)}（預設：全部）")
+    parser.add_argument("--rounds", type=int, default=500, help="每種呼叫的次數（預設：500）")
+    parser.add_argument("--warmup", type=int, default=20, help="暖身次數（預設：20）")
+    parser.add_argument("--save", help="將結果儲存為 JSON")
+    args = parser.parse_args()
+    unknown = set(args.transports) - set(TRANSPORTS)
+    if unknown:
+        parser.error(f"未知的傳輸方式: {', '.join(sorted(unknown))}")
+
+    results = {}
+    # socket 放在只有自己能存取的暫存目錄中
+    with tempfile.TemporaryDirectory(prefix="shell_helper_") as workdir:
+        for name in args.transports:
+            results[name] = await benchmark(name, args.rounds, args.warmup, workdir)
+
+    print(f"\n{'傳輸方式':<12}{'get_platform p50':>18}{'p95':>10}{'echo ok p50':>14}{'p95':>10}")
+    for name, stats in results.items():
+        platform_stats, echo_stats = stats["get_platform"], stats["echo"]
+        print(f"{name:<12}{platform_stats['p50_us']:>15.1f} µs{platform_stats['p95_us']:>7.1f} µs"
+              f"{echo_stats['p50_us']:>11.1f} µs{echo_stats['p95_us']:>7.1f} µs")
+
+    if args.save:
+        Path(args.save).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"\n結果已儲存到 {args.save}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
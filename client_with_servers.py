@@ -3,6 +3,7 @@ from mcp.client.stdio import stdio_client
 from contextlib import AsyncExitStack
 from openai import OpenAI
 from dotenv import load_dotenv
+from api.tool_cache import ToolResultCache, cached_note
 import asyncio
 import json
 import sys
@@ -71,8 +72,12 @@ class MCPClient:
         """釋放資源"""
         await self.exit_stack.aclose()
 
-async def get_reply_text(clients, query, prev_id):
-    """單次問答"""
+async def get_reply_text(clients, query, prev_id, cache=None):
+    """單次問答
+
+    提供 cache（ToolResultCache）時，同一個聊天工作階段中重複的唯讀工具呼叫
+    直接使用先前的結果，不再送到 MCP 伺服器。
+    """
     
     messages = [{"role": "user", "content": query}]
     # 把 clients 中個別項目的 tools 串接在一起
@@ -110,18 +115,27 @@ async def get_reply_text(clients, query, prev_id):
                     continue
                 print(f"準備使用 {tool_name}(**{tool_args})")
                 print('-' * 20)
-                # 使用 MCP 伺服器提供的工具
-                result = await client.session.call_tool(
-                    tool_name, tool_args
-                )
-                print(f"{result.content[0].text}")
+                cached = cache.lookup(tool_name, tool_args) if cache else None
+                if cached is not None:
+                    # 相同的唯讀呼叫已經執行過，直接使用快取結果
+                    result_text = cached[0] + cached_note(cached[1])
+                    print("（使用快取結果）")
+                else:
+                    # 使用 MCP 伺服器提供的工具
+                    result = await client.session.call_tool(
+                        tool_name, tool_args
+                    )
+                    result_text = result.content[0].text
+                    if cache and not result.isError:
+                        cache.store(tool_name, tool_args, result_text)
+                print(f"{result_text}")
                 print('-' * 20)
 
                 messages.append({
                     # 建立可傳回函式執行結果的字典
                     "type": "function_call_output", # 設為工具輸出類型的訊息
                     "call_id": output.call_id, # 叫用函式的識別碼
-                    "output": result.content[0].text # 函式傳回值
+                    "output": result_text # 函式傳回值
                 })
         if messages == []:
             break
@@ -132,6 +146,8 @@ async def chat_loop(clients):
     print("直接按 ↵ 可結束對話")
 
     prev_id = None
+    # 工具結果快取只在這次聊天中有效
+    cache = ToolResultCache()
     while True:
         try:
             query = input(">>> ").strip()
@@ -140,7 +156,7 @@ async def chat_loop(clients):
                 break
 
             reply, prev_id = await get_reply_text(
-                clients, query, prev_id
+                clients, query, prev_id, cache
             )
             print(reply)
 
@@ -1,11 +1,15 @@
 import httpx
 import asyncio
+import importlib
 import json
 import sys
 import os
 from openai import OpenAI
 from dotenv import load_dotenv
 from typing import Dict, List, Any, Optional
+from api.http_pool import SHARED_POOL, HTTPPool
+from api.tool_cache import ToolResultCache, cached_note
+from api.tracing import SERVICE_NAME_ENV, TRACER, inject, start_span
 
 # 載入 .env 檔案
 load_dotenv()
@@ -18,19 +22,73 @@ api_key = os.getenv("OPENAI_API_KEY")
 # 設置 OpenAI API
 openai.api_key = api_key
 
+# 追蹤資料中的服務名稱（設定 OTEL_EXPORTER_OTLP_ENDPOINT 或 SHELL_HELPER_TRACE_FILE 時啟用追蹤）
+if SERVICE_NAME_ENV not in os.environ:
+    TRACER.service_name = "shell_helper_client"
+
+LLM_MODEL = "gpt-4.1-nano"
+
+# mcp_servers_sse.json 中 transport 的值
+SSE_TRANSPORT = "sse"
+STREAMABLE_HTTP_TRANSPORTS = ("streamable-http", "http")
+# 在同一個行程內直接呼叫伺服器的 handle_jsonrpc_request，不經過任何傳輸層
+IN_PROCESS_TRANSPORT = "in-process"
+IN_PROCESS_MODULE = "server_shell_helper_sse"
+
+# Streamable HTTP 的標頭
+SESSION_HEADER = "Mcp-Session-Id"
+PROTOCOL_VERSION_HEADER = "MCP-Protocol-Version"
+# SSE 串流中斷時以 Last-Event-ID 續傳的次數上限
+MAX_RESUME_ATTEMPTS = 3
+
+class SessionExpired(Exception):
+    """Streamable HTTP 工作階段已失效（HTTP 404），需要重新 initialize"""
+
+async def iter_sse_messages(response: httpx.Response):
+    """逐一取得 SSE 串流中的 message 事件，產生 (事件 id, JSON 資料)"""
+    event_id, event_type, data = None, "message", []
+    async for line in response.aiter_lines():
+        if line == "":
+            if data and event_type == "message":
+                yield event_id, json.loads("\n".join(data))
+            event_type, data = "message", []
+        elif line.startswith("id:"):
+            event_id = line[3:].strip()
+        elif line.startswith("event:"):
+            event_type = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].lstrip())
+
 class SSEMCPClient:
-    """SSE Transport 的 MCP 客戶端"""
+    """SSE、Streamable HTTP 或行程內 Transport 的 MCP 客戶端
+
+    transport 為 "sse"（預設）時先以 GET 建立 SSE 連接取得 message URL；
+    為 "streamable-http" 時直接對單一端點 POST，一次請求就完成工具呼叫；
+    為 "in-process" 時匯入伺服器模組，直接呼叫其 handle_jsonrpc_request。
+    所有伺服器預設共用 SHARED_POOL 的連線，不必為每個伺服器各自建立連線；
+    設定 "uds" 的伺服器經由 Unix domain socket 連線（見 create_client）。
+    """
 
-    def __init__(self):
+    def __init__(self, pool: Optional[HTTPPool] = None):
         self.session_id = 0
         self.message_url: Optional[str] = None
         self.tools = []
         self.tool_names = []
-        self.http_client: Optional[httpx.AsyncClient] = None
+        self.pool = pool or SHARED_POOL
         self.server_name: Optional[str] = None
+        self.transport = SSE_TRANSPORT
+        # Streamable HTTP 的工作階段與協定版本
+        self.mcp_session_id: Optional[str] = None
+        self.protocol_version: Optional[str] = None
+        # 行程內 transport 的請求處理函式
+        self.handler = None
+
+    @property
+    def streamable(self) -> bool:
+        return self.transport in STREAMABLE_HTTP_TRANSPORTS
 
     async def connect_to_server(self, server_info: tuple):
-        """連接到 SSE MCP 伺服器
+        """連接到 SSE 或 Streamable HTTP MCP 伺服器
 
         Args:
             server_info: (伺服器名稱, 伺服器配置) 的 tuple
@@ -38,16 +96,78 @@ class SSEMCPClient:
         self.server_name = server_info[0]
         server_config = server_info[1]
         sse_url = server_config.get("url")
+        self.transport = server_config.get("transport", SSE_TRANSPORT)
 
-        if not sse_url:
+        if self.transport == IN_PROCESS_TRANSPORT:
+            module_name = server_config.get("module", IN_PROCESS_MODULE)
+            self.handler = importlib.import_module(module_name).handle_jsonrpc_request
+            self.message_url = f"in-process:{module_name}"
+        elif not sse_url:
             raise ValueError(f"伺服器 {self.server_name} 缺少 URL 配置")
+        elif self.streamable:
+            # Streamable HTTP 只有一個端點，不需要先建立 SSE 連接
+            self.message_url = sse_url
+        else:
+            await self._open_sse_endpoint(sse_url)
+
+        await self._initialize()
+
+        # 取得工具列表
+        tools_response = await self._send_request({
+            "jsonrpc": "2.0",
+            "id": self._next_id(),
+            "method": "tools/list"
+        })
+
+        if "error" in tools_response:
+            raise Exception(f"取得工具列表失敗: {tools_response['error']}")
+
+        # 轉換工具格式為 OpenAI 相容格式
+        tools_data = tools_response.get("result", {}).get("tools", [])
+        self.tools = [{
+            "type": "function",
+            "name": tool["name"],
+            "description": tool["description"],
+            "parameters": tool["inputSchema"]
+        } for tool in tools_data]
+        self.tool_names = [tool["name"] for tool in tools_data]
+
+        print('-' * 20)
+        print(f"已連接 {self.server_name} 伺服器 ({self.transport})")
+        print(f"Message URL: {self.message_url}")
+        if server_config.get("uds"):
+            print(f"Unix socket: {server_config['uds']}")
+        print('\n'.join([f'    - {name}' for name in self.tool_names]))
+        print('-' * 20)
 
-        # 建立 HTTP 客戶端
-        self.http_client = httpx.AsyncClient(timeout=30.0)
+    async def _initialize(self):
+        """初始化連接；Streamable HTTP 另外取得工作階段並送出 initialized 通知"""
+        self.mcp_session_id = None
+        init_response = await self._send_request({
+            "jsonrpc": "2.0",
+            "id": self._next_id(),
+            "method": "initialize",
+            "params": {
+                "protocolVersion": "2025-03-26" if self.streamable else "2024-11-05",
+                "capabilities": {},
+                "clientInfo": {
+                    "name": "shell_helper_client",
+                    "version": "0.1.0"
+                }
+            }
+        })
 
-        # 連接到 SSE 端點並取得 message URL
+        if "error" in init_response:
+            raise Exception(f"初始化失敗: {init_response['error']}")
+
+        self.protocol_version = init_response.get("result", {}).get("protocolVersion")
+        if self.streamable:
+            await self._send_request({"jsonrpc": "2.0", "method": "notifications/initialized"})
+
+    async def _open_sse_endpoint(self, sse_url: str):
+        """連接到 SSE 端點並取得 message URL"""
         try:
-            async with self.http_client.stream("GET", sse_url) as response:
+            async with self.pool.client.stream("GET", sse_url, headers={"Accept": "text/event-stream"}) as response:
                 if response.status_code != 200:
                     raise Exception(f"連接失敗: HTTP {response.status_code}")
 
@@ -71,54 +191,8 @@ class SSEMCPClient:
                     raise Exception("未能從 SSE 端點取得 message URL")
 
         except Exception as e:
-            if self.http_client:
-                await self.http_client.aclose()
             raise Exception(f"連接 SSE 伺服器失敗: {str(e)}")
 
-        # 初始化連接
-        init_response = await self._send_request({
-            "jsonrpc": "2.0",
-            "id": self._next_id(),
-            "method": "initialize",
-            "params": {
-                "protocolVersion": "2024-11-05",
-                "capabilities": {},
-                "clientInfo": {
-                    "name": "shell_helper_client",
-                    "version": "0.1.0"
-                }
-            }
-        })
-
-        if "error" in init_response:
-            raise Exception(f"初始化失敗: {init_response['error']}")
-
-        # 取得工具列表
-        tools_response = await self._send_request({
-            "jsonrpc": "2.0",
-            "id": self._next_id(),
-            "method": "tools/list"
-        })
-
-        if "error" in tools_response:
-            raise Exception(f"取得工具列表失敗: {tools_response['error']}")
-
-        # 轉換工具格式為 OpenAI 相容格式
-        tools_data = tools_response.get("result", {}).get("tools", [])
-        self.tools = [{
-            "type": "function",
-            "name": tool["name"],
-            "description": tool["description"],
-            "parameters": tool["inputSchema"]
-        } for tool in tools_data]
-        self.tool_names = [tool["name"] for tool in tools_data]
-
-        print('-' * 20)
-        print(f"已連接 {self.server_name} 伺服器 (SSE)")
-        print(f"Message URL: {self.message_url}")
-        print('\n'.join([f'    - {name}' for name in self.tool_names]))
-        print('-' * 20)
-
     async def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Any:
         """呼叫 MCP 工具
 
@@ -129,14 +203,20 @@ class SSEMCPClient:
         Returns:
             工具執行結果
         """
+        params = {
+            "name": tool_name,
+            "arguments": arguments
+        }
+        # 在 _meta 中傳遞追蹤識別，伺服器端的 span 會接在目前的 span 之下
+        meta = inject({})
+        if meta:
+            params["_meta"] = meta
+
         response = await self._send_request({
             "jsonrpc": "2.0",
             "id": self._next_id(),
             "method": "tools/call",
-            "params": {
-                "name": tool_name,
-                "arguments": arguments
-            }
+            "params": params
         })
 
         if "error" in response:
@@ -151,100 +231,195 @@ class SSEMCPClient:
             request_data: JSON-RPC 請求資料
 
         Returns:
-            JSON-RPC 回應資料
+            JSON-RPC 回應資料（通知沒有回應，回傳空字典）
         """
-        if not self.http_client or not self.message_url:
+        if not self.message_url:
             raise Exception("客戶端未連接")
 
+        if self.handler is not None:
+            return await self.handler(request_data)
+
         try:
-            response = await self.http_client.post(
-                self.message_url,
-                json=request_data,
-                headers={"Content-Type": "application/json"}
-            )
+            if self.streamable:
+                try:
+                    return await self._send_streamable(request_data)
+                except SessionExpired:
+                    if request_data.get("method") == "initialize":
+                        raise Exception("初始化失敗: 伺服器拒絕工作階段")
+                    # 伺服器沒有處理這個請求，重新初始化後重送一次
+                    await self._initialize()
+                    return await self._send_streamable(request_data)
+
+            # 暫時性失敗由連線池重試；可能已執行的 tools/call 不會重送
+            response = await self.pool.post_json(self.message_url, request_data, headers=inject({}))
             response.raise_for_status()
             return response.json()
 
         except httpx.HTTPError as e:
             raise Exception(f"HTTP 請求失敗: {str(e)}")
 
+    def _streamable_headers(self) -> Dict[str, str]:
+        headers = {"Accept": "application/json, text/event-stream"}
+        if self.mcp_session_id:
+            headers[SESSION_HEADER] = self.mcp_session_id
+        if self.protocol_version:
+            headers[PROTOCOL_VERSION_HEADER] = self.protocol_version
+        return inject(headers)
+
+    async def _send_streamable(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
+        """以 Streamable HTTP 送出請求：回應可能是 JSON 或 SSE 串流
+
+        SSE 串流在收到回應前中斷時，以 Last-Event-ID 從中斷處續傳，
+        不會重新執行命令。
+        """
+        last_event_id = None
+        async with self.pool.stream("POST", self.message_url, request_data,
+                                    headers=self._streamable_headers()) as response:
+            if response.status_code == 404 and self.mcp_session_id:
+                raise SessionExpired()
+            if SESSION_HEADER.lower() in response.headers and request_data.get("method") == "initialize":
+                self.mcp_session_id = response.headers[SESSION_HEADER.lower()]
+            if response.status_code == 202:
+                return {}
+            if not response.headers.get("content-type", "").startswith("text/event-stream"):
+                await response.aread()
+                response.raise_for_status()
+                return response.json()
+            try:
+                async for event_id, message in iter_sse_messages(response):
+                    last_event_id = event_id or last_event_id
+                    if message.get("id") == request_data.get("id"):
+                        return message
+            except (httpx.ReadError, httpx.RemoteProtocolError):
+                if last_event_id is None:
+                    raise
+
+        # 串流結束或中斷但還沒收到回應：從最後收到的事件之後續傳
+        for _ in range(MAX_RESUME_ATTEMPTS):
+            if last_event_id is None:
+                break
+            headers = {**self._streamable_headers(), "Last-Event-ID": last_event_id}
+            try:
+                async with self.pool.stream("GET", self.message_url, headers=headers) as response:
+                    response.raise_for_status()
+                    async for event_id, message in iter_sse_messages(response):
+                        last_event_id = event_id or last_event_id
+                        if message.get("id") == request_data.get("id"):
+                            return message
+            except (httpx.ReadError, httpx.RemoteProtocolError):
+                continue
+        raise Exception("SSE 串流已結束，但沒有收到回應")
+
     def _next_id(self) -> int:
         """產生下一個請求 ID"""
         self.session_id += 1
         return self.session_id
 
     async def cleanup(self):
-        """清理資源"""
-        if self.http_client:
-            await self.http_client.aclose()
-
-async def get_reply_text(clients: List[SSEMCPClient], query: str, prev_id: Optional[str]):
-    """單次問答"""
-
-    messages = [{"role": "user", "content": query}]
-
-    # 把 clients 中個別項目的 tools 串接在一起
-    tools = []
-    for client in clients:
-        tools += client.tools
-
-    while True:
-        # 使用 Responses API 請 LLM 生成回覆
-        response = openai.responses.create(
-            # model="gpt-4.1-mini",
-            # model="gpt-4.1",
-            model="gpt-4.1-nano",
-            input=messages,
-            tools=tools,
-            previous_response_id=prev_id,
-        )
-
-        # 處理回應並執行工具
-        final_text = []
-        messages = []
-
-        prev_id = response.id
-        for output in response.output:
-            if output.type == 'message':  # 一般訊息
-                final_text.append(output.content[0].text)
-            elif output.type == 'function_call':  # 使用工具
-                tool_name = output.name
-                tool_args = eval(output.arguments)
-
-                # 尋找擁有此工具的客戶端
-                client = None
-                for c in clients:
-                    if tool_name in c.tool_names:
-                        client = c
-                        break
-
-                if not client:
-                    # 如果沒有找到對應的工具，則跳過
-                    continue
-
-                print(f"準備使用 {tool_name}(**{tool_args})")
-                print('-' * 20)
-
-                # 使用 MCP 伺服器提供的工具
-                try:
-                    result = await client.call_tool(tool_name, tool_args)
-                    result_text = result.get("content", [{}])[0].get("text", "")
-                    print(f"{result_text}")
-                except Exception as e:
-                    result_text = f"工具執行錯誤: {str(e)}"
-                    print(f"錯誤: {result_text}")
-
-                print('-' * 20)
+        """清理資源；Streamable HTTP 結束工作階段，共用的連線池由 main() 關閉"""
+        if self.streamable and self.mcp_session_id and self.message_url:
+            try:
+                await self.pool.client.delete(self.message_url, headers=self._streamable_headers())
+            except httpx.HTTPError:
+                pass
+        self.mcp_session_id = None
+        self.message_url = None
+        if self.pool is not SHARED_POOL:
+            await self.pool.aclose()
+
+async def get_reply_text(clients: List[SSEMCPClient], query: str, prev_id: Optional[str],
+                         cache: Optional[ToolResultCache] = None):
+    """單次問答
+
+    提供 cache 時，同一個聊天工作階段中重複的唯讀工具呼叫直接使用先前的結果，
+    不再送到 MCP 伺服器。
+    """
+
+    # 一次問答為一個 span，底下包含每次模型呼叫與工具呼叫
+    with start_span("agent.turn", attributes={"query.length": len(query)}) as turn_span:
+        messages = [{"role": "user", "content": query}]
+
+        # 把 clients 中個別項目的 tools 串接在一起
+        tools = []
+        for client in clients:
+            tools += client.tools
+
+        llm_calls = 0
+        while True:
+            # 使用 Responses API 請 LLM 生成回覆
+            llm_calls += 1
+            with start_span("llm.responses.create", "client", {"llm.model": LLM_MODEL}) as span:
+                response = openai.responses.create(
+                    # model="gpt-4.1-mini",
+                    # model="gpt-4.1",
+                    model=LLM_MODEL,
+                    input=messages,
+                    tools=tools,
+                    previous_response_id=prev_id,
+                )
+                if response.usage is not None:
+                    span.set_attribute("llm.input_tokens", response.usage.input_tokens)
+                    span.set_attribute("llm.output_tokens", response.usage.output_tokens)
+
+            # 處理回應並執行工具
+            final_text = []
+            messages = []
+
+            prev_id = response.id
+            for output in response.output:
+                if output.type == 'message':  # 一般訊息
+                    final_text.append(output.content[0].text)
+                elif output.type == 'function_call':  # 使用工具
+                    tool_name = output.name
+                    tool_args = eval(output.arguments)
+
+                    # 尋找擁有此工具的客戶端
+                    client = None
+                    for c in clients:
+                        if tool_name in c.tool_names:
+                            client = c
+                            break
 
-                messages.append({
-                    # 建立可傳回函式執行結果的字典
-                    "type": "function_call_output",  # 設為工具輸出類型的訊息
-                    "call_id": output.call_id,  # 叫用函式的識別碼
-                    "output": result_text  # 函式傳回值
-                })
+                    if not client:
+                        # 如果沒有找到對應的工具，則跳過
+                        continue
+
+                    print(f"準備使用 {tool_name}(**{tool_args})")
+                    print('-' * 20)
+
+                    # 使用 MCP 伺服器提供的工具
+                    try:
+                        attributes = {"mcp.tool": tool_name, "mcp.server": client.server_name}
+                        with start_span(f"tool.call {tool_name}", "client", attributes) as span:
+                            cached = cache.lookup(tool_name, tool_args) if cache else None
+                            span.set_attribute("tool.cache_hit", cached is not None)
+                            if cached is not None:
+                                # 相同的唯讀呼叫已經執行過，直接使用快取結果
+                                result_text = cached[0] + cached_note(cached[1])
+                                print("（使用快取結果）")
+                            else:
+                                result = await client.call_tool(tool_name, tool_args)
+                                result_text = result.get("content", [{}])[0].get("text", "")
+                                if cache and not result.get("isError"):
+                                    cache.store(tool_name, tool_args, result_text)
+                        print(f"{result_text}")
+                    except Exception as e:
+                        result_text = f"工具執行錯誤: {str(e)}"
+                        print(f"錯誤: {result_text}")
+
+                    print('-' * 20)
+
+                    messages.append({
+                        # 建立可傳回函式執行結果的字典
+                        "type": "function_call_output",  # 設為工具輸出類型的訊息
+                        "call_id": output.call_id,  # 叫用函式的識別碼
+                        "output": result_text  # 函式傳回值
+                    })
+
+            if messages == []:
+                break
 
-        if messages == []:
-            break
+        turn_span.set_attribute("llm.calls", llm_calls)
 
     return "\n".join(final_text), prev_id
 
@@ -253,6 +428,8 @@ async def chat_loop(clients: List[SSEMCPClient]):
     print("直接按 ↵ 可結束對話")
 
     prev_id = None
+    # 工具結果快取只在這次聊天中有效
+    cache = ToolResultCache()
     while True:
         try:
             query = input(">>> ").strip()
@@ -260,12 +437,18 @@ async def chat_loop(clients: List[SSEMCPClient]):
             if query == '':
                 break
 
-            reply, prev_id = await get_reply_text(clients, query, prev_id)
+            reply, prev_id = await get_reply_text(clients, query, prev_id, cache)
             print(reply)
 
         except Exception as e:
             print(f"\nError: {str(e)}")
 
+def create_client(server_config: Dict[str, Any]) -> SSEMCPClient:
+    """依伺服器設定建立客戶端：設定 "uds" 時使用經由該 Unix domain socket 連線的連線池"""
+    if server_config.get("uds"):
+        return SSEMCPClient(pool=HTTPPool(uds=server_config["uds"]))
+    return SSEMCPClient()
+
 async def main():
     """主程式"""
 
@@ -288,17 +471,20 @@ async def main():
     clients = []
     try:
         # 連接所有 SSE 伺服器
+        sse_infos = []
         for server_info in server_infos:
             server_config = server_info[1]
 
-            # 只處理 SSE transport 的伺服器
-            if server_config.get("transport") == "sse" or "url" in server_config:
-                client = SSEMCPClient()
-                await client.connect_to_server(server_info)
-                clients.append(client)
+            # 只處理 SSE、Streamable HTTP 與行程內 transport 的伺服器
+            if "url" in server_config or server_config.get("transport") == IN_PROCESS_TRANSPORT:
+                sse_infos.append(server_info)
             else:
                 print(f"警告: 跳過非 SSE 伺服器 {server_info[0]}")
 
+        # 同時連接所有伺服器，共用連線池，伺服器很多時不必逐一等待
+        clients = [create_client(info[1]) for info in sse_infos]
+        await asyncio.gather(*(client.connect_to_server(info) for client, info in zip(clients, sse_infos)))
+
         if not clients:
             print("Error: 沒有可用的 SSE 伺服器", file=sys.stderr)
             return
@@ -310,6 +496,7 @@ async def main():
         # 清理所有客戶端資源
         for client in clients[::-1]:
             await client.cleanup()
+        await SHARED_POOL.aclose()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -49,8 +49,7 @@ def open_dashboard_in_browser(host: str = "localhost", port: int = 8000):
         print("  1. Click test cards to expand/collapse details")
         print("  2. Use 'Expand All' button to expand all tests")
         print("  3. Use filter buttons to filter success/failure tests")
-        print("  4. Use refresh interval settings to adjust update frequency")
-        print("  5. Dashboard auto-refreshes every 5 seconds (adjustable)")
+        print("  4. New test results are pushed by the server as they are written")
 
         return True
     except Exception as e:
@@ -0,0 +1,147 @@
+"""
+監控探測（test_quick_endpoint.py）使用的固定頻率排程器，只在客戶端執行
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# 上一輪尚未結束時的處理方式
+OVERRUN_POLICIES = ("skip", "queue")
+
+
+@dataclass
+class SchedulerStats:
+    """排程統計（秒）
+
+    lag 為實際開始時間與預定時間的差距；overruns 為耗時超過間隔的輪次。
+    """
+    ticks: int = 0
+    started: int = 0
+    skipped: int = 0
+    overruns: int = 0
+    in_flight: int = 0
+    last_lag: float = 0.0
+    max_lag: float = 0.0
+    total_lag: float = 0.0
+    last_duration: float = 0.0
+
+    @property
+    def mean_lag(self) -> float:
+        return self.total_lag / self.started if self.started else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "ticks": self.ticks,
+            "started": self.started,
+            "skipped": self.skipped,
+            "overruns": self.overruns,
+            "in_flight": self.in_flight,
+            "last_lag": self.last_lag,
+            "max_lag": self.max_lag,
+            "mean_lag": self.mean_lag,
+            "last_duration": self.last_duration
+        }
+
+
+class FixedRateScheduler:
+    """以 monotonic 時鐘計算的固定頻率排程器
+
+    第 k 次排程的預定時間固定為 start + k × interval，每輪的耗時不會
+    累積成週期漂移。同時執行的輪次達到 max_in_flight 時：
+
+    - skip：略過這次排程
+    - queue：等待空位後立即執行（最多保留一個等待中的排程，其餘略過）
+
+    事件迴圈被阻塞而錯過整個間隔的排程一律略過，之後回到原本的時間格線。
+
+    clock 與 sleep 可替換成虛擬時間，讓測試不依賴實際經過的時間。
+    """
+
+    def __init__(self, interval: float, overrun_policy: str = "skip", max_in_flight: int = 1,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep):
+        if interval <= 0:
+            raise ValueError("interval 必須大於 0")
+        if overrun_policy not in OVERRUN_POLICIES:
+            raise ValueError(f"不支援的 overrun_policy: {overrun_policy}")
+        self.interval = interval
+        self.overrun_policy = overrun_policy
+        self.max_in_flight = max(1, max_in_flight)
+        self.stats = SchedulerStats()
+        self.clock = clock
+        self.sleep = sleep
+        self._waiting = 0
+
+    async def run(self, job: Callable[[], Awaitable[Any]], duration: Optional[float] = None) -> SchedulerStats:
+        """依排程重複執行 job，直到超過 duration 秒（None 表示持續執行）
+
+        Returns:
+            排程統計
+        """
+        slots = asyncio.Semaphore(self.max_in_flight)
+        tasks: Set[asyncio.Task] = set()
+        start = self.clock()
+        tick = 0
+
+        try:
+            while duration is None or tick * self.interval < duration:
+                scheduled = start + tick * self.interval
+                delay = scheduled - self.clock()
+                if delay > 0:
+                    await self.sleep(delay)
+
+                missed = int((self.clock() - scheduled) // self.interval)
+                if missed > 0:
+                    logger.warning("排程落後 %d 個間隔，略過錯過的排程", missed)
+                    self.stats.ticks += missed
+                    self.stats.skipped += missed
+                    tick += missed
+                    scheduled = start + tick * self.interval
+                tick += 1
+                self.stats.ticks += 1
+
+                busy = self.stats.in_flight + self._waiting >= self.max_in_flight
+                if busy and (self.overrun_policy == "skip" or self._waiting > 0):
+                    self.stats.skipped += 1
+                    logger.warning("上一輪尚未結束（同時執行 %d 輪），略過本次排程", self.stats.in_flight)
+                    continue
+
+                task = asyncio.create_task(self._run_job(job, slots, scheduled))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        return self.stats
+
+    async def _run_job(self, job: Callable[[], Awaitable[Any]], slots: asyncio.Semaphore, scheduled: float) -> None:
+        """等待空位後執行一輪，記錄排程延遲與耗時"""
+        self._waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            self._waiting -= 1
+
+        started = self.clock()
+        lag = started - scheduled
+        self.stats.started += 1
+        self.stats.in_flight += 1
+        self.stats.last_lag = lag
+        self.stats.max_lag = max(self.stats.max_lag, lag)
+        self.stats.total_lag += lag
+        try:
+            await job()
+        except Exception:
+            logger.exception("排程工作發生錯誤")
+        finally:
+            slots.release()
+            self.stats.in_flight -= 1
+            elapsed = self.clock() - started
+            self.stats.last_duration = elapsed
+            if elapsed > self.interval:
+                self.stats.overruns += 1
+                logger.warning("本輪耗時 %.1f 秒，超過監控間隔 %.1f 秒", elapsed, self.interval)
@@ -1,9 +1,15 @@
-import uvicorn
+import argparse
+
+from api.local_socket import add_listen_arguments, serve
 
 if __name__ == "__main__":
-    uvicorn.run(
+    parser = argparse.ArgumentParser(description="Shell Helper API 伺服器")
+    add_listen_arguments(parser)
+    args = parser.parse_args()
+    serve(
         "api.main:app",
-        host="0.0.0.0",
-        port=8000,
+        host=args.host,
+        port=args.port,
+        uds=args.uds,
         reload=True
     )
\ No newline at end of file
@@ -1,9 +1,19 @@
-from mcp.server.fastmcp import FastMCP
-import subprocess, platform
+import asyncio, platform, sys, os, time
+from typing import List, Optional, Union
+from api.accounting import abort_command, command_pattern, finish_command
+from api.command_line import launch_command
+from api.mcp_stdio import StdioMCPServer
+from api.output_compaction import CompactionError, compact_output, compaction_note, resolve_compaction
+from api.sandbox import SandboxError, open_sandbox, resolve_limits, usage_note
+from api.table_parser import parse_tables, compact_tables
 
-mcp = FastMCP("shell_helper")
+# stdio 伺服器每次對話都會重新啟動，預設使用不載入 mcp 套件的精簡實作；
+# 設定此環境變數或加上 --fastmcp 參數時改用 FastMCP
+FASTMCP_ENV = "SHELL_HELPER_FASTMCP"
 
-@mcp.tool()
+stdio_server = StdioMCPServer("shell_helper")
+
+@stdio_server.tool({"type": "object", "properties": {}})
 async def get_platform() -> str:
     """取得作業系統平台
 
@@ -19,9 +29,24 @@ async def get_platform() -> str:
     else:        
         return "Unknown"
 
-@mcp.tool()
+@stdio_server.tool({
+    "type": "object",
+    "properties": {
+        "platform": {"type": "string"},
+        "shell_command": {"type": "string"},
+        "output_format": {"type": "string", "default": "text"},
+        "argv": {"type": "array", "items": {"type": "string"}},
+        "compact": {"type": ["object", "boolean"]},
+        "limits": {"type": "object"}
+    },
+    "required": ["platform"]
+})
 async def shell_helper(platform: str, 
-                       shell_command: str
+                       shell_command: Optional[str] = None,
+                       output_format: str = "text",
+                       argv: Optional[List[str]] = None,
+                       compact: Union[None, bool, dict] = None,
+                       limits: Optional[dict] = None
 ) -> str:
     """可以依據 platform 指定的平作業系統平台執行：
        Windows powershell 指令或是 Linux/MacOS  
@@ -32,48 +57,102 @@ async def shell_helper(platform: str,
                                    "*nix" 為 Linux 或 MacOS
         shell_command (str): 要執行的指令，Windows 平台只接受 
                              powershell 指令
+        output_format (str): 輸出格式，"text" 為原始文字；"table" 會將
+                             表格（Format-Table 或 JSON 輸出）解析為
+                             具型別欄位的精簡 JSON
+        argv (list[str]): 不經過 shell 直接執行的命令與參數，例如
+                          ["uname", "-a"]；提供時忽略 shell_command
+        compact (dict): 輸出精簡設定，預設移除 ANSI 控制碼、合併重複行、
+                        截斷過長的行並限制輸出為 64 KiB（保留開頭與結尾）；
+                        可覆寫 strip_ansi、dedupe、max_line_length、
+                        max_bytes、tail_ratio，false 或 {"enabled": false} 取得完整輸出
+        limits (dict): 資源限制，可設定 cpu_seconds（CPU 秒數）、memory_mb
+                       （記憶體 MB）；設定 SHELL_HELPER_CGROUP_ROOT 時另可設定
+                       cpu_quota（CPU 數）、max_pids、io_weight。可能耗用大量
+                       資源的命令（大範圍搜尋、編譯）建議設定
     """
 
-    # 啟動子行程
-    if platform == "Windows":
-        args = ['powershell', '-Command', shell_command]
-    elif platform == "*nix":
-        args = shell_command
-    else:
+    if platform not in ("Windows", "*nix"):
         return "不支援的作業系統平台"
-    
-    process = subprocess.Popen(
-        args,
-        shell=True,             # 在 shell 中執行
-        stdout=subprocess.PIPE, # 擷取標準輸出
-        stderr=subprocess.PIPE, # 擷取錯誤輸出
-        text=True               # 以文字形式返回
-    )
-
-    result = '執行結果：\n\n```\n'
-
-    # 即時讀取輸出
-    while True:
-        output = process.stdout.readline()
-        # 如果沒有輸出且行程結束
-        if output == '' and process.poll() is not None:
-            break
-        if output:
-            result += output
-
-    result += "```"
-
-    # 檢查錯誤輸出
-    error = process.stderr.read()
-    if error:
-        result += f"\n\n錯誤: {error}"
-
-    # 等待行程結束並取得返回碼
-    return_code = process.wait()
+    if not argv and not shell_command:
+        return "必須提供 shell_command 或 argv"
+
+    try:
+        options = resolve_compaction(compact)
+    except CompactionError as e:
+        return f"輸出精簡設定無效: {e}"
+    try:
+        sandbox = open_sandbox(resolve_limits(limits))
+    except SandboxError as e:
+        return f"資源限制無效: {e}"
+    try:
+        # 在工作執行緒中等待命令，事件迴圈仍可同時處理其他 tools/call 與 ping
+        return await asyncio.to_thread(_run_command, platform, shell_command, output_format, argv, options, sandbox)
+    finally:
+        if sandbox:
+            sandbox.close()
+
+def _run_command(platform: str, shell_command: Optional[str], output_format: str,
+                 argv: Optional[List[str]], options: Optional[dict], sandbox) -> str:
+    # 啟動子行程；不含 shell 語法的簡單命令直接執行，不經過 shell
+    started = time.perf_counter()
+    process, _ = launch_command(platform, shell_command, argv, sandbox)
+
+    try:
+        lines = []
+
+        # 即時讀取輸出
+        while True:
+            output = process.stdout.readline()
+            # 輸出結束（行程已關閉標準輸出）
+            if output == '':
+                break
+            lines.append(output)
+
+        output = "".join(lines)
+        tables = parse_tables(output) if output_format == "table" else []
+        if tables:
+            # 以解析後的表格取代填充空白的原始文字
+            result = '執行結果（表格）：\n\n```json\n' + compact_tables(output, tables) + "\n```"
+        else:
+            compacted, stats = compact_output(output, options)
+            result = '執行結果：\n\n```\n' + compacted + "```" + compaction_note(stats)
+
+        # 檢查錯誤輸出
+        error = process.stderr.read()
+        if error:
+            result += f"\n\n錯誤: {compact_output(error, options)[0]}"
+
+        # 等待行程結束並取得返回碼
+        return_code, _ = finish_command(process, started, command_pattern(shell_command, argv), sandbox)
+    except Exception:
+        # 讀取或組合結果失敗時結束並回收命令
+        abort_command(process)
+        raise
+    result += usage_note(sandbox.usage if sandbox else None)
     result += f"\n\n命令執行完成，返回碼: {return_code}\n\n"
 
     return result
 
+def create_fastmcp():
+    """建立註冊相同工具的 FastMCP 伺服器（第一次使用時才載入 mcp 套件）"""
+    from mcp.server.fastmcp import FastMCP
+
+    server = FastMCP("shell_helper")
+    server.tool()(get_platform)
+    server.tool()(shell_helper)
+    globals()["mcp"] = server
+    return server
+
+def __getattr__(name):
+    # `mcp dev` 等工具以 module.mcp 取得伺服器物件
+    if name == "mcp":
+        return create_fastmcp()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 if __name__ == "__main__":
     # 執行 MCP 伺服器
-    mcp.run(transport='stdio')
\ No newline at end of file
+    if "--fastmcp" in sys.argv or os.environ.get(FASTMCP_ENV):
+        create_fastmcp().run(transport='stdio')
+    else:
+        stdio_server.run()
\ No newline at end of file
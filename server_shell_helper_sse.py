@@ -1,19 +1,96 @@
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from sse_starlette.sse import EventSourceResponse
-import subprocess
 import platform
 import asyncio
 import json
-from typing import Dict, Any
+import shlex
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Union
+import time
 import uuid
-
-app = FastAPI(title="Shell Helper MCP Server")
+from api.compression import CompressionMiddleware
+from api.mcp_stdio import INVALID_PARAMS, negotiate_protocol_version
+from api.metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY, TOOL_CALLS, TOOL_DURATION,
+    CommandTimer, Gauge, MetricsMiddleware
+)
+from api.profiling import (
+    CURRENT_PROFILE, PROFILES, ProfiledRequest, ProfilingMiddleware, phase, resolve_mode
+)
+from api.accounting import USAGE, abort_command, command_pattern, finish_command
+from api.admission import (
+    ADMIN_TOKEN_HEADER, ADMISSION, CURRENT_CLIENT, AdmissionError, ClientIdentityMiddleware, RateLimited,
+    admin_allowed, resolve_rate_limits
+)
+from api.command_line import launch_command
+from api.output_compaction import (
+    DEFAULT_COMPACTION, CompactionError, compact_output, compaction_note, resolve_compaction
+)
+from api.sandbox import SandboxError, open_sandbox, resolve_limits, usage_note
+from api.spawner import start_spawner, stop_spawner
+from api.streamable_http import StreamableHTTPTransport
+from api.table_parser import parse_tables, compact_tables
+from api.tracing import (
+    CURRENT_SPAN, TRACE_COMMAND_LENGTH, TracingMiddleware, extract, start_span
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 使用 forkserver 時於啟動時建立輔助行程（SHELL_HELPER_SPAWNER=forkserver）
+    start_spawner()
+    yield
+    stop_spawner()
+
+app = FastAPI(title="Shell Helper MCP Server", lifespan=lifespan)
+
+# 依 Accept-Encoding 協商壓縮回應，SSE 串流逐事件壓縮並 flush
+app.add_middleware(CompressionMiddleware)
+# 選擇性剖析 /sse/messages 與 /mcp（X-Profile 標頭或 SHELL_HELPER_PROFILE 環境變數）
+app.add_middleware(ProfilingMiddleware, paths=("/sse/messages", "/mcp"))
+app.add_middleware(MetricsMiddleware)
+# 依 traceparent 標頭延續客戶端的追蹤（設定 OTEL_EXPORTER_OTLP_ENDPOINT 或 SHELL_HELPER_TRACE_FILE 時啟用）
+app.add_middleware(TracingMiddleware)
+# 識別客戶端（API 金鑰或來源位址），供速率限制與公平排程使用
+app.add_middleware(ClientIdentityMiddleware)
 
 # 儲存客戶端連接和訊息佇列
 clients: Dict[str, asyncio.Queue] = {}
 
+REGISTRY.register(Gauge("mcp_active_clients", "連線中的 SSE 客戶端數", func=lambda: len(clients)))
+
 # 工具定義
+# shell_helper 的輸出精簡設定，預設開啟（見 api/output_compaction.py）
+COMPACT_SCHEMA = {
+    "type": ["object", "boolean"],
+    "description": "輸出精簡設定：預設移除 ANSI 控制碼、合併重複行、截斷過長的行並限制輸出大小；"
+                   "{\"enabled\": false} 取得完整輸出",
+    "properties": {
+        "enabled": {"type": "boolean", "default": True},
+        "strip_ansi": {"type": "boolean", "default": DEFAULT_COMPACTION["strip_ansi"]},
+        "dedupe": {"type": "boolean", "default": DEFAULT_COMPACTION["dedupe"]},
+        "max_line_length": {"type": "integer", "description": "每行最多字元數，0 為不限制",
+                            "default": DEFAULT_COMPACTION["max_line_length"]},
+        "max_bytes": {"type": "integer", "description": "輸出最多位元組數，超過時保留開頭與結尾，0 為不限制",
+                      "default": DEFAULT_COMPACTION["max_bytes"]},
+        "tail_ratio": {"type": "number", "description": "超過上限時保留給結尾的比例",
+                       "default": DEFAULT_COMPACTION["tail_ratio"]}
+    }
+}
+
+# shell_helper 的資源限制，與 SHELL_HELPER_LIMITS 的預設上限取較小值（見 api/sandbox.py）
+LIMITS_SCHEMA = {
+    "type": "object",
+    "description": "資源限制；可能耗用大量 CPU 或記憶體的命令（大範圍搜尋、編譯）建議設定",
+    "properties": {
+        "cpu_seconds": {"type": "integer", "description": "CPU 時間上限（秒），超過時終止命令"},
+        "memory_mb": {"type": "integer", "description": "記憶體上限（MB）"},
+        "cpu_quota": {"type": "number", "description": "可使用的 CPU 數，例如 0.5（需要 cgroup）"},
+        "max_pids": {"type": "integer", "description": "行程數上限（需要 cgroup）"},
+        "io_weight": {"type": "integer", "description": "I/O 權重 1-10000，預設 100（需要 cgroup）"}
+    }
+}
+
 TOOLS = [
     {
         "name": "get_platform",
@@ -38,13 +115,31 @@ TOOLS = [
                 "shell_command": {
                     "type": "string",
                     "description": "要執行的指令，Windows 平台只接受 powershell 指令"
+                },
+                "argv": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "不經過 shell 直接執行的命令與參數（例如 [\"uname\", \"-a\"]），提供時忽略 shell_command"
+                },
+                "compact": COMPACT_SCHEMA,
+                "limits": LIMITS_SCHEMA,
+                "output_format": {
+                    "type": "string",
+                    "description": "輸出格式，\"text\" 為原始文字；\"table\" 會將表格（Format-Table 或 JSON 輸出）解析為具型別欄位的精簡 JSON",
+                    "enum": ["text", "table"],
+                    "default": "text"
                 }
             },
-            "required": ["platform", "shell_command"]
+            "required": ["platform"]
         }
     }
 ]
 
+TOOL_NAMES = {tool["name"] for tool in TOOLS}
+
+# 超過速率限制或排隊已滿（JSON-RPC 保留給伺服器定義的錯誤碼），data.retryAfter 為建議的重試秒數
+RATE_LIMITED = -32000
+
 async def get_platform_impl() -> str:
     """取得作業系統平台實作"""
     system = platform.system()
@@ -55,63 +150,161 @@ async def get_platform_impl() -> str:
     else:
         return "Unknown"
 
-async def shell_helper_impl(platform_param: str, shell_command: str) -> str:
-    """執行 shell 指令的實作"""
+async def shell_helper_impl(platform_param: str, shell_command: Optional[str] = None, output_format: str = "text",
+                            argv: Optional[List[str]] = None, compact: Union[None, bool, Dict[str, Any]] = None,
+                            limits: Optional[Dict[str, Any]] = None) -> str:
+    """執行 shell 指令的實作；提供 argv 時不經過 shell 直接執行，輸出依 compact 精簡，
+    有資源限制時在沙箱中執行並附上用量
 
-    # 啟動子行程
-    if platform_param == "Windows":
-        args = ['powershell', '-Command', shell_command]
-    elif platform_param == "*nix":
-        args = shell_command
-    else:
-        return "不支援的作業系統平台"
-
-    process = subprocess.Popen(
-        args,
-        shell=True,             # 在 shell 中執行
-        stdout=subprocess.PIPE, # 擷取標準輸出
-        stderr=subprocess.PIPE, # 擷取錯誤輸出
-        text=True               # 以文字形式返回
-    )
-
-    result = '執行結果：\n\n```\n'
-
-    # 即時讀取輸出
-    while True:
-        output = process.stdout.readline()
-        # 如果沒有輸出且行程結束
-        if output == '' and process.poll() is not None:
-            break
-        if output:
-            result += output
+    執行前經過目前客戶端的速率限制與公平排程，超過限制時拋出 RateLimited；
+    compact 無效時在啟動命令前拋出 CompactionError。
+    """
 
-    result += "```"
-
-    # 檢查錯誤輸出
-    error = process.stderr.read()
-    if error:
-        result += f"\n\n錯誤: {error}"
-
-    # 等待行程結束並取得返回碼
-    return_code = process.wait()
-    result += f"\n\n命令執行完成，返回碼: {return_code}\n\n"
-
-    return result
+    if platform_param not in ("Windows", "*nix"):
+        return "不支援的作業系統平台"
+    if not argv and not shell_command:
+        return "必須提供 shell_command 或 argv"
+    options = resolve_compaction(compact)
+    try:
+        sandbox = open_sandbox(resolve_limits(limits))
+    except SandboxError as e:
+        return f"資源限制無效: {e}"
+    try:
+        async with ADMISSION.admit(CURRENT_CLIENT.get()):
+            # 命令在工作執行緒中執行，不阻塞事件迴圈與其他客戶端的請求
+            return await asyncio.to_thread(_run_shell_command, platform_param, shell_command, output_format,
+                                           argv, options, sandbox)
+    finally:
+        if sandbox:
+            sandbox.close()
+
+def _run_shell_command(platform_param: str, shell_command: Optional[str], output_format: str,
+                       argv: Optional[List[str]], options: Optional[Dict[str, Any]], sandbox) -> str:
+    """啟動命令、讀取輸出並組成工具結果；options 為 resolve_compaction 的結果，sandbox 為 None 時不限制資源"""
+    command_text = shlex.join(argv) if argv else shell_command
+    attributes = {"shell.platform": platform_param, "shell.command": command_text[:TRACE_COMMAND_LENGTH]}
+    with start_span("subprocess", attributes=attributes) as span:
+        timer = CommandTimer("mcp")
+        process = None
+        try:
+            with phase("spawn"):
+                # 啟動子行程
+                process, mode = launch_command(platform_param, shell_command, argv,
+                                               sandbox)
+            timer.spawned()
+            span.set_attribute("process.pid", process.pid)
+            span.set_attribute("process.launch", mode)
+
+            lines = []
+
+            # 即時讀取輸出
+            with phase("read"):
+                while True:
+                    output = process.stdout.readline()
+                    # 輸出結束（行程已關閉標準輸出）
+                    if output == '':
+                        break
+                    timer.first_byte()
+                    lines.append(output)
+
+            with phase("build"):
+                output = "".join(lines)
+                tables = parse_tables(output) if output_format == "table" else []
+                if tables:
+                    # 以解析後的表格取代填充空白的原始文字
+                    result = '執行結果（表格）：\n\n```json\n' + compact_tables(output, tables) + "\n```"
+                else:
+                    compacted, stats = compact_output(output, options)
+                    result = '執行結果：\n\n```\n' + compacted + "```" + compaction_note(stats)
+
+            with phase("wait"):
+                # 檢查錯誤輸出
+                error = process.stderr.read()
+                if error:
+                    result += f"\n\n錯誤: {compact_output(error, options)[0]}"
+
+                # 等待行程結束並取得返回碼
+                return_code, _ = finish_command(process, timer.start, command_pattern(shell_command, argv), sandbox)
+            output_bytes = len(output.encode("utf-8"))
+            timer.finish("success" if return_code == 0 else "failure", output_bytes)
+        except Exception:
+            # 啟動後的讀取、壓縮或等待失敗也要記錄，執行中命令數才不會一直累加
+            timer.finish("error")
+            if process is not None:
+                abort_command(process)
+            raise
+        span.set_attribute("process.exit_code", return_code)
+        span.set_attribute("process.output_bytes", output_bytes)
+        result += usage_note(sandbox.usage if sandbox else None)
+        result += f"\n\n命令執行完成，返回碼: {return_code}\n\n"
+
+        return result
 
 async def handle_jsonrpc_request(request_data: Dict[str, Any]) -> Dict[str, Any]:
-    """處理 JSON-RPC 請求"""
+    """處理 JSON-RPC 請求
+
+    設定 SHELL_HELPER_PROFILE_REQUESTS 時，params._meta.profile 可對單一請求開啟剖析（值同 X-Profile 標頭），
+    結果的 _meta.profileId 可由 /debug/profiles/{id} 取得。
+    params._meta.traceparent 延續客戶端的追蹤。
+    """
+    meta = (request_data.get("params") or {}).get("_meta") or {}
+    parent = extract(meta)
+    current = CURRENT_SPAN.get()
+    if parent is not None and current is not None and current.context.trace_id == parent.trace_id:
+        # 已由 HTTP 標頭延續同一個追蹤
+        parent = None
+    method = request_data.get("method")
+    attributes = {"rpc.system": "jsonrpc", "rpc.method": method}
+    if method == "tools/call":
+        attributes["mcp.tool"] = request_data.get("params", {}).get("name")
+    with start_span(f"jsonrpc {method}", "server", attributes, parent):
+        return await _profile_jsonrpc_request(request_data, meta)
+
+async def _profile_jsonrpc_request(request_data: Dict[str, Any], meta: Dict[str, Any]) -> Dict[str, Any]:
+    """依 params._meta.profile 剖析單一請求"""
+    mode = None
+    if "profile" in meta and CURRENT_PROFILE.get() is None:
+        mode = resolve_mode(str(meta["profile"]))
+    if mode is None:
+        return await _handle_jsonrpc_request(request_data)
+
+    with ProfiledRequest(f"jsonrpc {request_data.get('method')}", mode) as profile:
+        response = await _handle_jsonrpc_request(request_data)
+    if isinstance(response.get("result"), dict):
+        response["result"].setdefault("_meta", {})["profileId"] = profile.id
+    return response
+
+async def _handle_jsonrpc_request(request_data: Dict[str, Any]) -> Dict[str, Any]:
+    """工具呼叫另外記錄次數與耗時"""
+    if request_data.get("method") != "tools/call":
+        return await _dispatch_jsonrpc_request(request_data)
+
+    tool_name = request_data.get("params", {}).get("name")
+    # 未定義的工具名稱統一記為 unknown，避免標籤數量無限增長
+    if tool_name not in TOOL_NAMES:
+        tool_name = "unknown"
+    start = time.perf_counter()
+    with phase(f"tools/call {tool_name}"):
+        response = await _dispatch_jsonrpc_request(request_data)
+    TOOL_DURATION.labels(tool_name).observe(time.perf_counter() - start)
+    TOOL_CALLS.labels(tool_name, "error" if "error" in response else "success").inc()
+    return response
+
+async def _dispatch_jsonrpc_request(request_data: Dict[str, Any]) -> Dict[str, Any]:
+    """依 method 分派 JSON-RPC 請求"""
     method = request_data.get("method")
     params = request_data.get("params", {})
     request_id = request_data.get("id")
 
     try:
         if method == "initialize":
-            # 初始化連接
+            # 初始化連接；/sse 客戶端使用 2024-11-05，/mcp（Streamable HTTP）使用 2025-03-26 以後的版本
+            version = negotiate_protocol_version(params.get("protocolVersion"))
             return {
                 "jsonrpc": "2.0",
                 "id": request_id,
                 "result": {
-                    "protocolVersion": "2024-11-05",
+                    "protocolVersion": version,
                     "capabilities": {
                         "tools": {}
                     },
@@ -155,7 +348,11 @@ async def handle_jsonrpc_request(request_data: Dict[str, Any]) -> Dict[str, Any]
             elif tool_name == "shell_helper":
                 platform_param = tool_args.get("platform")
                 shell_command = tool_args.get("shell_command")
-                result = await shell_helper_impl(platform_param, shell_command)
+                output_format = tool_args.get("output_format", "text")
+                argv = tool_args.get("argv")
+                compact = tool_args.get("compact")
+                limits = tool_args.get("limits")
+                result = await shell_helper_impl(platform_param, shell_command, output_format, argv, compact, limits)
                 return {
                     "jsonrpc": "2.0",
                     "id": request_id,
@@ -189,6 +386,27 @@ async def handle_jsonrpc_request(request_data: Dict[str, Any]) -> Dict[str, Any]
                 }
             }
 
+    except CompactionError as e:
+        return {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "error": {
+                "code": INVALID_PARAMS,
+                "message": f"輸出精簡設定無效: {e}"
+            }
+        }
+
+    except RateLimited as e:
+        return {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "error": {
+                "code": RATE_LIMITED,
+                "message": str(e),
+                "data": {"retryAfter": round(e.retry_after, 3)}
+            }
+        }
+
     except Exception as e:
         return {
             "jsonrpc": "2.0",
@@ -250,9 +468,11 @@ async def message_endpoint(request: Request):
     """訊息端點 - 接收客戶端的 JSON-RPC 請求"""
 
     try:
-        request_data = await request.json()
+        with phase("parse"):
+            request_data = await request.json()
         response_data = await handle_jsonrpc_request(request_data)
-        return JSONResponse(content=response_data)
+        with phase("encode"):
+            return JSONResponse(content=response_data)
 
     except json.JSONDecodeError:
         return JSONResponse(
@@ -278,6 +498,56 @@ async def message_endpoint(request: Request):
             }
         )
 
+# Streamable HTTP：單一端點，一次 POST 就完成工具呼叫，結果可在同一條連線上以 SSE 串流回傳
+streamable_http = StreamableHTTPTransport(handle_jsonrpc_request)
+app.add_api_route("/mcp", streamable_http.handle_post, methods=["POST"])
+app.add_api_route("/mcp", streamable_http.handle_get, methods=["GET"])
+app.add_api_route("/mcp", streamable_http.handle_delete, methods=["DELETE"])
+
+REGISTRY.register(Gauge("mcp_streamable_sessions", "Streamable HTTP 工作階段數",
+                        func=lambda: len(streamable_http.sessions)))
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 文字格式的執行指標"""
+    return Response(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/debug/profiles")
+async def list_profiles(limit: int = 50):
+    """最近的請求剖析摘要（各階段耗時）"""
+    return JSONResponse(content=PROFILES.recent(min(max(limit, 1), 200)))
+
+@app.get("/debug/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: str = "json"):
+    """單一請求的剖析結果；format=text 只回傳呼叫追蹤文字"""
+    profile = PROFILES.get(profile_id)
+    if profile is None:
+        return JSONResponse(status_code=404, content={"detail": "找不到剖析結果"})
+    if format == "text":
+        return Response(profile.trace or "", media_type="text/plain; charset=utf-8")
+    return JSONResponse(content=profile.as_dict())
+
+@app.get("/debug/usage")
+async def command_usage(sort: str = "cpu", limit: int = 20):
+    """最近一段時間內各命令樣式的資源用量，找出成本最高的命令"""
+    return JSONResponse(content={"window_s": USAGE.window, "patterns": USAGE.summary(sort, min(max(limit, 1), 500))})
+
+@app.get("/admin/rate-limits")
+async def get_rate_limits():
+    """目前的速率限制設定、執行中與排隊中的命令數"""
+    return JSONResponse(content=ADMISSION.snapshot())
+
+@app.patch("/admin/rate-limits")
+async def update_rate_limits(request: Request):
+    """修改速率限制設定；只更新請求中提供的欄位，需要 X-Admin-Token（SHELL_HELPER_ADMIN_TOKEN）"""
+    if not admin_allowed(request.headers.get(ADMIN_TOKEN_HEADER)):
+        return JSONResponse(status_code=403, content={"detail": "需要有效的管理權杖"})
+    try:
+        ADMISSION.configure(resolve_rate_limits(await request.json(), ADMISSION.config))
+    except (AdmissionError, json.JSONDecodeError) as e:
+        return JSONResponse(status_code=400, content={"detail": str(e)})
+    return JSONResponse(content=ADMISSION.snapshot())
+
 @app.get("/health")
 async def health_check():
     """健康檢查端點"""
@@ -285,9 +555,15 @@ async def health_check():
         "status": "healthy",
         "server": "shell_helper",
         "version": "0.1.0",
-        "active_clients": len(clients)
+        "active_clients": len(clients),
+        "streamable_sessions": len(streamable_http.sessions)
     }
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    import argparse
+    from api.local_socket import add_listen_arguments, serve
+
+    parser = argparse.ArgumentParser(description="Shell Helper MCP 伺服器（SSE / Streamable HTTP）")
+    add_listen_arguments(parser)
+    args = parser.parse_args()
+    serve(app, host=args.host, port=args.port, uds=args.uds)
@@ -6,16 +6,21 @@ echo "========================================="
 echo "Shell Helper SSE Server"
 echo "========================================="
 echo ""
-echo "正在啟動 SSE 伺服器於 http://0.0.0.0:8000"
+if [ -n "$SHELL_HELPER_UDS" ]; then
+    echo "正在啟動 SSE 伺服器於 unix:$SHELL_HELPER_UDS"
+else
+    echo "正在啟動 SSE 伺服器於 http://0.0.0.0:8000"
+fi
 echo ""
 echo "可用端點:"
 echo "  - GET  /health         健康檢查"
 echo "  - GET  /sse            SSE 串流端點"
 echo "  - POST /sse/messages   訊息接收端點"
+echo "  - POST /mcp            Streamable HTTP 端點"
 echo ""
 echo "按 Ctrl+C 停止伺服器"
 echo "========================================="
 echo ""
 
-# 啟動伺服器
-uv run uvicorn server_shell_helper_sse:app --host 0.0.0.0 --port 8000
+# 啟動伺服器（設定 SHELL_HELPER_UDS 時改為監聽 Unix domain socket，權限 0600）
+uv run python server_shell_helper_sse.py --host 0.0.0.0 --port 8000
@@ -5,7 +5,9 @@ import asyncio
 from playwright.async_api import async_playwright
 import argparse
 from datetime import datetime
+import json
 import os
+import re
 
 
 async def test_dashboard(
@@ -194,6 +196,121 @@ async def open_dashboard(
         await browser.close()
 
 
+def make_fake_tests(count: int) -> dict:
+    """產生 /api/test-results 格式的假資料（由新到舊），一半的輸出包含表格"""
+    table_output = (
+        "ProcessName   PID Memory(GB)\n"
+        "-----------   --- ----------\n"
+        + "".join(f"proc{i:<8} {1000 + i:>5} {i / 10:>10.2f}\n" for i in range(20))
+    )
+    tests = []
+    for i in range(count, 0, -1):
+        tests.append({
+            "id": i,
+            "run_id": (i + 2) // 3,
+            "run_time": "2025-01-01 00:00:00",
+            "number": (i - 1) % 3 + 1,
+            "exec_time": "2025-01-01T00:00:00",
+            "command": f"Get-Process #{i}",
+            "platform": "Windows",
+            "status": "success" if i % 5 else "failure",
+            "actual_platform": "Windows",
+            "return_code": 0 if i % 5 else 1,
+            "output": table_output if i % 2 else f"第 {i} 次執行的輸出",
+            "error": None,
+            "tables": None
+        })
+    failure = count // 5
+    return {
+        "tests": tests,
+        "summary": {"total": count, "success": count - failure, "failure": failure},
+        "last_id": count,
+        "next_before": None
+    }
+
+
+async def benchmark_dashboard(
+    url: str = "http://localhost:8000/dashboard",
+    entries: int = 10000,
+    headless: bool = True
+):
+    """
+    測量儀表板在大量測試紀錄下的渲染時間
+
+    以 page.route 攔截 /api/test-results，一次回傳 entries 筆假資料，
+    事件串流回傳 204 讓 EventSource 不再重新連線。
+
+    Args:
+        url: 儀表板 URL（只需提供頁面與靜態資源）
+        entries: 測試紀錄筆數
+        headless: 是否使用無頭模式
+    """
+    payload = json.dumps(make_fake_tests(entries), ensure_ascii=False)
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=headless)
+        context = await browser.new_context(viewport={'width': 1920, 'height': 1080})
+        page = await context.new_page()
+
+        async def serve_tests(route):
+            await route.fulfill(status=200, content_type="application/json", body=payload)
+
+        await page.route(re.compile(r"/api/test-results\?"), serve_tests)
+        await page.route(re.compile(r"/api/test-results/events"), lambda route: route.fulfill(status=204))
+
+        try:
+            print(f"📱 訪問儀表板: {url}（{entries} 筆紀錄）")
+            start = asyncio.get_running_loop().time()
+            await page.goto(url)
+            await page.wait_for_selector('.test-card', timeout=60000)
+            first_paint = (asyncio.get_running_loop().time() - start) * 1000
+
+            timings = await page.evaluate("""() => {
+                const measure = (fn) => {
+                    const start = performance.now();
+                    fn();
+                    return performance.now() - start;
+                };
+                const result = {};
+
+                // 冷渲染：捨棄所有卡片後重新渲染
+                result.cold = measure(() => { resetRenderedCards(); renderTests(); });
+
+                // 增量更新：加入一筆新紀錄，既有卡片沿用
+                const nextId = lastId + 1;
+                result.append = measure(() => {
+                    prependTests([{ ...testResults[0], id: nextId, command: 'new run' }]);
+                    refreshView();
+                });
+
+                // 捲動到清單中段
+                window.scrollTo(0, document.body.scrollHeight / 2);
+                result.scroll = measure(renderWindow);
+
+                // 展開全部（只格式化視窗內的卡片）
+                result.expandAll = measure(toggleAllTests);
+
+                // 過濾失敗項目
+                result.filter = measure(() => filterTests('failure'));
+
+                result.cards = document.querySelectorAll('.test-card').length;
+                return result;
+            }""")
+
+            print(f"\n⏱️  渲染時間（{entries} 筆紀錄）:")
+            print(f"  首次顯示（含載入）: {first_paint:.1f} ms")
+            print(f"  冷渲染: {timings['cold']:.1f} ms")
+            print(f"  新增一筆紀錄: {timings['append']:.1f} ms")
+            print(f"  捲動到中段: {timings['scroll']:.1f} ms")
+            print(f"  展開全部: {timings['expandAll']:.1f} ms")
+            print(f"  過濾失敗項目: {timings['filter']:.1f} ms")
+            print(f"  DOM 中的卡片數: {timings['cards']}")
+            return timings
+
+        finally:
+            await browser.close()
+
+
 def parse_arguments():
     """解析命令列參數"""
     parser = argparse.ArgumentParser(description="Playwright 儀表板自動化測試")
@@ -222,9 +339,15 @@ def parse_arguments():
     parser.add_argument(
         "--mode",
         type=str,
-        choices=["test", "open"],
+        choices=["test", "open", "bench"],
         default="test",
-        help="運行模式：test=自動化測試，open=僅打開瀏覽器（預設：test）"
+        help="運行模式：test=自動化測試，open=僅打開瀏覽器，bench=大量紀錄渲染效能測試（預設：test）"
+    )
+    parser.add_argument(
+        "--entries",
+        type=int,
+        default=10000,
+        help="bench 模式的測試紀錄筆數（預設：10000）"
     )
     parser.add_argument(
         "--browser",
@@ -247,6 +370,9 @@ async def main():
     if args.mode == "open":
         # 僅打開模式
         await open_dashboard(url=args.url, browser_type=args.browser)
+    elif args.mode == "bench":
+        # 渲染效能測試模式
+        await benchmark_dashboard(url=args.url, entries=args.entries, headless=args.headless)
     else:
         # 自動化測試模式
         await test_dashboard(
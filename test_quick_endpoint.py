@@ -1,12 +1,37 @@
 import httpx
-import json
 import os
-import sys
 import argparse
 import logging
 from datetime import datetime
 import asyncio
-from typing import Optional
+import random
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from api.results_store import ResultsStore
+from probe_scheduler import OVERRUN_POLICIES, FixedRateScheduler
+
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支援需要 h2 套件
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+DEFAULT_PARALLELISM = 4
+DEFAULT_JITTER = 0.1          # 艦隊模式中各主機開始探測的隨機延遲（佔監控間隔的比例）
+FLEET_SUMMARY_SIZE = 3        # 每輪摘要列出的最慢主機數
+
+# 每輪監控執行的測試命令
+TEST_COMMANDS = [
+    {"platform": None, "shell_command": "echo 'Hello from auto-detected platform'"},
+    {"platform": "Windows", "shell_command": "Get-Date"},
+    {
+        "platform": "Windows",
+        "shell_command": "$os = Get-CimInstance Win32_OperatingSystem; $totalGB = [math]::Round($os.TotalVisibleMemorySize/1MB, 2); $freeGB = [math]::Round($os.FreePhysicalMemory/1MB, 2); $usedGB = [math]::Round($totalGB - $freeGB, 2); $usagePercent = [math]::Round(($usedGB / $totalGB) * 100, 1); Write-Output '===== 系統記憶體使用情況 ====='; Write-Output \"總記憶體: $totalGB GB\"; Write-Output \"已使用: $usedGB GB ($usagePercent%)\"; Write-Output \"可用記憶體: $freeGB GB\"; Write-Output ''; Write-Output '===== 前30個最耗記憶體的程序 ====='; Get-Process | Sort-Object WS -Descending | Select-Object -First 30 | Select-Object @{N='ProcessName';E={$_.Name}}, @{N='PID';E={$_.ID}}, @{N='Memory(GB)';E={[math]::Round($_.WS/1GB,2)}}, @{N='CPU(s)';E={if($_.CPU -ne $null){[math]::Round($_.CPU,2)}else{'N/A'}}} | Format-Table -AutoSize | Out-String",
+        # 由伺服器解析 Format-Table 表格，儀表板直接呈現結構化資料
+        "output_format": "table"
+    }
+]
 
 # 配置logging
 def setup_logging():
@@ -51,6 +76,8 @@ def create_markdown_content(results):
         markdown.append(f"- **執行時間**: {result['timestamp']}")
         markdown.append(f"- **執行命令**: `{result['command']['shell_command']}`")
         markdown.append(f"- **指定平台**: {result['command']['platform'] or '自動偵測'}")
+        if "latency_ms" in result:
+            markdown.append(f"- **回應延遲**: {result['latency_ms']} ms")
         
         if "error" in result:
             markdown.append(f"- **狀態**: ❌ 失敗")
@@ -80,133 +107,370 @@ def create_markdown_content(results):
     
     return "\n".join(markdown)
 
-async def test_quick_endpoint(timeout_seconds: int = 30):
-    """測試 /quick 端點並將結果寫入檔案
+def append_markdown_report(results, output_md: str = "quick_endpoint_test_results.md"):
+    """將測試結果追加到 Markdown 報告（舊版格式，供人工閱讀）"""
+    markdown_content = create_markdown_content(results)
+    separator = "\n\n" + "="*80 + "\n\n"  # 新增分隔線
+
+    # 如果檔案不存在，直接寫入
+    if not os.path.exists(output_md):
+        with open(output_md, "w", encoding="utf-8") as f:
+            f.write(markdown_content)
+    else:
+        # 如果檔案存在，追加內容
+        with open(output_md, "a", encoding="utf-8") as f:
+            f.write(separator + markdown_content)
+
+    print(f"測試報告已追加到 {output_md}")
+
+def create_client(
+    base_url: str = "",
+    timeout_seconds: int = 30,
+    parallelism: int = DEFAULT_PARALLELISM,
+    http2: bool = False
+) -> httpx.AsyncClient:
+    """建立整個監控期間共用的 HTTP 客戶端
+
+    連線池保留 keep-alive 連線，每輪監控不必重新建立連線；
+    連線數上限與探測的平行數相同。
+
+    Args:
+        base_url: API 服務位址；艦隊模式為空字串，由各請求帶入完整網址
+        timeout_seconds: 請求超時時間（秒）
+        parallelism: 同時執行的探測數
+        http2: 是否啟用 HTTP/2（需安裝 h2 套件，且伺服器或代理支援）
+    """
+    if http2 and not HTTP2_AVAILABLE:
+        logging.getLogger(__name__).warning("未安裝 h2 套件，改用 HTTP/1.1（pip install 'httpx[http2]'）")
+        http2 = False
+
+    return httpx.AsyncClient(
+        base_url=base_url,
+        timeout=httpx.Timeout(timeout_seconds, connect=10.0),
+        limits=httpx.Limits(
+            max_connections=parallelism,
+            max_keepalive_connections=parallelism
+        ),
+        http2=http2
+    )
+
+async def run_probe(
+    client: httpx.AsyncClient,
+    cmd: Dict[str, Any],
+    semaphore: asyncio.Semaphore,
+    timeout_seconds: int = 30,
+    base_url: str = ""
+) -> Dict[str, Any]:
+    """對 /quick 端點執行單一探測，記錄結果與延遲"""
+    async with semaphore:
+        print(f"正在執行命令: {cmd['shell_command'][:50]}...")  # 只顯示命令的前50個字元
+        result: Dict[str, Any] = {"timestamp": datetime.now().isoformat(), "command": cmd}
+        start = time.perf_counter()
+        try:
+            response = await client.post(f"{base_url}/quick", json=cmd)
+            response.raise_for_status()
+            result.update(response=response.json(), status_code=response.status_code)
+        except httpx.TimeoutException:
+            result["error"] = f"請求超時 (超過 {timeout_seconds} 秒無回應)"
+            print(f"警告: 命令執行超時")
+        except Exception as e:
+            result["error"] = str(e)
+            print(f"錯誤: {str(e)}")
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return result
+
+async def run_probes(
+    client: httpx.AsyncClient,
+    commands: List[Dict[str, Any]],
+    parallelism: int = DEFAULT_PARALLELISM,
+    timeout_seconds: int = 30,
+    base_url: str = "",
+    semaphore: Optional[asyncio.Semaphore] = None
+) -> List[Dict[str, Any]]:
+    """同時執行多個探測（最多 parallelism 個），結果依命令順序排列
+
+    艦隊模式傳入所有主機共用的 semaphore，平行數上限套用於整個艦隊。
+    """
+    semaphore = semaphore or asyncio.Semaphore(max(1, parallelism))
+    return await asyncio.gather(*(
+        run_probe(client, cmd, semaphore, timeout_seconds, base_url) for cmd in commands
+    ))
+
+async def test_quick_endpoint(
+    client: httpx.AsyncClient,
+    timeout_seconds: int = 30,
+    parallelism: int = DEFAULT_PARALLELISM
+):
+    """測試 /quick 端點並將結果寫入結果資料庫
     
     Args:
+        client: 共用的 HTTP 客戶端（見 create_client）
         timeout_seconds: 請求超時時間（秒），預設30秒
+        parallelism: 同時執行的探測數
     """
     logger = logging.getLogger(__name__)
-    global base_url  # 使用全域變數，確保使用使用者指定的設定
-    logger.info(f"測試 /quick 端點，服務器位址: {base_url}")
-    
-    # 準備測試命令
-    test_commands = [
-        {"platform": None, "shell_command": "echo 'Hello from auto-detected platform'"},
-        {"platform": "Windows", "shell_command": "Get-Date"},
-        {
-            "platform": "Windows",
-            "shell_command": "$os = Get-CimInstance Win32_OperatingSystem; $totalGB = [math]::Round($os.TotalVisibleMemorySize/1MB, 2); $freeGB = [math]::Round($os.FreePhysicalMemory/1MB, 2); $usedGB = [math]::Round($totalGB - $freeGB, 2); $usagePercent = [math]::Round(($usedGB / $totalGB) * 100, 1); Write-Output '===== 系統記憶體使用情況 ====='; Write-Output \"總記憶體: $totalGB GB\"; Write-Output \"已使用: $usedGB GB ($usagePercent%)\"; Write-Output \"可用記憶體: $freeGB GB\"; Write-Output ''; Write-Output '===== 前30個最耗記憶體的程序 ====='; Get-Process | Sort-Object WS -Descending | Select-Object -First 30 | Select-Object @{N='ProcessName';E={$_.Name}}, @{N='PID';E={$_.ID}}, @{N='Memory(GB)';E={[math]::Round($_.WS/1GB,2)}}, @{N='CPU(s)';E={if($_.CPU -ne $null){[math]::Round($_.CPU,2)}else{'N/A'}}} | Format-Table -AutoSize | Out-String"
-        }
-    ]
-    
-    # 建立 HTTP 客戶端，設定超時時間
-    timeout = httpx.Timeout(timeout_seconds, connect=10.0)
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        results = []
-        
-        # 執行每個測試命令
-        for cmd in test_commands:
-            try:
-                print(f"正在執行命令: {cmd['shell_command'][:50]}...")  # 只顯示命令的前50個字元
-                response = await client.post(f"{base_url}/quick", json=cmd)
-                response.raise_for_status()
-                
-                result = {
-                    "timestamp": datetime.now().isoformat(),
-                    "command": cmd,
-                    "response": response.json(),
-                    "status_code": response.status_code
-                }
-            except httpx.TimeoutException as e:
-                result = {
-                    "timestamp": datetime.now().isoformat(),
-                    "command": cmd,
-                    "error": f"請求超時 (超過 {timeout_seconds} 秒無回應)"
-                }
-                print(f"警告: 命令執行超時")
-            except Exception as e:
-                result = {
-                    "timestamp": datetime.now().isoformat(),
-                    "command": cmd,
-                    "error": str(e)
-                }
-                print(f"錯誤: {str(e)}")
-            
-            results.append(result)
-            
-        # 生成 Markdown 內容
-        markdown_content = create_markdown_content(results)
-        
-        # 將結果追加寫入 Markdown 檔案
-        output_md = "quick_endpoint_test_results.md"
-        separator = "\n\n" + "="*80 + "\n\n"  # 新增分隔線
-        
-        # 如果檔案不存在，直接寫入
-        if not os.path.exists(output_md):
-            with open(output_md, "w", encoding="utf-8") as f:
-                f.write(markdown_content)
-        else:
-            # 如果檔案存在，追加內容
-            with open(output_md, "a", encoding="utf-8") as f:
-                f.write(separator + markdown_content)
-            
-        # 同時保存最新的 JSON 資料（使用時間戳記）
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_json = f"quick_endpoint_test_results_{timestamp}.json"
-        with open(output_json, "w", encoding="utf-8") as f:
-            json.dump(results, f, indent=2, ensure_ascii=False)
-            
-        print(f"測試報告已追加到 {output_md}")
-        print(f"本次測試的原始資料已保存到 {output_json}")
+    global results_store, markdown_report  # 使用全域變數，確保使用使用者指定的設定
+    logger.info(f"測試 /quick 端點，服務器位址: {client.base_url}")
+
+    start = time.perf_counter()
+    results = await run_probes(client, TEST_COMMANDS, parallelism, timeout_seconds)
+    latencies = ", ".join(f"{result['latency_ms']:.0f}" for result in results)
+    logger.info(
+        f"本輪 {len(results)} 個探測耗時 {(time.perf_counter() - start) * 1000:.0f} ms"
+        f"（各探測: {latencies} ms）"
+    )
 
-async def monitor_with_interval(interval_seconds: int, duration_minutes: Optional[int] = None, timeout_seconds: int = 30):
+    # 寫入結構化的結果資料庫；SQLite 寫入在工作執行緒進行，不阻塞事件迴圈上的其他探測
+    run_id = await asyncio.to_thread(results_store.add_results, results, host=host_key(str(client.base_url)))
+    print(f"本次測試結果已保存到 {results_store.path}（監控紀錄 #{run_id}）")
+
+    if markdown_report:
+        await asyncio.to_thread(append_markdown_report, results)
+
+def log_scheduler_stats(scheduler: FixedRateScheduler) -> None:
+    """輸出排程延遲統計"""
+    stats = scheduler.stats
+    logging.getLogger(__name__).info(
+        f"排程延遲: {stats.last_lag * 1000:.1f} ms（最大 {stats.max_lag * 1000:.1f} ms，"
+        f"平均 {stats.mean_lag * 1000:.1f} ms），略過 {stats.skipped} 次，超時 {stats.overruns} 輪"
+    )
+
+async def monitor_with_interval(
+    interval_seconds: int,
+    duration_minutes: Optional[int] = None,
+    timeout_seconds: int = 30,
+    parallelism: int = DEFAULT_PARALLELISM,
+    http2: bool = False,
+    overrun_policy: str = "skip",
+    max_in_flight: int = 1
+):
     """定期執行監控
     
+    以固定頻率排程：每輪的開始時間固定為啟動時間加上間隔的整數倍，
+    不受每輪耗時影響。
+    
     Args:
         interval_seconds: 監控間隔（秒）
         duration_minutes: 監控持續時間（分鐘），如果為 None 則持續執行
         timeout_seconds: 單次請求超時時間（秒）
+        parallelism: 同時執行的探測數
+        http2: 是否啟用 HTTP/2
+        overrun_policy: 上一輪尚未結束時略過（skip）或等待後執行（queue）
+        max_in_flight: 最多同時執行的輪數
     """
     logger = logging.getLogger(__name__)
-    start_time = datetime.now()
-    iteration = 1
+    scheduler = FixedRateScheduler(interval_seconds, overrun_policy, max_in_flight)
+    iteration = 0
     
     try:
-        while True:
-            logger.info(f"\n=== 開始第 {iteration} 次監控 ===")
-            logger.info(f"當前時間: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            
-            try:
-                # 檢查服務器狀態
-                timeout = httpx.Timeout(timeout_seconds)
-                async with httpx.AsyncClient(timeout=timeout) as client:
+        # 整個監控期間共用同一個客戶端與連線池
+        async with create_client(base_url, timeout_seconds, parallelism, http2) as client:
+            async def monitor_round():
+                nonlocal iteration
+                iteration += 1
+                logger.info(f"\n=== 開始第 {iteration} 次監控 ===")
+                logger.info(f"當前時間: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+                log_scheduler_stats(scheduler)
+                
+                try:
+                    # 檢查服務器狀態
                     try:
-                        response = await client.get(f"{base_url}/platform")
+                        response = await client.get("/platform")
                         if response.status_code == 200:
-                            await test_quick_endpoint(timeout_seconds)
+                            await test_quick_endpoint(client, timeout_seconds, parallelism)
                         else:
                             logger.error("無法連接到服務器")
                     except httpx.TimeoutException:
                         logger.warning(f"警告: 連接超時（超過 {timeout_seconds} 秒無回應）")
                         logger.info("等待下一次嘗試...")
-            except Exception as e:
-                logger.error(f"錯誤: {str(e)}")
-                logger.error("請確認服務器是否已啟動（執行 python run.py）")
-            
-            # 檢查是否達到監控持續時間
-            if duration_minutes is not None:
-                elapsed_minutes = (datetime.now() - start_time).total_seconds() / 60
-                if elapsed_minutes >= duration_minutes:
-                    print(f"\n已達到指定監控時間 {duration_minutes} 分鐘，停止監控")
-                    break
-            
-            iteration += 1
-            await asyncio.sleep(interval_seconds)
+                except Exception as e:
+                    logger.error(f"錯誤: {str(e)}")
+                    logger.error("請確認服務器是否已啟動（執行 python run.py）")
+
+            duration = duration_minutes * 60 if duration_minutes is not None else None
+            await scheduler.run(monitor_round, duration)
+            if duration is not None:
+                print(f"\n已達到指定監控時間 {duration_minutes} 分鐘，停止監控")
             
     except KeyboardInterrupt:
         print("\n接收到終止信號，停止監控")
         
+def host_key(base_url: str) -> str:
+    """取得主機在結果資料庫中的分區名稱（host:port）"""
+    return httpx.URL(base_url).netloc.decode()
+
+def parse_hosts(specs: List[str], default_port: int = 8000) -> List[str]:
+    """將主機清單轉換為 API 服務位址
+
+    每項可為 `host`、`host:port` 或完整的 `http(s)://host:port`，
+    以逗號分隔或每行一項；`#` 之後為註解。
+    """
+    base_urls = []
+    for spec in specs:
+        for item in spec.replace(",", "\n").splitlines():
+            item = item.split("#", 1)[0].strip()
+            if not item:
+                continue
+            if "://" not in item:
+                item = f"http://{item}"
+            url = httpx.URL(item)
+            base_url = f"{url.scheme}://{url.host}:{url.port or default_port}"
+            if base_url not in base_urls:
+                base_urls.append(base_url)
+    return base_urls
+
+async def probe_host(
+    client: httpx.AsyncClient,
+    base_url: str,
+    commands: List[Dict[str, Any]],
+    semaphore: asyncio.Semaphore,
+    timeout_seconds: int = 30,
+    delay: float = 0.0
+) -> Dict[str, Any]:
+    """於隨機延遲後探測單一主機
+
+    Returns:
+        {host, reachable, results, elapsed_ms, error}
+    """
+    await asyncio.sleep(delay)
+    host = host_key(base_url)
+    start = time.perf_counter()
+    try:
+        async with semaphore:
+            response = await client.get(f"{base_url}/platform")
+        response.raise_for_status()
+    except Exception as e:
+        return {
+            "host": host,
+            "reachable": False,
+            "results": [],
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+            "error": str(e) or type(e).__name__
+        }
+
+    results = await run_probes(
+        client, commands, timeout_seconds=timeout_seconds, base_url=base_url, semaphore=semaphore
+    )
+    return {
+        "host": host,
+        "reachable": True,
+        "results": results,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        "error": None
+    }
+
+def summarize_round(host_reports: List[Dict[str, Any]], top: int = FLEET_SUMMARY_SIZE) -> Dict[str, Any]:
+    """整理一輪艦隊監控：最慢的主機與失敗的主機
+
+    主機無法連線、任一探測請求失敗或命令返回碼非 0 時視為失敗。
+    """
+    failing = []
+    for report in host_reports:
+        if not report["reachable"]:
+            failing.append({"host": report["host"], "reason": f"無法連線: {report['error']}"})
+            continue
+        errors = [r for r in report["results"] if "error" in r]
+        nonzero = [r for r in report["results"] if "error" not in r and r["response"]["result"]["return_code"] != 0]
+        if errors or nonzero:
+            failing.append({
+                "host": report["host"],
+                "reason": f"{len(errors)} 個請求失敗，{len(nonzero)} 個命令返回碼非 0"
+            })
+
+    reachable = [report for report in host_reports if report["reachable"]]
+    slowest = sorted(
+        ({"host": r["host"], "elapsed_ms": r["elapsed_ms"]} for r in reachable),
+        key=lambda item: item["elapsed_ms"],
+        reverse=True
+    )[:top]
+    return {
+        "hosts": len(host_reports),
+        "reachable": len(reachable),
+        "slowest": slowest,
+        "failing": failing
+    }
+
+async def run_fleet_round(
+    client: httpx.AsyncClient,
+    base_urls: List[str],
+    commands: List[Dict[str, Any]],
+    semaphore: asyncio.Semaphore,
+    timeout_seconds: int = 30,
+    jitter_seconds: float = 0.0,
+    store: Optional[ResultsStore] = None
+) -> Dict[str, Any]:
+    """同時探測所有主機一次，各主機的開始時間隨機錯開
+
+    有 store 時，每個可連線主機的結果寫入以 host 區分的分區。
+    """
+    host_reports = await asyncio.gather(*(
+        probe_host(client, base_url, commands, semaphore, timeout_seconds, random.uniform(0, jitter_seconds))
+        for base_url in base_urls
+    ))
+    if store is not None:
+        # 所有主機的結果由同一個工作執行緒依序寫入，不阻塞事件迴圈也不互相競爭寫入鎖
+        await asyncio.to_thread(save_fleet_results, store, host_reports)
+    return summarize_round(host_reports)
+
+def save_fleet_results(store: ResultsStore, host_reports: List[Dict[str, Any]]) -> None:
+    """將可連線主機的結果寫入以 host 區分的分區"""
+    for report in host_reports:
+        if report["reachable"]:
+            store.add_results(report["results"], host=report["host"])
+
+def log_round_summary(summary: Dict[str, Any]) -> None:
+    """輸出一輪艦隊監控的摘要"""
+    logger = logging.getLogger(__name__)
+    logger.info(f"本輪艦隊監控: {summary['reachable']}/{summary['hosts']} 台主機可連線")
+    if summary["slowest"]:
+        slowest = ", ".join(f"{item['host']} ({item['elapsed_ms']:.0f} ms)" for item in summary["slowest"])
+        logger.info(f"最慢的主機: {slowest}")
+    for item in summary["failing"]:
+        logger.warning(f"失敗的主機 {item['host']}: {item['reason']}")
+
+async def monitor_fleet(
+    base_urls: List[str],
+    interval_seconds: int,
+    duration_minutes: Optional[int] = None,
+    timeout_seconds: int = 30,
+    parallelism: int = DEFAULT_PARALLELISM,
+    http2: bool = False,
+    jitter: float = DEFAULT_JITTER,
+    overrun_policy: str = "skip",
+    max_in_flight: int = 1
+):
+    """艦隊模式：定期同時監控多台主機
+
+    所有主機共用一個連線池與平行數上限；每輪各主機的開始時間在
+    interval × jitter 秒內隨機錯開，避免所有主機的探測同步發生。
+    排程方式與 monitor_with_interval 相同。
+    """
+    logger = logging.getLogger(__name__)
+    scheduler = FixedRateScheduler(interval_seconds, overrun_policy, max_in_flight)
+    semaphore = asyncio.Semaphore(max(1, parallelism))
+    iteration = 0
+
+    try:
+        async with create_client(timeout_seconds=timeout_seconds, parallelism=parallelism, http2=http2) as client:
+            async def fleet_round():
+                nonlocal iteration
+                iteration += 1
+                logger.info(f"\n=== 開始第 {iteration} 次艦隊監控（{len(base_urls)} 台主機）===")
+                log_scheduler_stats(scheduler)
+                summary = await run_fleet_round(
+                    client, base_urls, TEST_COMMANDS, semaphore, timeout_seconds,
+                    jitter_seconds=interval_seconds * jitter, store=results_store
+                )
+                log_round_summary(summary)
+
+            duration = duration_minutes * 60 if duration_minutes is not None else None
+            await scheduler.run(fleet_round, duration)
+            if duration is not None:
+                print(f"\n已達到指定監控時間 {duration_minutes} 分鐘，停止監控")
+
+    except KeyboardInterrupt:
+        print("\n接收到終止信號，停止監控")
+
 def parse_arguments():
     """解析命令列參數"""
     parser = argparse.ArgumentParser(description="系統資源監控工具")
@@ -239,6 +503,58 @@ def parse_arguments():
         default=8000,
         help="API 服務的埠號，預設為 8000"
     )
+    parser.add_argument(
+        "--store",
+        type=str,
+        default="quick_endpoint_results.db",
+        help="結果資料庫路徑，預設為 quick_endpoint_results.db"
+    )
+    parser.add_argument(
+        "--markdown",
+        action="store_true",
+        help="同時將結果追加到 quick_endpoint_test_results.md（舊版 Markdown 報告）"
+    )
+    parser.add_argument(
+        "-p", "--parallelism",
+        type=int,
+        default=DEFAULT_PARALLELISM,
+        help=f"同時執行的探測數，預設為 {DEFAULT_PARALLELISM}"
+    )
+    parser.add_argument(
+        "--http2",
+        action="store_true",
+        help="使用 HTTP/2 連線（需安裝 h2 套件，且伺服器或反向代理支援）"
+    )
+    parser.add_argument(
+        "--hosts",
+        type=str,
+        action="append",
+        help="艦隊模式：要監控的主機清單（host:port，以逗號分隔，可重複指定）"
+    )
+    parser.add_argument(
+        "--hosts-file",
+        type=str,
+        help="艦隊模式：主機清單檔案（每行一台 host:port，# 之後為註解）"
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=DEFAULT_JITTER,
+        help=f"艦隊模式中各主機開始探測的隨機延遲，佔監控間隔的比例，預設為 {DEFAULT_JITTER}"
+    )
+    parser.add_argument(
+        "--overrun",
+        type=str,
+        choices=OVERRUN_POLICIES,
+        default="skip",
+        help="上一輪尚未結束時的處理方式：skip=略過本次，queue=等待後立即執行（預設：skip）"
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=1,
+        help="最多同時執行的監控輪數，預設為 1"
+    )
     return parser.parse_args()
 
 async def main():
@@ -247,20 +563,41 @@ async def main():
     
     args = parse_arguments()
     
-    # 更新全域 base_url
-    global base_url
+    # 更新全域 base_url 與結果輸出設定
+    global base_url, results_store, markdown_report
     base_url = f"http://{args.host}:{args.port}"
+    results_store = ResultsStore(Path(args.store))
+    markdown_report = args.markdown
+
+    # 指定主機清單時進入艦隊模式
+    host_specs = list(args.hosts or [])
+    if args.hosts_file:
+        host_specs.append(Path(args.hosts_file).read_text(encoding="utf-8"))
+    fleet = parse_hosts(host_specs, args.port)
     
     logger.info("\n** 系統資源監控工具啟動 **")
-    logger.info(f"開始監控 {args.host}:{args.port}")
+    if fleet:
+        logger.info(f"艦隊模式，監控 {len(fleet)} 台主機: {', '.join(host_key(url) for url in fleet)}")
+    else:
+        logger.info(f"開始監控 {args.host}:{args.port}")
     logger.info(f"監控間隔: {args.interval} 秒")
     logger.info(f"請求超時: {args.timeout} 秒")
+    logger.info(f"探測平行數: {args.parallelism}")
     if args.duration:
         logger.info(f"監控時間: {args.duration} 分鐘")
     else:
         logger.info("監控持續執行直到手動停止 (按 Ctrl+C 終止)")
     
-    await monitor_with_interval(args.interval, args.duration, args.timeout)
+    if fleet:
+        await monitor_fleet(
+            fleet, args.interval, args.duration, args.timeout, args.parallelism, args.http2,
+            args.jitter, args.overrun, args.max_in_flight
+        )
+    else:
+        await monitor_with_interval(
+            args.interval, args.duration, args.timeout, args.parallelism, args.http2,
+            args.overrun, args.max_in_flight
+        )
 
 if __name__ == "__main__":
     try:
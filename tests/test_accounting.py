@@ -0,0 +1,64 @@
+import os
+import sys
+import pytest
+
+# 將專案根目錄加入 Python 路徑
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.accounting import UsageTable, command_pattern, wait_for_exit
+from api.command_line import launch_command
+
+
+@pytest.mark.parametrize("command, pattern", [
+    ("grep -c error /var/log/app.log | sort -n", "grep -c | sort -n"),
+    ("ls -la /tmp > out.txt 2>&1", "ls -la"),
+    ("LANG=C /usr/bin/git log --oneline -n 20 && git status", "git log --oneline -n && git status"),
+    ("head -n20 file; tail --lines=5 file", "head -nN ; tail --lines"),
+    ("echo 'unterminated", "echo"),
+    ("   ", ""),
+])
+def test_command_pattern(command, pattern):
+    assert command_pattern(command) == pattern
+
+
+def test_command_pattern_from_argv():
+    assert command_pattern("ignored", ["/bin/docker", "ps", "-a"]) == "docker ps -a"
+
+
+def test_usage_table_window_sort_and_eviction():
+    now = [0.0]
+    table = UsageTable(window=60, max_patterns=2, clock=lambda: now[0])
+    table.record("make", {"wall_s": 4.0, "cpu_user_s": 3.0, "cpu_system_s": 1.0, "max_rss_kb": 900}, 0)
+    now[0] = 30
+    table.record("ls", {"wall_s": 0.1, "cpu_user_s": 0.01, "io_read_bytes": 10}, 0)
+    table.record("ls", {"wall_s": 0.3, "cpu_user_s": 0.01, "io_write_bytes": 5}, 2)
+
+    rows = table.summary(sort="cpu")
+    assert [row["pattern"] for row in rows] == ["make", "ls"]
+    ls = rows[1]
+    assert (ls["count"], ls["failures"], ls["wall_max_s"], ls["io_total_bytes"]) == (2, 1, 0.3, 15)
+    assert [row["pattern"] for row in table.summary(sort="count")] == ["ls", "make"]
+
+    # 超過時間窗的紀錄不再計入
+    now[0] = 70
+    assert [row["pattern"] for row in table.summary()] == ["ls"]
+
+    # 樣式數超過上限時移除最久沒有出現的樣式
+    table.record("make", {"wall_s": 1.0}, 0)
+    table.record("du -sh", {"wall_s": 1.0}, 0)
+    assert sorted(row["pattern"] for row in table.summary()) == ["du -sh", "make"]
+
+
+@pytest.mark.skipif(not hasattr(os, "wait4"), reason="需要 wait4")
+def test_wait_for_exit_reports_usage(tmp_path):
+    target = tmp_path / "data"
+    process, _ = launch_command("*nix", f"head -c 65536 /dev/zero > {target}")
+    process.stdout.read()
+    process.stderr.read()
+    return_code, usage = wait_for_exit(process, 0.0)
+
+    assert return_code == 0
+    assert process.returncode == 0
+    assert usage["wall_s"] > 0
+    assert usage["max_rss_kb"] > 0
+    assert usage["write_chars"] >= 65536
@@ -0,0 +1,156 @@
+import os
+import sys
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+
+# 將專案根目錄加入 Python 路徑
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import server_shell_helper_sse
+from api import main
+from api.admission import (
+    ADMIN_TOKEN_ENV, ADMISSION, Admission, AdmissionError, ClientInfo, FairScheduler, RateLimited,
+    client_from_scope, resolve_rate_limits
+)
+
+ADMIN = {"X-Admin-Token": "admin-secret"}
+
+
+@pytest.fixture
+def restore_admission(monkeypatch):
+    monkeypatch.setenv(ADMIN_TOKEN_ENV, "admin-secret")
+    config = ADMISSION.config
+    yield ADMISSION
+    ADMISSION.configure(config)
+
+
+def test_resolve_rate_limits_merges_and_validates():
+    base = resolve_rate_limits({"rate": 2, "clients": {"addr:10.0.0.5": {"weight": 3}}})
+    config = resolve_rate_limits({"burst": 4, "clients": {"key:abc": {"rate": 0.5}}}, base)
+    assert (config["rate"], config["burst"]) == (2, 4)
+    assert config["clients"] == {"addr:10.0.0.5": {"weight": 3}, "key:abc": {"rate": 0.5}}
+    assert resolve_rate_limits({"clients": {"addr:10.0.0.5": None}}, base)["clients"] == {}
+    assert base["burst"] != 4
+
+    for invalid in ({"rate": -1}, {"max_concurrent": 0}, {"identity": ["cookie"]},
+                    {"clients": {"x": {"priority": 1}}}, {"window": 1}, {"identity": ["session"]}):
+        with pytest.raises(AdmissionError):
+            resolve_rate_limits(invalid)
+
+
+def test_client_identity_from_scope():
+    scope = {
+        "headers": [(b"authorization", b"Bearer secret"), (b"mcp-session-id", b"s1")],
+        "query_string": b"session_id=abc",
+        "client": ("10.0.0.5", 5000),
+    }
+    client = client_from_scope(scope)
+    assert client.key and client.key != "secret"
+    assert client.identity().startswith("key:")
+    assert client.identity(["address"]) == "addr:10.0.0.5"
+
+    # 客戶端自行決定的工作階段 ID 不影響識別
+    sse = client_from_scope({"headers": [(b"mcp-session-id", b"s1")], "query_string": b"session_id=abc",
+                             "client": ("10.0.0.5", 5000)})
+    assert sse.identity() == "addr:10.0.0.5"
+    assert ClientInfo().identity() == "local"
+
+
+@pytest.mark.asyncio
+async def test_weighted_round_robin_order():
+    scheduler = FairScheduler(max_concurrent=1)
+    await scheduler.acquire("holder")
+    order = []
+
+    async def run(client, name, weight):
+        await scheduler.acquire(client, weight)
+        order.append(name)
+
+    tasks = [asyncio.create_task(run("a", f"a{i}", 2)) for i in range(1, 5)]
+    tasks += [asyncio.create_task(run("b", f"b{i}", 1)) for i in range(1, 3)]
+    await asyncio.sleep(0)
+    assert scheduler.queued_by_client() == {"a": 4, "b": 2}
+
+    for _ in tasks:
+        scheduler.release()
+        await asyncio.sleep(0)
+    assert order == ["a1", "a2", "b1", "a3", "a4", "b2"]
+
+    # 排隊中被取消的命令不佔用名額
+    waiting = asyncio.create_task(scheduler.acquire("c"))
+    await asyncio.sleep(0)
+    waiting.cancel()
+    await asyncio.gather(waiting, return_exceptions=True)
+    assert scheduler.queued() == 0
+    scheduler.release()
+    assert scheduler.running == 0
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_rate_limit():
+    now = [0.0]
+    admission = Admission(resolve_rate_limits({"rate": 1, "burst": 2}), clock=lambda: now[0])
+    client = ClientInfo(address="10.0.0.5")
+
+    for _ in range(2):
+        async with admission.admit(client):
+            pass
+    with pytest.raises(RateLimited) as exc_info:
+        async with admission.admit(client):
+            pass
+    assert exc_info.value.retry_after == pytest.approx(1.0)
+    assert exc_info.value.retry_after_header == "1"
+
+    # 其他客戶端不受影響；時間經過後補充 token
+    async with admission.admit(ClientInfo(address="10.0.0.6")):
+        pass
+    now[0] = 1.0
+    async with admission.admit(client):
+        pass
+
+    # 執行中修改設定：個別客戶端不限制
+    admission.configure(resolve_rate_limits({"clients": {"addr:10.0.0.5": {"rate": 0}}}, admission.config))
+    for _ in range(5):
+        async with admission.admit(client):
+            pass
+    assert "addr:10.0.0.5" not in admission.snapshot()["tokens"]
+
+
+def test_execute_rate_limited(restore_admission):
+    client = TestClient(main.app)
+    assert client.patch("/admin/rate-limits", json={"rate": 1000}).status_code == 403
+    assert client.patch("/admin/rate-limits", json={"rate": 1000},
+                        headers={"X-Admin-Token": "wrong"}).status_code == 403
+    response = client.patch("/admin/rate-limits", json={"rate": 0.01, "burst": 1}, headers=ADMIN)
+    assert response.status_code == 200
+    assert response.json()["config"]["burst"] == 1
+
+    command = {"platform": "*nix", "shell_command": "echo ok"}
+    assert client.post("/execute", json=command, headers={"X-API-Key": "agent-1"}).status_code == 200
+    response = client.post("/execute", json=command, headers={"X-API-Key": "agent-1"})
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) > 1
+    assert client.post("/execute", json=command, headers={"X-API-Key": "agent-2"}).status_code == 200
+
+    metrics = client.get("/metrics").text
+    assert 'shell_admissions_total{client="default",result="rate_limited"}' in metrics
+    assert "shell_rate_limit_burst 1" in metrics
+
+    assert client.patch("/admin/rate-limits", json={"rate": "fast"}, headers=ADMIN).status_code == 400
+
+
+def test_tool_call_rate_limited(restore_admission):
+    client = TestClient(server_shell_helper_sse.app)
+    assert client.patch("/admin/rate-limits", json={"rate": 1000}).status_code == 403
+    assert client.patch("/admin/rate-limits", json={"rate": 0.01, "burst": 1}, headers=ADMIN).status_code == 200
+    request = {
+        "jsonrpc": "2.0", "id": 1, "method": "tools/call",
+        "params": {"name": "shell_helper", "arguments": {"platform": "*nix", "shell_command": "echo ok"}}
+    }
+    headers = {"X-API-Key": "tool-agent"}
+    assert "result" in client.post("/sse/messages", json=request, headers=headers).json()
+    # 更換工作階段 ID 不會取得新的額度
+    error = client.post("/sse/messages?session_id=other", json=request, headers=headers).json()["error"]
+    assert error["code"] == server_shell_helper_sse.RATE_LIMITED
+    assert error["data"]["retryAfter"] > 1
@@ -41,6 +41,11 @@ def test_execute_command(client):
     assert result["return_code"] == 0
     assert result["error"] is None
     assert "test command" in result["output"]
+    assert result["usage"]["wall_s"] > 0
+
+    response = client.get("/debug/usage", params={"sort": "wall"})
+    assert response.status_code == 200
+    assert "echo" in [row["pattern"] for row in response.json()["patterns"]]
 
 def test_quick_execute_with_platform(client):
     """測試 POST /quick 端點（指定平台）"""
@@ -91,4 +96,54 @@ def test_quick_execute_invalid_command(client):
     result = response.json()
     assert result["platform"] == current_platform
     assert result["result"]["return_code"] != 0  # 命令應該失敗
-    assert result["result"]["error"] is not None  # 應該有錯誤訊息
\ No newline at end of file
+    assert result["result"]["error"] is not None  # 應該有錯誤訊息
+
+@pytest.mark.skipif(platform.system() == "Windows", reason="僅適用於非 Windows 主機")
+def test_windows_platform_on_nix_host(client):
+    """測試在沒有 powershell 的主機上指定 Windows 平台：與找不到命令相同，回傳 127"""
+    for path in ("/execute", "/quick"):
+        response = client.post(path, json={"platform": "Windows", "shell_command": "Get-Date"})
+        assert response.status_code == 200
+        result = response.json()
+        result = result.get("result", result)
+        assert result["return_code"] == 127
+        assert "powershell" in result["error"]
+
+@pytest.mark.skipif(platform.system() == "Windows", reason="僅適用於 *nix 平台")
+def test_execute_argv(client):
+    """測試 POST /execute 端點（argv 直接執行，不經過 shell）"""
+    response = client.post(
+        "/execute",
+        json={"platform": "*nix", "argv": ["echo", "$HOME", "|", "*"]}
+    )
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["return_code"] == 0
+    assert result["output"] == "$HOME | *\n"
+
+def test_execute_requires_command(client):
+    """測試 POST /execute 端點（未提供 shell_command 或 argv）"""
+    response = client.post("/execute", json={"platform": "*nix"})
+    assert response.status_code == 422
+
+@pytest.mark.skipif(platform.system() == "Windows", reason="資源限制需要 setrlimit")
+def test_execute_with_limits(client):
+    """測試 POST /execute 端點（資源限制與用量）"""
+    response = client.post(
+        "/execute",
+        json={"platform": "*nix", "shell_command": "echo limited", "limits": {"cpu_seconds": 5}}
+    )
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["output"] == "limited\n"
+    assert result["usage"]["limits"] == {"cpu_seconds": 5}
+    assert result["usage"]["cpu_user_s"] >= 0
+    assert result["usage"]["wall_s"] > 0
+
+    response = client.post(
+        "/execute",
+        json={"platform": "*nix", "shell_command": "echo", "limits": {"disk_mb": 1}}
+    )
+    assert response.status_code == 400
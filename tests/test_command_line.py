@@ -0,0 +1,87 @@
+import os
+import sys
+import platform
+import subprocess
+import pytest
+
+# 將專案根目錄加入 Python 路徑
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.command_line import EXEC_FASTPATH_ENV, launch_command, split_simple_command
+
+CURRENT_PLATFORM = "Windows" if platform.system() == "Windows" else "*nix"
+nix_only = pytest.mark.skipif(CURRENT_PLATFORM == "Windows", reason="僅適用於 *nix 平台")
+
+
+@pytest.mark.parametrize("command, argv", [
+    ("uname -a", ["uname", "-a"]),
+    ("ls -la /tmp", ["ls", "-la", "/tmp"]),
+    ("grep 'a b' \"file name.txt\"", ["grep", "a b", "file name.txt"]),
+    ("  df   -h  ", ["df", "-h"]),
+])
+def test_split_simple_command(command, argv):
+    assert split_simple_command(command) == argv
+
+
+@pytest.mark.parametrize("command", [
+    "ps aux | grep python",
+    "echo $HOME",
+    "ls *.py",
+    "cd /tmp",
+    "FOO=1 env",
+    "echo `date`",
+    "sleep 1 && echo done",
+    "cat < file",
+    "echo 'unterminated",
+    "ls ~",
+    "echo a\\ b",
+    "",
+])
+def test_split_simple_command_requires_shell(command):
+    assert split_simple_command(command) is None
+
+
+@nix_only
+def test_launch_simple_command_without_shell():
+    process, mode = launch_command("*nix", "basename '/tmp/a  b'")
+    assert mode == "exec"
+    assert process.stdout.read() == "a  b\n"
+    assert process.wait() == 0
+
+
+@nix_only
+def test_launch_shell_command_and_disabled_fastpath(monkeypatch):
+    process, mode = launch_command("*nix", "echo one | tr a-z A-Z")
+    assert mode == "shell"
+    assert process.stdout.read() == "ONE\n"
+    process.wait()
+
+    monkeypatch.setenv(EXEC_FASTPATH_ENV, "0")
+    process, mode = launch_command("*nix", "uname")
+    assert mode == "shell"
+    process.wait()
+
+
+@nix_only
+def test_launch_argv_and_missing_executable():
+    process, mode = launch_command("*nix", argv=["printf", "%s", "$HOME; *"])
+    assert mode == "exec"
+    assert process.stdout.read() == "$HOME; *"
+    process.wait()
+
+    # 找不到執行檔時改由 shell 執行，與原本的錯誤訊息與返回碼相同
+    process, mode = launch_command("*nix", "invalid_command_123 --flag")
+    assert mode == "shell"
+    assert process.wait() == 127
+    assert "invalid_command_123" in process.stderr.read()
+
+
+@nix_only
+@pytest.mark.parametrize("command", [
+    "echo -e hi", "echo -n x", "printf %s-%s a", "pwd", "test -n x", "[ -d / ]", "kill -l 9",
+])
+def test_builtin_output_matches_shell(command):
+    """shell 內建命令的輸出與返回碼必須與 sh -c 相同"""
+    expected = subprocess.run(command, shell=True, capture_output=True, text=True)
+    process, _ = launch_command("*nix", command)
+    assert (process.stdout.read(), process.wait()) == (expected.stdout, expected.returncode)
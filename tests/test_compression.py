@@ -0,0 +1,120 @@
+import os
+import sys
+import gzip
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+# 添加專案根目錄到 Python 路徑
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api import main
+from api.compression import CompressionMiddleware, choose_encoding, SUPPORTED_ENCODINGS
+from api.results_cache import ResultsFileCache
+
+@pytest.fixture
+def client():
+    """建立測試用的 FastAPI 客戶端"""
+    return TestClient(main.app)
+
+@pytest.fixture
+def results_file(tmp_path, monkeypatch):
+    """將測試結果文件指向暫存檔"""
+    path = tmp_path / "quick_endpoint_test_results.md"
+    monkeypatch.setattr(main, "TEST_RESULTS_FILE", path)
+    monkeypatch.setattr(main, "test_results_cache", ResultsFileCache(path))
+    return path
+
+def test_choose_encoding():
+    """測試 Accept-Encoding 協商"""
+    assert choose_encoding(None) is None
+    assert choose_encoding("identity") is None
+    assert choose_encoding("gzip") == "gzip"
+    assert choose_encoding("gzip;q=0") is None
+    assert choose_encoding("br, *;q=0.5") == SUPPORTED_ENCODINGS[0]
+    if "zstd" in SUPPORTED_ENCODINGS:
+        assert choose_encoding("gzip, zstd") == "zstd"
+        assert choose_encoding("gzip, zstd;q=0.5") == "gzip"
+
+def test_large_output_is_compressed(client, monkeypatch):
+    """大於門檻的命令輸出應被壓縮"""
+    async def fake_execute(platform, shell_command, output_format="text", argv=None, compact=None, limits=None):
+        return {"output": "line of output\n" * 1000, "error": None, "return_code": 0}
+
+    monkeypatch.setattr(main.shell_agent, "execute_command", fake_execute)
+    response = client.post(
+        "/execute",
+        json={"platform": "*nix", "shell_command": "bench"},
+        headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) < 15000
+    assert response.json()["output"].count("line of output") == 1000
+
+def test_small_response_not_compressed(client):
+    """小於門檻的回應不壓縮"""
+    response = client.get("/platform", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+
+def test_streaming_response_compressed_per_chunk():
+    """串流回應逐塊壓縮，每塊都能立即解碼"""
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for i in range(3):
+                yield f"data: event {i}\n\n"
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    response = TestClient(app).get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text == "".join(f"data: event {i}\n\n" for i in range(3))
+
+def test_test_results_precompressed_and_invalidated(client, results_file):
+    """測試結果文件使用預先壓縮的快取，檔案變更後重新產生"""
+    results_file.write_text("# 測試報告\n" + "- 輸出\n" * 500, encoding="utf-8")
+
+    response = client.get("/api/test-results/raw", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert json.loads(response.text) == results_file.read_text(encoding="utf-8")
+
+    cached = main.test_results_cache._entry
+    assert gzip.decompress(cached.compressed["gzip"]) == cached.body
+
+    # 內容未變更時沿用同一份快取
+    client.get("/api/test-results/raw", headers={"Accept-Encoding": "gzip"})
+    assert main.test_results_cache._entry is cached
+
+    # 檔案修改後快取失效
+    results_file.write_text("# 新的報告\n" * 200, encoding="utf-8")
+    os.utime(results_file, ns=(cached.mtime_ns + 10**9, cached.mtime_ns + 10**9))
+    response = client.get("/api/test-results/raw", headers={"Accept-Encoding": "gzip"})
+    assert json.loads(response.text) == "# 新的報告\n" * 200
+    assert main.test_results_cache._entry is not cached
+
+def test_range_and_not_modified_not_compressed(client, results_file):
+    """Range 回應的位元組位置以原始內容計算，不應被壓縮；304 也原樣送出"""
+    content = "# 測試報告\n" + "- 輸出\n" * 500
+    results_file.write_text(content, encoding="utf-8")
+    raw = content.encode("utf-8")
+
+    response = client.get("/api/test-results/raw",
+                          headers={"Range": "bytes=100-", "Accept-Encoding": "gzip"})
+    assert response.status_code == 206
+    assert "content-encoding" not in response.headers
+    assert response.headers["content-range"] == f"bytes 100-{len(raw) - 1}/{len(raw)}"
+    assert response.content == raw[100:]
+
+    etag = client.get("/api/test-results/raw").headers["etag"]
+    response = client.get("/api/test-results/raw",
+                          headers={"If-None-Match": etag, "Accept-Encoding": "gzip"})
+    assert response.status_code == 304
+    assert "content-encoding" not in response.headers
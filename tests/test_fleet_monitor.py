@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import socket
+import asyncio
+import threading
+import pytest
+import uvicorn
+
+# 添加專案根目錄到 Python 路徑
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api import main
+from api.results_store import ResultsStore
+from test_quick_endpoint import create_client, parse_hosts, run_fleet_round
+
+FLEET_COMMANDS = [{"platform": "*nix", "shell_command": "echo fleet"}]
+
+class ThreadRecordingStore(ResultsStore):
+    """記錄寫入時所在的執行緒"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.writer_threads = set()
+
+    def add_results(self, *args, **kwargs):
+        self.writer_threads.add(threading.get_ident())
+        return super().add_results(*args, **kwargs)
+
+def free_port() -> int:
+    """取得目前未使用的本機埠號"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@pytest.fixture
+def fleet():
+    """啟動數個本機 uvicorn 服務，回傳其位址"""
+    servers = []
+    for _ in range(3):
+        port = free_port()
+        server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        servers.append((server, thread, port))
+
+    deadline = time.monotonic() + 10
+    while not all(server.started for server, _, _ in servers):
+        assert time.monotonic() < deadline, "uvicorn 服務未能啟動"
+        time.sleep(0.05)
+
+    yield [f"http://127.0.0.1:{port}" for _, _, port in servers]
+
+    for server, thread, _ in servers:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+def test_parse_hosts():
+    """主機清單支援逗號分隔、檔案內容與註解，並補上預設埠號"""
+    specs = ["a:8001,b", "# 註解\nhttp://c:9000\n\nb:8000  # 重複\n"]
+    assert parse_hosts(specs, default_port=8000) == [
+        "http://a:8001", "http://b:8000", "http://c:9000"
+    ]
+
+@pytest.mark.skipif(sys.platform == "win32", reason="使用 *nix 命令")
+def test_fleet_round_against_local_servers(fleet, tmp_path):
+    """同時探測多台主機，結果依主機分區保存，摘要列出最慢與失敗的主機"""
+    dead = f"http://127.0.0.1:{free_port()}"
+    store = ThreadRecordingStore(tmp_path / "fleet.db")
+
+    async def run():
+        async with create_client(timeout_seconds=10, parallelism=4) as client:
+            return await run_fleet_round(
+                client, fleet + [dead], FLEET_COMMANDS, asyncio.Semaphore(4),
+                timeout_seconds=10, jitter_seconds=0.2, store=store
+            )
+
+    summary = asyncio.run(run())
+    # SQLite 寫入不在事件迴圈的執行緒上進行
+    assert store.writer_threads and threading.get_ident() not in store.writer_threads
+
+    hosts = [url.split("://")[1] for url in fleet]
+    assert summary["hosts"] == 4
+    assert summary["reachable"] == 3
+    assert sorted(item["host"] for item in summary["slowest"]) == sorted(hosts)
+    assert [item["host"] for item in summary["failing"]] == [dead.split("://")[1]]
+
+    assert store.hosts() == sorted(hosts)
+    for host in hosts:
+        tests = store.query(host=host)
+        assert len(tests) == 1
+        assert tests[0]["status"] == "success"
+        assert tests[0]["host"] == host
+        assert "fleet" in tests[0]["output"]
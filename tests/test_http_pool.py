@@ -0,0 +1,94 @@
+import os
+import sys
+import asyncio
+import json
+import httpx
+import pytest
+
+# 將專案根目錄加入 Python 路徑
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.http_pool import HTTPPool
+
+URL = "http://mcp.test/sse/messages?session_id=1"
+
+
+def make_pool(handler, **kwargs) -> HTTPPool:
+    return HTTPPool(transport=httpx.MockTransport(handler), backoff=0, **kwargs)
+
+
+def request(method: str) -> dict:
+    return {"jsonrpc": "2.0", "id": 1, "method": method}
+
+
+@pytest.mark.asyncio
+async def test_retries_when_server_is_unavailable():
+    statuses = [503, 429, 200]
+
+    def handler(req: httpx.Request) -> httpx.Response:
+        assert json.loads(req.content)["method"] == "tools/call"
+        assert req.headers["content-type"] == "application/json"
+        return httpx.Response(statuses.pop(0), json={"jsonrpc": "2.0", "id": 1, "result": {}})
+
+    pool = make_pool(handler)
+    response = await pool.post_json(URL, request("tools/call"))
+    assert response.status_code == 200
+    assert pool.retried == 2
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_connect_errors_are_retried_until_limit():
+    calls = []
+
+    def handler(req: httpx.Request) -> httpx.Response:
+        calls.append(req)
+        raise httpx.ConnectError("refused", request=req)
+
+    pool = make_pool(handler, retries=2)
+    with pytest.raises(httpx.ConnectError):
+        await pool.post_json(URL, request("tools/call"))
+    assert len(calls) == 3
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_tool_calls_are_not_resent_after_read_timeout():
+    """命令可能已經執行，tools/call 不重送；tools/list 可以安全重試"""
+    calls = []
+
+    def handler(req: httpx.Request) -> httpx.Response:
+        calls.append(json.loads(req.content)["method"])
+        if len(calls) in (1, 2):
+            raise httpx.ReadTimeout("timeout", request=req)
+        return httpx.Response(200, json={})
+
+    pool = make_pool(handler)
+    with pytest.raises(httpx.ReadTimeout):
+        await pool.post_json(URL, request("tools/call"))
+    assert (await pool.post_json(URL, request("tools/list"))).status_code == 200
+    assert calls == ["tools/call", "tools/list", "tools/list"]
+
+    # 502 同理：只有冪等的方法重試
+    pool.transport = httpx.MockTransport(lambda req: httpx.Response(502))
+    await pool.aclose()
+    assert (await pool.post_json(URL, request("tools/call"))).status_code == 502
+    assert pool.retried == 1
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_per_host_limit():
+    active = {"now": 0, "max": 0}
+
+    async def handler(req: httpx.Request) -> httpx.Response:
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.01)
+        active["now"] -= 1
+        return httpx.Response(200, json={})
+
+    pool = make_pool(handler, max_per_host=2)
+    await asyncio.gather(*(pool.post_json(URL, request("ping")) for _ in range(8)))
+    assert active["max"] == 2
+    await pool.aclose()
@@ -0,0 +1,74 @@
+import os
+import json
+import sys
+import subprocess
+
+# 專案根目錄
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# stdio 伺服器的匯入時間上限（微秒）；預留 CI 機器的變動空間
+STDIO_IMPORT_BUDGET_US = 150_000
+
+def import_times(module: str) -> dict:
+    """以 python -X importtime 匯入模組，回傳 {模組名稱: 累計微秒}"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR, capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+def test_stdio_server_import_budget():
+    """stdio 伺服器每次對話都會重新啟動，不應載入 mcp、pydantic 等大型套件"""
+    times = import_times("server_shell_helper")
+    for heavy in ("mcp", "pydantic", "fastapi", "httpx"):
+        assert heavy not in times, f"server_shell_helper 不應匯入 {heavy}"
+    assert times["server_shell_helper"] < STDIO_IMPORT_BUDGET_US
+
+def test_api_does_not_load_dashboard_machinery():
+    """只使用 API 時不載入 Jinja2、StaticFiles、SSE 與 httpx"""
+    times = import_times("api.main")
+    for lazy in ("jinja2", "starlette.staticfiles", "sse_starlette", "httpx", "cProfile"):
+        assert lazy not in times, f"api.main 不應在匯入時載入 {lazy}"
+
+def test_lean_stdio_server_roundtrip():
+    """精簡 stdio 伺服器回應 initialize、tools/list 與 tools/call"""
+    messages = [
+        {"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {"protocolVersion": "2024-11-05"}},
+        {"jsonrpc": "2.0", "method": "notifications/initialized"},
+        {"jsonrpc": "2.0", "id": 2, "method": "tools/list"},
+        {"jsonrpc": "2.0", "id": 3, "method": "tools/call", "params": {"name": "get_platform", "arguments": {}}},
+        {"jsonrpc": "2.0", "id": 4, "method": "unknown"},
+    ]
+    result = subprocess.run(
+        [sys.executable, "server_shell_helper.py"],
+        cwd=ROOT_DIR, capture_output=True, text=True, timeout=30,
+        input="".join(json.dumps(message) + "\n" for message in messages)
+    )
+    responses = {response["id"]: response for response in map(json.loads, result.stdout.splitlines())}
+    assert responses[1]["result"]["protocolVersion"] == "2024-11-05"
+    assert [tool["name"] for tool in responses[2]["result"]["tools"]] == ["get_platform", "shell_helper"]
+    assert responses[3]["result"]["isError"] is False
+    assert responses[4]["error"]["code"] == -32601
+
+def test_lean_stdio_server_handles_calls_concurrently():
+    """執行中的命令不阻塞事件迴圈，之後送出的請求先回應"""
+    messages = [
+        {"jsonrpc": "2.0", "id": 1, "method": "tools/call",
+         "params": {"name": "shell_helper", "arguments": {"platform": "*nix", "shell_command": "sleep 1"}}},
+        {"jsonrpc": "2.0", "id": 2, "method": "tools/call", "params": {"name": "get_platform", "arguments": {}}},
+    ]
+    result = subprocess.run(
+        [sys.executable, "server_shell_helper.py"],
+        cwd=ROOT_DIR, capture_output=True, text=True, timeout=30,
+        input="".join(json.dumps(message) + "\n" for message in messages)
+    )
+    responses = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [response["id"] for response in responses] == [2, 1]
+    assert responses[1]["result"]["isError"] is False
@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import socket
+import stat
+import asyncio
+import pytest
+
+# 將專案根目錄加入 Python 路徑
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.http_pool import HTTPPool
+from api.local_socket import UDS_MODE, bind_unix_socket
+
+# 客戶端模組匯入時建立 OpenAI 物件，測試不會呼叫 OpenAI API
+os.environ.setdefault("OPENAI_API_KEY", "test")
+from client_with_servers_sse import IN_PROCESS_TRANSPORT, SSEMCPClient, create_client
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="需要 Unix domain socket")
+
+
+def test_socket_is_private_and_stale_file_is_replaced(tmp_path):
+    path = str(tmp_path / "server.sock")
+    sock = bind_unix_socket(path)
+    assert stat.S_IMODE(os.stat(path).st_mode) == UDS_MODE
+
+    # 仍在監聽時不能被第二個伺服器取代
+    with pytest.raises(OSError):
+        bind_unix_socket(path)
+
+    # 行程異常結束留下的 socket 檔案會被移除後重新建立
+    sock.close()
+    bind_unix_socket(path).close()
+
+    regular = tmp_path / "regular"
+    regular.write_text("data")
+    with pytest.raises(OSError):
+        bind_unix_socket(str(regular))
+
+
+@pytest.mark.asyncio
+async def test_pool_connects_over_unix_socket(tmp_path):
+    path = str(tmp_path / "server.sock")
+    requests = []
+
+    async def handle(reader, writer):
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+            requests.append((head.split(b" ")[1].decode(), json.loads(await reader.readexactly(length))))
+            body = json.dumps({"jsonrpc": "2.0", "id": requests[-1][1]["id"], "result": {}}).encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: %d\r\n\r\n%s" % (len(body), body))
+            await writer.drain()
+
+    server = await asyncio.start_unix_server(handle, sock=bind_unix_socket(path))
+    pool = HTTPPool(uds=path, backoff=0)
+    for request_id in (1, 2):
+        response = await pool.post_json("http://localhost/sse/messages",
+                                        {"jsonrpc": "2.0", "id": request_id, "method": "ping"})
+        assert response.json()["id"] == request_id
+    assert requests == [("/sse/messages", {"jsonrpc": "2.0", "id": i, "method": "ping"}) for i in (1, 2)]
+    await pool.aclose()
+    server.close()
+    await server.wait_closed()
+
+
+def test_create_client_uses_private_pool_for_uds():
+    client = create_client({"url": "http://localhost/sse", "uds": "/tmp/shell_helper.sock"})
+    assert client.pool.uds == "/tmp/shell_helper.sock"
+    assert create_client({"url": "http://localhost:8000/sse"}).pool.uds is None
+
+
+@pytest.mark.asyncio
+async def test_in_process_transport():
+    client = SSEMCPClient()
+    await client.connect_to_server(("local", {"transport": IN_PROCESS_TRANSPORT}))
+    assert "shell_helper" in client.tool_names
+    result = await client.call_tool("get_platform", {})
+    assert result["content"][0]["text"] in ("*nix", "Windows")
+    await client.cleanup()
@@ -0,0 +1,87 @@
+import os
+import sys
+import platform
+import threading
+import pytest
+from fastapi.testclient import TestClient
+
+# 添加專案根目錄到 Python 路徑
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api import main
+from api.metrics import Counter, Histogram, Registry, log_linear_buckets
+
+def test_histogram_render():
+    """直方圖輸出累計分桶、總和與總數"""
+    registry = Registry()
+    histogram = registry.register(Histogram("demo_seconds", "示範", ("kind",), buckets=[0.1, 1]))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.labels("a").observe(value)
+
+    text = registry.render()
+    assert '# TYPE demo_seconds histogram' in text
+    assert 'demo_seconds_bucket{kind="a",le="0.1"} 2' in text
+    assert 'demo_seconds_bucket{kind="a",le="1"} 3' in text
+    assert 'demo_seconds_bucket{kind="a",le="+Inf"} 4' in text
+    assert 'demo_seconds_sum{kind="a"} 3.65' in text
+    assert 'demo_seconds_count{kind="a"} 4' in text
+
+def test_log_linear_buckets():
+    buckets = log_linear_buckets(-1, 0, (1, 2, 5))
+    assert buckets == [0.1, 0.2, 0.5, 1.0, 2.0, 5.0]
+
+def test_counter_threads_without_lock():
+    """各執行緒寫入自己的分片，加總後數值正確"""
+    counter = Counter("demo_total", "示範")
+
+    def work():
+        for _ in range(10000):
+            counter.inc()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter.labels().value == 80000
+
+def test_label_escaping():
+    registry = Registry()
+    counter = registry.register(Counter("demo_total", "示範", ("path",)))
+    counter.labels('a"b\\c\nd').inc()
+    assert 'demo_total{path="a\\"b\\\\c\\nd"} 1' in registry.render()
+
+def test_metrics_endpoint_records_commands():
+    """執行命令後 /metrics 包含命令與端點的指標"""
+    client = TestClient(main.app)
+    current_platform = "Windows" if platform.system() == "Windows" else "*nix"
+    response = client.post("/execute", json={"platform": current_platform, "shell_command": "echo metrics"})
+    assert response.status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert 'shell_commands_total{source="api",status="success"}' in text
+    assert 'shell_command_spawn_seconds_count{source="api"}' in text
+    assert 'shell_command_time_to_first_byte_seconds_count{source="api"}' in text
+    assert 'shell_command_queue_wait_seconds_count{source="api"}' in text
+    assert 'shell_commands_in_flight{source="api"} 0' in text
+    assert 'http_requests_total{endpoint="/execute",method="POST",status="200"}' in text
+    assert 'http_request_duration_seconds_count{endpoint="/execute"}' in text
+
+def test_mcp_command_failure_after_spawn_recorded(monkeypatch):
+    """命令啟動後讀取或壓縮失敗時，仍記錄為 error 並扣回執行中命令數"""
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    import server_shell_helper_sse
+
+    def broken_compaction(text, options):
+        raise RuntimeError("compaction failed")
+
+    monkeypatch.setattr(server_shell_helper_sse, "compact_output", broken_compaction)
+    with pytest.raises(RuntimeError):
+        server_shell_helper_sse._run_shell_command("*nix", "echo metrics", "text", None, None, None)
+
+    text = TestClient(main.app).get("/metrics").text
+    assert 'shell_commands_total{source="mcp",status="error"}' in text
+    assert 'shell_commands_in_flight{source="mcp"} 0' in text
@@ -0,0 +1,126 @@
+import os
+import sys
+import asyncio
+import pytest
+
+# 將專案根目錄加入 Python 路徑
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.output_compaction import (
+    CompactionError, compact_output, compaction_note, dedupe_lines, resolve_compaction, strip_terminal_codes
+)
+
+
+def test_resolve_compaction():
+    assert resolve_compaction(None)["max_bytes"] == 64 * 1024
+    assert resolve_compaction(None, default_enabled=False) is None
+    assert resolve_compaction({"enabled": False}) is None
+    options = resolve_compaction({"max_bytes": 100, "unknown": 1})
+    assert options["max_bytes"] == 100
+    assert "unknown" not in options
+
+
+def test_strip_terminal_codes():
+    text = "\x1b[1;32mPASSED\x1b[0m\n\x1b]0;title\x07done\ndownload 10%\rdownload 100%\r\n"
+    assert strip_terminal_codes(text) == "PASSED\ndone\ndownload 100%\n"
+
+
+def test_dedupe_repeated_and_similar_lines():
+    lines = ["start"] + ["retrying"] * 5 + [f"12:00:{i:02d} GET /health 200" for i in range(10)] + ["a1", "a2", "end"]
+    result, omitted = dedupe_lines(lines)
+    assert result == [
+        "start",
+        "retrying", "[上一行重複 4 次]",
+        "12:00:00 GET /health 200", "[省略 8 行只有數字不同的相似內容]", "12:00:09 GET /health 200",
+        "a1", "a2", "end",
+    ]
+    assert omitted == 12
+
+
+def test_truncate_and_head_tail_budget():
+    text = "".join(f"line {i} {'x' * (i % 7)}\n" for i in range(5000)) + "y" * 5000 + "\nfatal error\n"
+    compacted, stats = compact_output(text, resolve_compaction({"dedupe": False, "max_bytes": 2000,
+                                                                "max_line_length": 100}))
+    assert stats["compacted_bytes"] <= 2000
+    assert stats["truncated_lines"] == 1
+    assert stats["omitted_lines"] > 0
+    assert compacted.startswith("line 0 \n")
+    assert compacted.endswith("fatal error\n")
+    assert "行，共" in compacted
+
+
+def test_disabled_compaction_returns_original():
+    text = "\x1b[31mred\x1b[0m\n" * 3
+    compacted, stats = compact_output(text, None)
+    assert compacted == text
+    assert compaction_note(stats) == ""
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="僅適用於 *nix 平台")
+def test_shell_helper_compacts_by_default():
+    import server_shell_helper_sse
+
+    command = "for i in $(seq 1 500); do echo same; done; echo last"
+    compacted = asyncio.run(server_shell_helper_sse.shell_helper_impl("*nix", command))
+    assert "[上一行重複 499 次]" in compacted
+    assert "輸出已精簡" in compacted
+
+    full = asyncio.run(server_shell_helper_sse.shell_helper_impl("*nix", command, compact={"enabled": False}))
+    assert full.count("same") == 500
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="僅適用於 *nix 平台")
+def test_api_compaction_is_opt_in():
+    from fastapi.testclient import TestClient
+    from api.main import app
+
+    client = TestClient(app)
+    payload = {"platform": "*nix", "shell_command": "printf 'a\\na\\na\\n'"}
+    assert client.post("/execute", json=payload).json()["output"] == "a\na\na\n"
+
+    result = client.post("/execute", json={**payload, "compact": {}}).json()
+    assert result["output"] == "a\n[上一行重複 2 次]\n"
+    assert result["compaction"]["deduped_lines"] == 2
+
+
+def test_resolve_compaction_validates_values():
+    assert resolve_compaction(True, default_enabled=False)["max_bytes"] == 64 * 1024
+    assert resolve_compaction(False) is None
+    assert resolve_compaction({"tail_ratio": 1, "max_bytes": 0})["tail_ratio"] == 1
+    for invalid in ({"max_bytes": "abc"}, {"max_bytes": -1}, {"max_line_length": 1.5}, {"max_bytes": True},
+                    {"tail_ratio": 1.5}, {"tail_ratio": -0.1}, {"tail_ratio": "0.5"}, {"dedupe": "no"},
+                    {"enabled": 0}, "on", ["max_bytes"], 3):
+        with pytest.raises(CompactionError):
+            resolve_compaction(invalid)
+
+
+def test_invalid_compaction_rejected_before_running():
+    from fastapi.testclient import TestClient
+    from api import main
+
+    client = TestClient(main.app)
+    command = {"platform": "*nix", "shell_command": "echo ok"}
+    for compact in ({"max_bytes": "abc"}, {"tail_ratio": 2}):
+        response = client.post("/execute", json={**command, "compact": compact})
+        assert response.status_code == 422
+    assert client.post("/execute", json={**command, "compact": True}).json()["compaction"] is not None
+    assert client.post("/execute", json={**command, "compact": False}).json().get("compaction") is None
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="僅適用於 *nix 平台")
+def test_shell_helper_compact_values_over_jsonrpc():
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    import server_shell_helper_sse
+
+    def call(compact):
+        return asyncio.run(server_shell_helper_sse.handle_jsonrpc_request({
+            "jsonrpc": "2.0", "id": 1, "method": "tools/call",
+            "params": {"name": "shell_helper",
+                       "arguments": {"platform": "*nix", "shell_command": "echo ok", "compact": compact}}
+        }))
+
+    for compact in (True, False):
+        assert "ok" in call(compact)["result"]["content"][0]["text"]
+    for compact in ({"max_bytes": "abc"}, {"tail_ratio": 1.5}, "yes"):
+        error = call(compact)["error"]
+        assert error["code"] == -32602
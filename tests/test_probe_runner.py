@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import asyncio
+import httpx
+import pytest
+
+# 添加專案根目錄到 Python 路徑
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from test_quick_endpoint import run_probes
+from api.results_store import ResultsStore
+
+PROBE_DELAY = 0.2
+
+def make_client(active: list) -> httpx.AsyncClient:
+    """建立以 MockTransport 模擬 /quick 延遲的客戶端，記錄同時進行的請求數"""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        active[0] += 1
+        active[1] = max(active[1], active[0])
+        await asyncio.sleep(PROBE_DELAY)
+        active[0] -= 1
+        command = request.read().decode()
+        if "fail" in command:
+            return httpx.Response(500, json={"detail": "error"})
+        return httpx.Response(200, json={
+            "platform": "*nix",
+            "result": {"output": "ok\n", "error": None, "return_code": 0}
+        })
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://test")
+
+@pytest.mark.asyncio
+async def test_probes_run_concurrently():
+    """探測同時執行，一輪的時間接近最慢的探測，結果依命令順序排列"""
+    active = [0, 0]
+    commands = [{"platform": None, "shell_command": f"echo {i}"} for i in range(4)]
+
+    async with make_client(active) as client:
+        start = time.perf_counter()
+        results = await run_probes(client, commands, parallelism=4)
+        elapsed = time.perf_counter() - start
+
+    assert elapsed < PROBE_DELAY * 2
+    assert active[1] == 4
+    assert [r["command"]["shell_command"] for r in results] == [f"echo {i}" for i in range(4)]
+    assert all(r["latency_ms"] >= PROBE_DELAY * 1000 * 0.9 for r in results)
+
+@pytest.mark.asyncio
+async def test_probe_parallelism_cap_and_errors(tmp_path):
+    """平行數上限生效，失敗的探測記錄錯誤與延遲並寫入資料庫"""
+    active = [0, 0]
+    commands = [{"platform": None, "shell_command": cmd} for cmd in ("echo a", "fail", "echo b")]
+
+    async with make_client(active) as client:
+        results = await run_probes(client, commands, parallelism=2)
+
+    assert active[1] == 2
+    assert "error" in results[1] and "500" in results[1]["error"]
+    assert results[1]["latency_ms"] > 0
+
+    store = ResultsStore(tmp_path / "results.db")
+    store.add_results(results)
+    tests = store.query()
+    assert [t["status"] for t in tests] == ["success", "failure", "success"]
+    assert all(t["latency_ms"] is not None for t in tests)
@@ -0,0 +1,118 @@
+import os
+import sys
+import platform
+import pytest
+from fastapi.testclient import TestClient
+
+# 添加專案根目錄到 Python 路徑
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import server_shell_helper_sse
+from api import main
+from api.profiling import PROFILE_ENV, PROFILE_REQUESTS_ENV, PROFILES, ProfiledRequest, phase, resolve_mode
+
+CURRENT_PLATFORM = "Windows" if platform.system() == "Windows" else "*nix"
+
+@pytest.fixture(autouse=True)
+def clear_profiles(monkeypatch):
+    monkeypatch.delenv(PROFILE_ENV, raising=False)
+    monkeypatch.setenv(PROFILE_REQUESTS_ENV, "1")
+    PROFILES.clear()
+    yield
+    PROFILES.clear()
+
+def test_resolve_mode(monkeypatch):
+    assert resolve_mode(None) is None
+    assert resolve_mode("0") is None
+    assert resolve_mode("1") == "phases"
+    assert resolve_mode("cprofile") == "cprofile"
+    monkeypatch.setenv(PROFILE_ENV, "true")
+    assert resolve_mode(None) == "phases"
+    # 標頭優先於環境變數
+    assert resolve_mode("off") is None
+
+def test_request_profiling_requires_opt_in(monkeypatch):
+    """未設定 SHELL_HELPER_PROFILE_REQUESTS 時忽略 X-Profile 標頭與 _meta.profile"""
+    monkeypatch.delenv(PROFILE_REQUESTS_ENV)
+    assert resolve_mode("cprofile") is None
+    monkeypatch.setenv(PROFILE_ENV, "phases")
+    assert resolve_mode("cprofile") == "phases"
+    monkeypatch.delenv(PROFILE_ENV)
+
+    response = TestClient(main.app).post(
+        "/execute",
+        json={"platform": CURRENT_PLATFORM, "shell_command": "echo plain"},
+        headers={"X-Profile": "cprofile"}
+    )
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+
+    response = TestClient(server_shell_helper_sse.app).post("/sse/messages", json={
+        "jsonrpc": "2.0", "id": 1, "method": "tools/call",
+        "params": {
+            "name": "shell_helper",
+            "arguments": {"platform": CURRENT_PLATFORM, "shell_command": "echo plain"},
+            "_meta": {"profile": "phases"}
+        }
+    })
+    assert "_meta" not in response.json()["result"]
+    assert PROFILES.recent() == []
+
+def test_phase_is_noop_without_profile():
+    with phase("spawn") as value:
+        assert value is None
+    assert PROFILES.recent() == []
+
+def test_nested_phases_recorded():
+    with ProfiledRequest("demo", "phases") as profile:
+        with phase("outer"):
+            with phase("inner"):
+                pass
+    stored = PROFILES.get(profile.id).as_dict()
+    assert [(item["name"], item["depth"]) for item in stored["phases"]] == [("outer", 0), ("inner", 1)]
+    assert stored["total_ms"] >= stored["phases"][0]["duration_ms"]
+
+def test_execute_profiled_with_header():
+    """X-Profile 標頭開啟剖析，回應帶有 X-Profile-Id，可從 debug 端點取得"""
+    client = TestClient(main.app)
+    response = client.post(
+        "/execute",
+        json={"platform": CURRENT_PLATFORM, "shell_command": "echo profile"},
+        headers={"X-Profile": "cprofile"}
+    )
+    assert response.status_code == 200
+    profile_id = response.headers["x-profile-id"]
+
+    profile = client.get(f"/debug/profiles/{profile_id}").json()
+    names = [item["name"] for item in profile["phases"]]
+    for name in ("validate", "spawn", "read", "wait", "build", "encode"):
+        assert name in names
+    assert "cumulative" in profile["trace"]
+    assert client.get(f"/debug/profiles/{profile_id}?format=text").text == profile["trace"]
+    assert client.get("/debug/profiles").json()[0]["id"] == profile_id
+
+def test_execute_not_profiled_by_default():
+    response = TestClient(main.app).post(
+        "/execute", json={"platform": CURRENT_PLATFORM, "shell_command": "echo plain"}
+    )
+    assert "x-profile-id" not in response.headers
+    assert PROFILES.recent() == []
+
+def test_jsonrpc_meta_profile():
+    """MCP 客戶端可用 params._meta.profile 對單一工具呼叫開啟剖析"""
+    client = TestClient(server_shell_helper_sse.app)
+    response = client.post("/sse/messages", json={
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "tools/call",
+        "params": {
+            "name": "shell_helper",
+            "arguments": {"platform": CURRENT_PLATFORM, "shell_command": "echo profile"},
+            "_meta": {"profile": "phases"}
+        }
+    })
+    profile_id = response.json()["result"]["_meta"]["profileId"]
+    profile = client.get(f"/debug/profiles/{profile_id}").json()
+    names = [item["name"] for item in profile["phases"]]
+    assert names[0] == "tools/call shell_helper"
+    assert {"spawn", "read", "build", "wait"} <= set(names)
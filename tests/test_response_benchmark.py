@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# 添加專案根目錄到 Python 路徑
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api import main
+from api.models import ShellCommand, ShellResponse
+
+# (名稱, 輸出大小, 請求次數)
+BENCH_CASES = [
+    ("1KB", 1024, 200),
+    ("1MB", 1024 * 1024, 20),
+    ("50MB", 50 * 1024 * 1024, 2),
+]
+
+def make_output(size: int) -> str:
+    """產生指定大小、類似命令輸出的文字"""
+    line = "ProcessName      PID  Memory(GB)  CPU(s)\n"
+    return (line * (size // len(line) + 1))[:size]
+
+def build_baseline_app(result: dict) -> FastAPI:
+    """舊做法：回傳 dict，由 response_model 驗證後以標準 json 編碼"""
+    app = FastAPI()
+
+    @app.post("/execute", response_model=ShellResponse)
+    async def execute_command(command: ShellCommand):
+        return result
+
+    return app
+
+def run_requests(client: TestClient, count: int) -> tuple:
+    """連續發送請求，回傳 (平均延遲秒數, 最後一次回應)"""
+    response = None
+    start = time.perf_counter()
+    for _ in range(count):
+        response = client.post("/execute", json={"platform": "*nix", "shell_command": "bench"})
+    elapsed = time.perf_counter() - start
+    return elapsed / count, response
+
+@pytest.mark.parametrize("name,size,count", BENCH_CASES, ids=[c[0] for c in BENCH_CASES])
+def test_execute_response_benchmark(monkeypatch, name, size, count):
+    """比較預設 response_model 路徑與 FastJSONResponse 路徑的延遲與吞吐量"""
+    result = {"output": make_output(size), "error": None, "return_code": 0}
+
+    async def fake_execute(platform, shell_command, output_format="text", argv=None, compact=None, limits=None):
+        return result
+
+    monkeypatch.setattr(main.shell_agent, "execute_command", fake_execute)
+
+    baseline_latency, baseline_response = run_requests(
+        TestClient(build_baseline_app(result)), count
+    )
+    fast_latency, fast_response = run_requests(TestClient(main.app), count)
+
+    assert baseline_response.status_code == 200
+    assert fast_response.status_code == 200
+    assert fast_response.json() == baseline_response.json()
+
+    print(
+        f"\n[{name}] 預設路徑: {baseline_latency * 1000:.2f} ms/次, "
+        f"{size / baseline_latency / 1024 / 1024:.1f} MB/s | "
+        f"快速路徑: {fast_latency * 1000:.2f} ms/次, "
+        f"{size / fast_latency / 1024 / 1024:.1f} MB/s"
+    )
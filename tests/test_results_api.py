@@ -0,0 +1,293 @@
+import os
+import sys
+import json
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+
+# 添加專案根目錄到 Python 路徑
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api import main
+from api.results_cache import ResultsFileCache
+from api.results_store import ResultsStore
+from api.results_watcher import ResultsWatcher
+from api.report_parser import parse_reports
+from test_quick_endpoint import create_markdown_content
+
+SEPARATOR = "\n\n" + "=" * 80 + "\n\n"
+
+def make_result(command: str, return_code: int = 0) -> dict:
+    """產生 test_quick_endpoint.py 格式的單筆測試結果"""
+    return {
+        "timestamp": "2025-01-01T00:00:00",
+        "command": {"platform": None, "shell_command": command},
+        "response": {
+            "platform": "*nix",
+            "result": {"output": f"{command} 的輸出\n", "error": None, "return_code": return_code}
+        }
+    }
+
+def make_report(command: str, return_code: int = 0) -> str:
+    """以 test_quick_endpoint.py 的格式產生一次監控報告"""
+    return create_markdown_content([make_result(command, return_code)])
+
+@pytest.fixture
+def client():
+    """建立測試用的 FastAPI 客戶端"""
+    return TestClient(main.app)
+
+@pytest.fixture
+def results_file(tmp_path, monkeypatch):
+    """將測試結果文件指向暫存檔"""
+    path = tmp_path / "quick_endpoint_test_results.md"
+    monkeypatch.setattr(main, "TEST_RESULTS_FILE", path)
+    monkeypatch.setattr(main, "test_results_cache", ResultsFileCache(path))
+    return path
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """將結果資料庫指向暫存檔"""
+    store = ResultsStore(tmp_path / "quick_endpoint_results.db")
+    monkeypatch.setattr(main, "results_store", store)
+    monkeypatch.setattr(main, "results_watcher", ResultsWatcher(store))
+    return store
+
+def append(path, text):
+    """追加內容並推進修改時間，避免檔案系統時間精度造成相同 mtime"""
+    before = path.stat().st_mtime_ns
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(text)
+    os.utime(path, ns=(before + 10**9, before + 10**9))
+
+def test_missing_results_file(client, results_file):
+    """測試結果文件不存在時回傳 404"""
+    response = client.get("/api/test-results/raw")
+    assert response.status_code == 404
+
+def test_etag_not_modified(client, results_file):
+    """帶上相同 ETag 時回傳 304，檔案變更後回傳新內容"""
+    results_file.write_text("# 報告 1\n", encoding="utf-8")
+
+    response = client.get("/api/test-results/raw")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert response.headers["last-modified"]
+
+    response = client.get("/api/test-results/raw", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+    append(results_file, "# 報告 2\n")
+    response = client.get("/api/test-results/raw", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert json.loads(response.text) == "# 報告 1\n# 報告 2\n"
+
+def test_if_modified_since(client, results_file):
+    """If-Modified-Since 不早於檔案修改時間時回傳 304"""
+    results_file.write_text("# 報告\n", encoding="utf-8")
+    last_modified = client.get("/api/test-results/raw").headers["last-modified"]
+    response = client.get("/api/test-results/raw", headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 304
+
+def test_after_offset_returns_only_appended(client, results_file):
+    """after_offset 模式只回傳追加的內容"""
+    results_file.write_text("# 報告 1\n", encoding="utf-8")
+
+    first = client.get("/api/test-results/raw", params={"after_offset": 0}).json()
+    assert first["content"] == "# 報告 1\n"
+    assert first["reset"] is False
+
+    append(results_file, "# 報告 2\n")
+    second = client.get("/api/test-results/raw", params={"after_offset": first["next_offset"]}).json()
+    assert second["offset"] == first["next_offset"]
+    assert second["content"] == "# 報告 2\n"
+
+    # 增量讀取後快取內容與檔案一致
+    assert main.test_results_cache._entry.data == results_file.read_bytes()
+
+def test_after_offset_reset_when_truncated(client, results_file):
+    """檔案被改寫變短時要求客戶端重新讀取"""
+    results_file.write_text("# 很長的舊報告內容\n", encoding="utf-8")
+    size = results_file.stat().st_size
+    results_file.write_text("# 新\n", encoding="utf-8")
+
+    data = client.get("/api/test-results/raw", params={"after_offset": size}).json()
+    assert data["reset"] is True
+    assert data["offset"] == 0
+    assert data["content"] == "# 新\n"
+
+def test_after_offset_reset_when_rewritten_longer(client, results_file):
+    """檔案被改寫成更長的內容時，以 generation 偵測並要求重新讀取"""
+    results_file.write_text("# 舊\n", encoding="utf-8")
+    first = client.get("/api/test-results/raw", params={"after_offset": 0}).json()
+
+    before = results_file.stat().st_mtime_ns
+    results_file.write_text("# 改寫後更長的報告\n", encoding="utf-8")
+    os.utime(results_file, ns=(before + 10**9, before + 10**9))
+    data = client.get("/api/test-results/raw", params={
+        "after_offset": first["next_offset"], "generation": first["generation"]
+    }).json()
+    assert data["reset"] is True
+    assert data["offset"] == 0
+    assert data["content"] == "# 改寫後更長的報告\n"
+    assert data["generation"] != first["generation"]
+
+    # 之後的追加不改變 generation
+    append(results_file, "# 追加\n")
+    appended = client.get("/api/test-results/raw", params={
+        "after_offset": data["next_offset"], "generation": data["generation"]
+    }).json()
+    assert appended["reset"] is False
+    assert appended["content"] == "# 追加\n"
+    assert appended["generation"] == data["generation"]
+
+def test_partial_responses_skip_conditional_requests(client, results_file):
+    """增量與範圍回應的內容與完整回應不同，不使用完整內容的 ETag"""
+    results_file.write_text("# 報告 1\n# 報告 2\n", encoding="utf-8")
+    etag = client.get("/api/test-results/raw").headers["etag"]
+
+    response = client.get("/api/test-results/raw", params={"after_offset": 0},
+                          headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert "etag" not in response.headers
+    assert response.json()["content"] == "# 報告 1\n# 報告 2\n"
+
+    response = client.get("/api/test-results/raw", headers={"Range": "bytes=10-", "If-None-Match": etag})
+    assert response.status_code == 206
+    assert "etag" not in response.headers
+
+def test_after_offset_aligns_to_utf8_boundary(client, results_file):
+    """offset 落在多位元組字元中間時往前對齊"""
+    results_file.write_text("測試", encoding="utf-8")
+    data = client.get("/api/test-results/raw", params={"after_offset": 1}).json()
+    assert data["offset"] == 0
+    assert data["content"] == "測試"
+
+def test_range_request(client, results_file):
+    """Range 請求回傳原始 Markdown 的部分內容"""
+    results_file.write_text("# 報告 1\n# 報告 2\n", encoding="utf-8")
+    size = results_file.stat().st_size
+
+    response = client.get("/api/test-results/raw", headers={"Range": "bytes=10-"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 10-{size - 1}/{size}"
+    assert response.content == results_file.read_bytes()[10:]
+
+    response = client.get("/api/test-results/raw", headers={"Range": f"bytes={size}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{size}"
+
+def test_parse_reports():
+    """解析 test_quick_endpoint.py 產生的 Markdown 報告"""
+    markdown = make_report("echo ok") + SEPARATOR + make_report("false", return_code=1)
+    reports = parse_reports(markdown)
+
+    assert len(reports) == 2
+    first = reports[0]["tests"][0]
+    assert first["command"] == "echo ok"
+    assert first["status"] == "success"
+    assert first["return_code"] == "0"
+    assert first["actual_platform"] == "*nix"
+    assert first["output"] == "echo ok 的輸出"
+    assert reports[1]["tests"][0]["status"] == "failure"
+
+def test_store_query_pagination(store):
+    """分頁查詢由新到舊排列，並支援 since / before / status"""
+    for i in range(5):
+        store.add_results([make_result(f"echo {i}"), make_result(f"false {i}", return_code=1)])
+
+    assert store.summary() == {"total": 10, "success": 5, "failure": 5}
+    assert store.last_id() == 10
+
+    page = store.query(limit=4)
+    assert [t["id"] for t in page] == [10, 9, 8, 7]
+    assert [t["id"] for t in store.query(before=7, limit=4)] == [6, 5, 4, 3]
+
+    # since 從最舊的新紀錄開始取，結果仍由新到舊排列
+    assert [t["id"] for t in store.query(since=2, limit=3)] == [5, 4, 3]
+
+    failures = store.query(status="failure", limit=10)
+    assert [t["command"] for t in failures][:2] == ["false 4", "false 3"]
+    assert all(t["status"] == "failure" and t["return_code"] == 1 for t in failures)
+
+def test_store_import_markdown(store):
+    """匯入舊版 Markdown 報告"""
+    markdown = make_report("echo ok") + SEPARATOR + make_report("false", return_code=1)
+    assert store.import_markdown(markdown) == 2
+    tests = store.query()
+    assert [t["command"] for t in tests] == ["false", "echo ok"]
+    assert tests[1]["output"] == "echo ok 的輸出"
+    assert store.summary() == {"total": 2, "success": 1, "failure": 1}
+
+def test_store_keeps_parsed_tables(tmp_path):
+    """伺服器解析的表格隨紀錄保存，舊版資料庫自動補上 tables 欄位"""
+    import sqlite3
+    path = tmp_path / "old.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        "CREATE TABLE runs (id INTEGER PRIMARY KEY AUTOINCREMENT, time TEXT NOT NULL);"
+        "CREATE TABLE tests (id INTEGER PRIMARY KEY AUTOINCREMENT, run_id INTEGER NOT NULL, "
+        "number INTEGER NOT NULL, exec_time TEXT NOT NULL, command TEXT NOT NULL, platform TEXT, "
+        "status TEXT NOT NULL, actual_platform TEXT, return_code INTEGER, "
+        "output TEXT NOT NULL DEFAULT '', error TEXT);"
+    )
+    conn.close()
+
+    store = ResultsStore(path)
+    result = make_result("ps")
+    table = {"source": "fixed_width", "start_line": 0, "end_line": 3,
+             "columns": [{"name": "PID", "type": "integer"}], "rows": [[1]]}
+    result["response"]["result"]["tables"] = [table]
+    store.add_results([result, make_result("echo")])
+
+    tests = store.query()
+    assert tests[0]["tables"] is None
+    assert tests[1]["tables"] == [table]
+
+def test_list_test_results_endpoint(client, store):
+    """GET /api/test-results 分頁查詢"""
+    for i in range(3):
+        store.add_results([make_result(f"echo {i}")])
+
+    data = client.get("/api/test-results", params={"limit": 2}).json()
+    assert [t["command"] for t in data["tests"]] == ["echo 2", "echo 1"]
+    assert data["summary"]["total"] == 3
+    assert data["last_id"] == 3
+    assert data["next_before"] == 2
+
+    data = client.get("/api/test-results", params={"before": data["next_before"], "limit": 2}).json()
+    assert [t["command"] for t in data["tests"]] == ["echo 0"]
+    assert data["next_before"] is None
+
+    assert client.get("/api/test-results", params={"status": "unknown"}).status_code == 422
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("use_inotify", [True, False], ids=["inotify", "polling"])
+async def test_watcher_pushes_new_tests(tmp_path, use_inotify):
+    """監看器補送 since 之後的紀錄，之後只推送新的紀錄"""
+    store = ResultsStore(tmp_path / "quick_endpoint_results.db")
+    store.add_results([make_result("echo first")])
+    store.add_results([make_result("echo second")])
+    watcher = ResultsWatcher(store, use_inotify=use_inotify)
+
+    queue = await watcher.subscribe(since=1)
+    try:
+        backlog = await asyncio.wait_for(queue.get(), timeout=1)
+        assert backlog["event"] == "tests"
+        assert [t["command"] for t in json.loads(backlog["data"])["tests"]] == ["echo second"]
+        ready = await asyncio.wait_for(queue.get(), timeout=1)
+        assert ready["event"] == "ready"
+        assert ready["id"] == "2"
+
+        await asyncio.to_thread(store.add_results, [make_result("echo third"), make_result("false", 1)])
+        message = await asyncio.wait_for(queue.get(), timeout=5)
+        assert message["event"] == "tests"
+        assert message["id"] == "4"
+        data = json.loads(message["data"])
+        assert [t["command"] for t in data["tests"]] == ["false", "echo third"]
+        assert data["summary"] == {"total": 4, "success": 3, "failure": 1}
+    finally:
+        watcher.unsubscribe(queue)
+    assert watcher.subscriber_count == 0
@@ -0,0 +1,131 @@
+import os
+import sys
+import signal
+import time
+import pytest
+from fastapi.testclient import TestClient
+
+# 將專案根目錄加入 Python 路徑
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api import main
+from api.accounting import finish_command
+from api.command_line import launch_command
+from api.sandbox import (
+    CGROUP_ROOT_ENV, LIMITS_ENV, SANDBOX_AVAILABLE, SandboxError, cgroup_limit_files,
+    open_sandbox, read_cgroup_usage, resolve_limits
+)
+
+
+def test_request_limits_only_tighten_defaults(monkeypatch):
+    monkeypatch.setenv(LIMITS_ENV, '{"memory_mb": 512, "cpu_seconds": 30}')
+    assert resolve_limits(None) == {"memory_mb": 512, "cpu_seconds": 30}
+    assert resolve_limits({"memory_mb": 2048, "cpu_seconds": 5, "max_pids": 64}) == {
+        "memory_mb": 512, "cpu_seconds": 5, "max_pids": 64
+    }
+
+    monkeypatch.setenv(LIMITS_ENV, "not json")
+    assert resolve_limits(None) is None
+
+
+@pytest.mark.parametrize("limits", [{"disk_mb": 1}, {"memory_mb": 0}, {"cpu_seconds": "10"}, {"io_weight": 20000}])
+def test_invalid_limits(limits):
+    with pytest.raises(SandboxError):
+        resolve_limits(limits)
+
+
+def test_cgroup_limit_files():
+    assert cgroup_limit_files({"cpu_quota": 0.5, "memory_mb": 256, "max_pids": 32, "io_weight": 50}) == {
+        "cpu.max": "50000 100000",
+        "memory.max": str(256 * 1024 * 1024),
+        "memory.swap.max": "0",
+        "pids.max": "32",
+        "io.weight": "default 50",
+    }
+
+
+def test_read_cgroup_usage(tmp_path):
+    (tmp_path / "cpu.stat").write_text(
+        "usage_usec 1500000\nuser_usec 1000000\nsystem_usec 500000\nnr_throttled 3\nthrottled_usec 250000\n")
+    (tmp_path / "memory.peak").write_text("10485760\n")
+    (tmp_path / "memory.events").write_text("low 0\nhigh 0\nmax 4\noom 1\noom_kill 1\n")
+    (tmp_path / "io.stat").write_text("8:0 rbytes=4096 wbytes=8192 rios=1 wios=2\n8:16 rbytes=1 wbytes=0\n")
+    assert read_cgroup_usage(str(tmp_path)) == {
+        "cpu_user_s": 1.0,
+        "cpu_system_s": 0.5,
+        "cpu_throttled_s": 0.25,
+        "memory_peak_bytes": 10485760,
+        "oom_kills": 1,
+        "io_read_bytes": 4097,
+        "io_write_bytes": 8192,
+    }
+
+
+def run(command: str, limits: dict):
+    with open_sandbox(resolve_limits(limits)) as sandbox:
+        started = time.perf_counter()
+        process, _ = launch_command("*nix", command, sandbox=sandbox)
+        process.stdout.read()
+        error = process.stderr.read()
+        return_code, usage = finish_command(process, started, "test", sandbox)
+        return return_code, error, usage
+
+
+@pytest.mark.skipif(not SANDBOX_AVAILABLE, reason="需要 setrlimit")
+def test_rlimit_sandbox(monkeypatch):
+    monkeypatch.delenv(CGROUP_ROOT_ENV, raising=False)
+    monkeypatch.delenv(LIMITS_ENV, raising=False)
+
+    return_code, error, usage = run(f"{sys.executable} -c 'bytearray(512 * 1024 * 1024)'", {"memory_mb": 256})
+    assert return_code == 1 and "MemoryError" in error
+    assert usage["backend"] == "rlimit"
+
+    return_code, _, usage = run("while :; do :; done", {"cpu_seconds": 1, "io_weight": 10})
+    assert return_code in (-signal.SIGXCPU, -signal.SIGKILL)
+    assert usage["limit_exceeded"] == "cpu_seconds"
+    assert usage["cpu_user_s"] + usage["cpu_system_s"] >= 0.9
+    # rlimit 無法限制 I/O 權重，回報為未套用
+    assert usage["unenforced"] == ["io_weight"]
+
+
+@pytest.mark.skipif(not SANDBOX_AVAILABLE, reason="需要 setrlimit")
+def test_wrapped_command_runs_setup_in_shell(monkeypatch):
+    monkeypatch.delenv(CGROUP_ROOT_ENV, raising=False)
+    monkeypatch.delenv(LIMITS_ENV, raising=False)
+    sandbox = open_sandbox(resolve_limits({"cpu_seconds": 5, "memory_mb": 64}))
+    args, shell = sandbox.command("echo a | wc -c", True)
+    assert shell is False
+    assert args == ["/bin/sh", "-c", 'ulimit -t 5 && ulimit -v 65536 && exec "$@"',
+                    "sh", "/bin/sh", "-c", "echo a | wc -c"]
+    assert sandbox.command(["ls", "-l"], False)[0][-2:] == ["ls", "-l"]
+
+    # rlimit 無法套用的限制不需要包裝命令
+    sandbox = open_sandbox(resolve_limits({"io_weight": 10}))
+    assert sandbox.command(["ls", "-l"], False) == (["ls", "-l"], False)
+
+
+@pytest.mark.skipif(not SANDBOX_AVAILABLE, reason="需要 setrlimit")
+@pytest.mark.parametrize("command", [
+    "true | {python} -c 'bytearray(512 * 1024 * 1024)'",
+    "( {python} -c 'bytearray(512 * 1024 * 1024)' )",
+    "true && {python} -c 'bytearray(512 * 1024 * 1024)'",
+], ids=["pipeline", "subshell", "and-list"])
+def test_limits_cover_child_processes(monkeypatch, command):
+    """shell 建立的子行程從一開始就受到限制，每次執行都不能超過上限"""
+    monkeypatch.delenv(CGROUP_ROOT_ENV, raising=False)
+    monkeypatch.delenv(LIMITS_ENV, raising=False)
+    client = TestClient(main.app)
+    request = {"platform": "*nix", "shell_command": command.format(python=sys.executable),
+               "limits": {"memory_mb": 256}}
+    for _ in range(10):
+        result = client.post("/execute", json=request).json()
+        assert result["return_code"] == 1
+        assert "MemoryError" in result["error"]
+
+
+@pytest.mark.skipif(not os.environ.get(CGROUP_ROOT_ENV), reason=f"需要設定 {CGROUP_ROOT_ENV}（委派的 cgroup v2 目錄）")
+def test_cgroup_sandbox():
+    return_code, _, usage = run("sh -c 'echo child'; true", {"memory_mb": 64, "max_pids": 8})
+    assert return_code == 0
+    assert usage["backend"] == "cgroup"
+    assert "memory_peak_bytes" in usage
@@ -0,0 +1,134 @@
+import os
+import sys
+import heapq
+import asyncio
+import itertools
+import pytest
+
+# 添加專案根目錄到 Python 路徑
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from probe_scheduler import FixedRateScheduler
+
+INTERVAL = 1.0
+# 推進虛擬時間前讓就緒的工作執行的次數，足以讓排程與工作走到下一個 sleep
+SETTLE_STEPS = 20
+
+
+class VirtualClock:
+    """虛擬時間：所有工作都在等待 sleep 時，才把時間推進到最早的喚醒時間"""
+
+    def __init__(self):
+        self.now = 0.0
+        self._sleepers = []
+        self._order = itertools.count()
+
+    def time(self) -> float:
+        return self.now
+
+    async def sleep(self, delay: float) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._sleepers, (self.now + max(0.0, delay), next(self._order), future))
+        await future
+
+    def block(self, seconds: float) -> None:
+        """模擬事件迴圈被同步程式碼阻塞"""
+        self.now += seconds
+
+    async def run(self, coro):
+        task = asyncio.create_task(coro)
+        while True:
+            for _ in range(SETTLE_STEPS):
+                await asyncio.sleep(0)
+            if task.done():
+                return task.result()
+            assert self._sleepers, "工作在虛擬 sleep 以外的地方等待"
+            wake, _, future = heapq.heappop(self._sleepers)
+            self.now = max(self.now, wake)
+            future.set_result(None)
+
+
+def make_scheduler(clock: VirtualClock, **kwargs) -> FixedRateScheduler:
+    return FixedRateScheduler(INTERVAL, clock=clock.time, sleep=clock.sleep, **kwargs)
+
+def make_job(clock: VirtualClock, starts: list, duration: float):
+    """建立記錄開始時間、耗時 duration 秒的工作"""
+    async def job():
+        starts.append(clock.time())
+        await clock.sleep(duration)
+    return job
+
+@pytest.mark.asyncio
+async def test_fixed_rate_does_not_drift():
+    """每輪的耗時不會累積成週期漂移"""
+    clock, starts = VirtualClock(), []
+    scheduler = make_scheduler(clock)
+    stats = await clock.run(scheduler.run(make_job(clock, starts, INTERVAL * 0.6), duration=INTERVAL * 10))
+
+    assert stats.started == 10
+    assert stats.skipped == 0 and stats.overruns == 0
+    # 第 10 次的開始時間仍是 9 個間隔，而不是 9 × (間隔 + 耗時)
+    assert starts == [INTERVAL * k for k in range(10)]
+    assert stats.max_lag == 0
+
+@pytest.mark.asyncio
+async def test_skip_policy_on_overrun():
+    """上一輪未結束時略過排程，並記錄超時的輪次"""
+    clock, starts = VirtualClock(), []
+    scheduler = make_scheduler(clock, overrun_policy="skip")
+    stats = await clock.run(scheduler.run(make_job(clock, starts, INTERVAL * 2.5), duration=INTERVAL * 9))
+
+    # 每輪佔用 3 個時間格，略過後仍回到原本的時間格線
+    assert starts == [0.0, 3.0, 6.0]
+    assert (stats.ticks, stats.started, stats.skipped) == (9, 3, 6)
+    assert stats.overruns == 3
+    assert stats.last_duration == INTERVAL * 2.5
+
+@pytest.mark.asyncio
+async def test_queue_policy_runs_late_with_lag():
+    """queue 模式等待空位後執行，延遲記錄在統計中"""
+    clock, starts = VirtualClock(), []
+    scheduler = make_scheduler(clock, overrun_policy="queue")
+    stats = await clock.run(scheduler.run(make_job(clock, starts, INTERVAL * 1.5), duration=INTERVAL * 6))
+
+    # 每輪結束後等待中的排程立即開始，沒有空檔
+    assert starts == [0.0, 1.5, 3.0, 4.5, 6.0]
+    assert stats.started == 5 and stats.skipped == 1
+    assert stats.max_lag == pytest.approx(INTERVAL * 1.5)
+    assert stats.last_lag == pytest.approx(INTERVAL * 1.0)
+
+@pytest.mark.asyncio
+async def test_max_in_flight_allows_overlap():
+    """max_in_flight 大於 1 時允許輪次重疊"""
+    clock, starts = VirtualClock(), []
+    scheduler = make_scheduler(clock, max_in_flight=3)
+    stats = await clock.run(scheduler.run(make_job(clock, starts, INTERVAL * 2.5), duration=INTERVAL * 6))
+
+    assert starts == [INTERVAL * k for k in range(6)]
+    assert stats.started == 6
+    assert stats.skipped == 0
+    assert stats.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_missed_intervals_are_skipped():
+    """事件迴圈被阻塞而錯過的排程一律略過，之後回到原本的時間格線"""
+    clock, starts = VirtualClock(), []
+
+    async def job():
+        starts.append(clock.time())
+        if len(starts) == 2:
+            clock.block(INTERVAL * 2.5)
+
+    scheduler = make_scheduler(clock)
+    stats = await clock.run(scheduler.run(job, duration=INTERVAL * 6))
+
+    # 第 2 輪阻塞到 3.5 秒：第 3 次排程（2 秒）已錯過而略過，第 4 次排程延遲 0.5 秒執行
+    assert starts == [0.0, 1.0, 3.5, 4.0, 5.0]
+    assert (stats.ticks, stats.skipped) == (6, 1)
+    assert stats.max_lag == pytest.approx(INTERVAL * 0.5)
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        FixedRateScheduler(0)
+    with pytest.raises(ValueError):
+        FixedRateScheduler(1, overrun_policy="drop")
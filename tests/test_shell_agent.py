@@ -65,4 +65,35 @@ class TestShellAgent:
         
         result = await shell_agent.execute_command(platform_type, invalid_command)
         assert result["return_code"] != 0
-        assert result["error"] is not None
\ No newline at end of file
+        assert result["error"] is not None
+    @pytest.mark.asyncio
+    async def test_failed_read_kills_and_reaps_command(self, shell_agent, monkeypatch):
+        """讀取輸出失敗時結束並回收命令，不留下執行中的行程"""
+        if platform.system() == "Windows":
+            pytest.skip("使用 *nix 命令")
+        from api import agent as agent_module
+
+        launched = []
+
+        class BrokenStdout:
+            def __init__(self, stream):
+                self.stream = stream
+
+            def readline(self):
+                raise OSError("pipe broken")
+
+            def close(self):
+                self.stream.close()
+
+        def launch(*args, **kwargs):
+            process, mode = launch_command(*args, **kwargs)
+            process.stdout = BrokenStdout(process.stdout)
+            launched.append(process)
+            return process, mode
+
+        launch_command = agent_module.launch_command
+        monkeypatch.setattr(agent_module, "launch_command", launch)
+        with pytest.raises(HTTPException) as exc_info:
+            await shell_agent.execute_command("*nix", "sleep 30", limits={"cpu_seconds": 60})
+        assert exc_info.value.status_code == 500
+        assert launched[0].returncode is not None
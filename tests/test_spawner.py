@@ -0,0 +1,95 @@
+import os
+import sys
+import socket
+import threading
+import subprocess
+import pytest
+
+# 將專案根目錄加入 Python 路徑
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.spawner import (
+    FORKSERVER_AVAILABLE, SPAWNER_ENV, ForkServer, ForkServerProcess, spawn_command, spawner_mode
+)
+
+pytestmark = pytest.mark.skipif(not FORKSERVER_AVAILABLE, reason="forkserver 僅支援 POSIX 平台")
+
+
+@pytest.fixture
+def forkserver():
+    server = ForkServer()
+    server.start()
+    yield server
+    server.close()
+
+
+def test_forkserver_captures_output_and_returncode(forkserver):
+    process = forkserver.spawn("echo out; echo err >&2; exit 3")
+    assert process.stdout.read() == "out\n"
+    assert process.stderr.read() == "err\n"
+    assert process.wait(timeout=5) == 3
+    assert process.poll() == 3
+
+
+def test_forkserver_argv_without_shell(forkserver):
+    process = forkserver.spawn(["printf", "%s", "a b"], shell=False)
+    assert process.stdout.read() == "a b"
+    assert process.wait(timeout=5) == 0
+
+
+def test_forkserver_missing_executable_raises(forkserver):
+    with pytest.raises(FileNotFoundError):
+        forkserver.spawn(["/nonexistent/command"], shell=False)
+    # 失敗後仍可繼續啟動命令
+    assert forkserver.spawn("true").wait(timeout=5) == 0
+
+
+def test_forkserver_wait_timeout_and_kill(forkserver):
+    process = forkserver.spawn("sleep 10")
+    assert process.poll() is None
+    with pytest.raises(subprocess.TimeoutExpired):
+        process.wait(timeout=0.05)
+    process.kill()
+    assert process.wait(timeout=5) == -9
+
+
+def test_forkserver_wait_reads_split_returncode_message():
+    """返回碼訊息分成多次送達時，wait() 不帶逾時仍等到完整一行"""
+    server_end, client_end = socket.socketpair()
+    stdout_r, stdout_w = os.pipe()
+    stderr_r, stderr_w = os.pipe()
+    os.close(stdout_w)
+    os.close(stderr_w)
+    process = ForkServerProcess(client_end, 12345, stdout_r, stderr_r, text=True, buffered=b"")
+
+    def send_in_parts():
+        server_end.sendall(b'{"returncode": ')
+        threading.Event().wait(0.1)
+        server_end.sendall(b'7, "usage": {}}\n')
+
+    sender = threading.Thread(target=send_in_parts)
+    sender.start()
+    try:
+        assert process.wait() == 7
+    finally:
+        sender.join()
+        server_end.close()
+        process.stdout.close()
+        process.stderr.close()
+
+
+def test_spawner_mode_from_env(monkeypatch):
+    monkeypatch.delenv(SPAWNER_ENV, raising=False)
+    assert spawner_mode() == "popen"
+    monkeypatch.setenv(SPAWNER_ENV, "ForkServer")
+    assert spawner_mode() == "forkserver"
+    monkeypatch.setenv(SPAWNER_ENV, "unknown")
+    assert spawner_mode() == "popen"
+
+
+def test_spawn_command_uses_popen_by_default(monkeypatch):
+    monkeypatch.delenv(SPAWNER_ENV, raising=False)
+    process = spawn_command("echo hello")
+    assert isinstance(process, subprocess.Popen)
+    assert process.stdout.read() == "hello\n"
+    assert process.wait() == 0
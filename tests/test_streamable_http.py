@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import asyncio
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# 將專案根目錄加入 Python 路徑
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.http_pool import HTTPPool
+from api.mcp_stdio import SUPPORTED_PROTOCOL_VERSIONS
+from api.streamable_http import SESSION_HEADER, StreamableHTTPTransport
+
+# 客戶端模組匯入時建立 OpenAI 物件，測試不會呼叫 OpenAI API
+os.environ.setdefault("OPENAI_API_KEY", "test")
+from client_with_servers_sse import SSEMCPClient, iter_sse_messages
+
+
+async def fake_handler(request):
+    method = request.get("method")
+    if method == "initialize":
+        return {"jsonrpc": "2.0", "id": request["id"], "result": {"protocolVersion": "2025-03-26"}}
+    if method == "tools/list":
+        return {"jsonrpc": "2.0", "id": request["id"], "result": {"tools": [
+            {"name": "echo", "description": "echo", "inputSchema": {"type": "object"}}
+        ]}}
+    if method == "tools/call":
+        await asyncio.sleep(0.01)
+        text = request["params"]["arguments"]["text"]
+        return {"jsonrpc": "2.0", "id": request["id"],
+                "result": {"content": [{"type": "text", "text": text}]}}
+    return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32601, "message": "未知的方法"}}
+
+
+def make_app():
+    transport = StreamableHTTPTransport(fake_handler)
+    app = FastAPI()
+    app.add_api_route("/mcp", transport.handle_post, methods=["POST"])
+    app.add_api_route("/mcp", transport.handle_get, methods=["GET"])
+    app.add_api_route("/mcp", transport.handle_delete, methods=["DELETE"])
+    return app, transport
+
+
+def call(request_id, text):
+    return {"jsonrpc": "2.0", "id": request_id, "method": "tools/call",
+            "params": {"name": "echo", "arguments": {"text": text}}}
+
+
+def sse_messages(body: str):
+    events = []
+    for block in body.replace("\r\n", "\n").strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n") if ": " in line)
+        events.append((fields["id"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture
+def client():
+    app, _ = make_app()
+    with TestClient(app) as test_client:
+        response = test_client.post("/mcp", json={"jsonrpc": "2.0", "id": 0, "method": "initialize"})
+        assert response.status_code == 200
+        test_client.headers[SESSION_HEADER] = response.headers[SESSION_HEADER]
+        yield test_client
+
+
+def test_session_required(client):
+    session_id = client.headers.pop(SESSION_HEADER)
+    assert client.post("/mcp", json={"jsonrpc": "2.0", "id": 1, "method": "tools/list"}).status_code == 400
+    response = client.post("/mcp", json={"jsonrpc": "2.0", "id": 1, "method": "tools/list"},
+                           headers={SESSION_HEADER: "missing"})
+    assert response.status_code == 404
+
+    # 結束工作階段後不能再使用
+    client.headers[SESSION_HEADER] = session_id
+    assert client.delete("/mcp").status_code == 204
+    assert client.post("/mcp", json={"jsonrpc": "2.0", "id": 1, "method": "tools/list"}).status_code == 404
+
+
+def test_notification_and_json_response(client):
+    response = client.post("/mcp", json={"jsonrpc": "2.0", "method": "notifications/initialized"})
+    assert response.status_code == 202
+
+    # 不接受 text/event-stream 時，tools/call 也以 JSON 回應
+    response = client.post("/mcp", json=[call(1, "a"), call(2, "b")],
+                           headers={"Accept": "application/json"})
+    assert response.headers["content-type"] == "application/json"
+    assert [message["result"]["content"][0]["text"] for message in response.json()] == ["a", "b"]
+
+
+def test_streamed_batch_and_resume(client):
+    response = client.post("/mcp", json=[call(1, "a"), call(2, "b")],
+                           headers={"Accept": "application/json, text/event-stream"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = sse_messages(response.text)
+    assert sorted(message["id"] for _, message in events) == [1, 2]
+
+    # 從第一個事件之後續傳，只收到剩下的回應
+    response = client.get("/mcp", headers={"Last-Event-ID": events[0][0]})
+    assert [message for _, message in sse_messages(response.text)] == [events[1][1]]
+
+    assert client.get("/mcp").status_code == 405
+    assert client.get("/mcp", headers={"Last-Event-ID": "unknown-0"}).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_client_over_streamable_http():
+    app, transport = make_app()
+    pool = HTTPPool(transport=httpx.ASGITransport(app=app), backoff=0)
+    mcp_client = SSEMCPClient(pool=pool)
+    await mcp_client.connect_to_server(("echo", {"url": "http://mcp.test/mcp", "transport": "streamable-http"}))
+    assert mcp_client.tool_names == ["echo"]
+    assert mcp_client.mcp_session_id in transport.sessions
+
+    reply = await mcp_client._send_request(call(mcp_client._next_id(), "hello"))
+    assert reply["result"]["content"][0]["text"] == "hello"
+
+    # 伺服器遺失工作階段時自動重新 initialize 並重送
+    transport.sessions.clear()
+    reply = await mcp_client._send_request(call(mcp_client._next_id(), "again"))
+    assert reply["result"]["content"][0]["text"] == "again"
+    assert len(transport.sessions) == 1
+
+    await mcp_client.cleanup()
+    assert transport.sessions == {}
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_iter_sse_messages_skips_other_events():
+    body = b'event: ping\ndata: x\n\nid: s-0\nevent: message\ndata: {"id": 1,\ndata:  "result": {}}\n\n'
+    response = httpx.Response(200, content=body, headers={"content-type": "text/event-stream"})
+    assert [item async for item in iter_sse_messages(response)] == [("s-0", {"id": 1, "result": {}})]
+
+
+@pytest.mark.parametrize("requested, expected", [
+    ("2024-11-05", "2024-11-05"),
+    ("2025-03-26", "2025-03-26"),
+    ("1999-01-01", SUPPORTED_PROTOCOL_VERSIONS[0]),
+    (None, SUPPORTED_PROTOCOL_VERSIONS[0]),
+])
+def test_protocol_version_negotiated_alike_on_every_transport(requested, expected):
+    """stdio、SSE 與 Streamable HTTP 對同一個 initialize 協商出相同的版本"""
+    import server_shell_helper_sse
+    from server_shell_helper import stdio_server
+
+    request = {"jsonrpc": "2.0", "id": 1, "method": "initialize",
+               "params": {"protocolVersion": requested} if requested else {}}
+    stdio = asyncio.run(stdio_server.handle(request))
+    with TestClient(server_shell_helper_sse.app) as test_client:
+        sse = test_client.post("/sse/messages", json=request).json()
+        streamable = test_client.post("/mcp", json=request).json()
+    assert [response["result"]["protocolVersion"] for response in (stdio, sse, streamable)] == [expected] * 3
@@ -0,0 +1,77 @@
+import os
+import sys
+import json
+import platform
+import pytest
+from fastapi.testclient import TestClient
+
+# 添加專案根目錄到 Python 路徑
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api import main
+from api.table_parser import parse_tables, compact_tables
+
+FORMAT_TABLE_OUTPUT = """\r
+===== 前30個最耗記憶體的程序 =====\r
+\r
+ProcessName         PID Memory(GB) CPU(s)\r
+-----------         --- ---------- ------\r
+Memory Compression 3164       1.02 N/A\r
+chrome           123456        0.5 12.25\r
+System                4          0 850.5\r
+\r
+"""
+
+def test_parse_fixed_width_table():
+    """解析 Format-Table 輸出，6 位數 PID 超出分隔線時仍歸入正確欄位"""
+    tables = parse_tables(FORMAT_TABLE_OUTPUT)
+    assert len(tables) == 1
+    table = tables[0]
+    assert table["source"] == "fixed_width"
+    assert (table["start_line"], table["end_line"]) == (3, 8)
+    assert table["columns"] == [
+        {"name": "ProcessName", "type": "string"},
+        {"name": "PID", "type": "integer"},
+        {"name": "Memory(GB)", "type": "number"},
+        {"name": "CPU(s)", "type": "string"},
+    ]
+    assert table["rows"][0] == ["Memory Compression", 3164, 1.02, "N/A"]
+    assert table["rows"][1] == ["chrome", 123456, 0.5, "12.25"]
+
+def test_parse_json_table():
+    """ConvertTo-Json 輸出整段視為單一表格"""
+    output = json.dumps([{"Name": "a", "Id": 1}, {"Name": "b", "Id": 2, "Ok": True}])
+    tables = parse_tables(output)
+    assert tables == [{
+        "source": "json",
+        "columns": [
+            {"name": "Name", "type": "string"},
+            {"name": "Id", "type": "integer"},
+            {"name": "Ok", "type": "boolean"},
+        ],
+        "rows": [["a", 1, None], ["b", 2, True]]
+    }]
+
+def test_plain_text_has_no_tables():
+    assert parse_tables("hello\nworld\n") == []
+    assert parse_tables("") == []
+
+def test_compact_tables():
+    """精簡格式保留表格以外的文字"""
+    compact = json.loads(compact_tables(FORMAT_TABLE_OUTPUT, parse_tables(FORMAT_TABLE_OUTPUT)))
+    assert compact["text"] == "===== 前30個最耗記憶體的程序 ====="
+    assert compact["tables"][0]["rows"][2] == ["System", 4, 0.0, "850.5"]
+
+@pytest.mark.skipif(platform.system() == "Windows", reason="使用 *nix 命令")
+def test_execute_table_output_format():
+    """/execute 指定 output_format=table 時回傳解析後的表格"""
+    client = TestClient(main.app)
+    command = "printf 'Name  Size\\n----  ----\\na        1\\nb       22\\n'"
+
+    response = client.post("/execute", json={"platform": "*nix", "shell_command": command, "output_format": "table"})
+    assert response.status_code == 200
+    tables = response.json()["tables"]
+    assert tables[0]["rows"] == [["a", 1], ["b", 22]]
+
+    response = client.post("/execute", json={"platform": "*nix", "shell_command": command})
+    assert response.json()["tables"] is None
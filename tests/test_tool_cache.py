@@ -0,0 +1,129 @@
+import os
+import sys
+import pytest
+
+# 將專案根目錄加入 Python 路徑
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.tool_cache import TOOL_CACHE_TTL_ENV, ToolResultCache, classify_shell_command
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.parametrize("command, kind", [
+    ("ls -la /tmp", "read"),
+    ("grep 'a|b' app.log | sort | uniq -c", "read"),
+    ("ls missing 2>/dev/null || echo none", "read"),
+    ("git status", "read"),
+    ("Get-ChildItem | Format-Table", "read"),
+    ("ps aux | grep python", "volatile"),
+    ("Get-Process | Sort-Object CPU", "volatile"),
+    ("rm -rf build", "write"),
+    ("cat a.txt > b.txt", "write"),
+    ("ls && touch marker", "write"),
+    ("echo $(rm x)", "write"),
+    ("sed -i s/a/b/ file", "write"),
+    ("find . -name '*.tmp' -delete", "write"),
+    ("git commit -m wip", "write"),
+    ("python script.py", "write"),
+    ("FOO=1 ls", "write"),
+    ("echo 'unterminated", "write"),
+    # env 執行後面的命令
+    ("env", "read"),
+    ("env -u HOME printenv", "read"),
+    ("env rm -rf /tmp/x", "write"),
+    ("env FOO=1 touch f", "write"),
+    ("env -S 'rm x'", "write"),
+    # sed 的 w／e 指令與 git 的 --output 選項會寫入檔案
+    ("sed -n '/error/p' app.log", "read"),
+    ("sed 's/a/b/w out' file", "write"),
+    ("sed -n 's/a/b/gw out' file", "write"),
+    ("sed -e 's/a/b/' -e '1,5W out' file", "write"),
+    ("sed '1e date' file", "write"),
+    ("git diff --output=f", "write"),
+    # 寫入輸出檔或執行其他程式的唯讀命令
+    ("uniq -c in.txt", "read"),
+    ("uniq -f 1 in.txt", "read"),
+    ("uniq in.txt out.txt", "write"),
+    ("uniq -f 1 in.txt out.txt", "write"),
+    ("xxd in.bin out.hex", "write"),
+    ("tree -L 2", "read"),
+    ("tree -o listing.txt", "write"),
+    ("rg --pre ./run.sh pattern", "write"),
+    ("rg -n pattern src", "read"),
+    ("file -C -m magic", "write"),
+    ("file -bC", "write"),
+    ("sort -u names.txt", "read"),
+    ("sort -uo out names.txt", "write"),
+    ("sort --compress-program=gzip big.txt", "write"),
+])
+def test_classify_shell_command(command, kind):
+    assert classify_shell_command(command) == kind
+
+
+def test_classify_argv():
+    assert classify_shell_command(argv=["uname", "-a"]) == "read"
+    assert classify_shell_command(argv=["rm", "x"]) == "write"
+    assert classify_shell_command(argv=["env", "rm", "x"]) == "write"
+
+
+def test_cache_hit_and_ttl():
+    clock = FakeClock()
+    cache = ToolResultCache(ttl=60, clock=clock)
+    args = {"platform": "*nix", "shell_command": "uname -a"}
+
+    assert cache.lookup("shell_helper", args) is None
+    cache.store("shell_helper", args, "Linux")
+    clock.now = 30
+    # 參數順序不同仍是相同的呼叫
+    assert cache.lookup("shell_helper", dict(reversed(list(args.items())))) == ("Linux", 30)
+
+    clock.now = 61
+    assert cache.lookup("shell_helper", args) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_static_tool_never_expires():
+    clock = FakeClock()
+    cache = ToolResultCache(ttl=1, clock=clock)
+    cache.store("get_platform", {}, "*nix")
+    clock.now = 3600
+    assert cache.lookup("get_platform", {}) == ("*nix", 3600)
+
+
+def test_mutating_command_invalidates():
+    cache = ToolResultCache(ttl=60)
+    read = {"platform": "*nix", "shell_command": "cat config.ini"}
+    cache.store("shell_helper", read, "old")
+
+    # 唯讀但會變動的命令不快取，也不影響既有的快取
+    volatile = {"platform": "*nix", "shell_command": "date"}
+    assert cache.lookup("shell_helper", volatile) is None
+    cache.store("shell_helper", volatile, "now")
+    assert len(cache) == 1
+
+    write = {"platform": "*nix", "shell_command": "echo new > config.ini"}
+    assert cache.lookup("shell_helper", write) is None
+    assert len(cache) == 0
+    assert cache.invalidations == 1
+
+
+def test_max_entries_evicts_oldest():
+    cache = ToolResultCache(ttl=60, max_entries=2)
+    for name in ("a", "b", "c"):
+        cache.store("shell_helper", {"shell_command": f"cat {name}"}, name)
+    assert cache.lookup("shell_helper", {"shell_command": "cat a"}) is None
+    assert cache.lookup("shell_helper", {"shell_command": "cat c"})[0] == "c"
+
+
+def test_disabled_by_env(monkeypatch):
+    monkeypatch.setenv(TOOL_CACHE_TTL_ENV, "0")
+    cache = ToolResultCache()
+    cache.store("get_platform", {}, "*nix")
+    assert cache.lookup("get_platform", {}) is None
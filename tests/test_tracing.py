@@ -0,0 +1,92 @@
+import os
+import sys
+import platform
+import pytest
+from fastapi.testclient import TestClient
+
+# 添加專案根目錄到 Python 路徑
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import server_shell_helper_sse
+from api import main
+from api.tracing import (
+    TRACER, InMemoryExporter, extract, format_trace_tree, from_otlp, inject, start_span, to_otlp
+)
+
+CURRENT_PLATFORM = "Windows" if platform.system() == "Windows" else "*nix"
+
+@pytest.fixture
+def exporter(monkeypatch):
+    """以記憶體匯出器啟用追蹤"""
+    exporter = InMemoryExporter()
+    monkeypatch.setattr(TRACER, "exporter", exporter)
+    return exporter
+
+def test_disabled_tracing_is_noop(monkeypatch):
+    monkeypatch.setattr(TRACER, "exporter", None)
+    with start_span("demo") as span:
+        span.set_attribute("key", "value")
+        assert inject({}) == {}
+
+def test_traceparent_roundtrip(exporter):
+    with start_span("parent") as span:
+        carrier = inject({})
+    context = extract(carrier)
+    assert context == span.context
+    assert extract({"traceparent": "invalid"}) is None
+
+def test_nested_spans_share_trace(exporter):
+    with start_span("outer"):
+        with start_span("inner"):
+            pass
+    inner, outer = exporter.spans
+    assert inner["traceId"] == outer["traceId"]
+    assert inner["parentSpanId"] == outer["spanId"]
+    assert outer["parentSpanId"] is None
+    assert "outer" in format_trace_tree(exporter.spans)
+
+def test_otlp_roundtrip(exporter):
+    with start_span("demo", "client", {"count": 3, "name": "x", "ok": True}):
+        pass
+    spans = from_otlp(to_otlp(exporter.spans))
+    assert spans == exporter.spans
+
+def test_jsonrpc_meta_continues_client_trace(exporter):
+    """tools/call 的 _meta.traceparent 讓伺服器端的 span 接在客戶端的 span 之下"""
+    client = TestClient(server_shell_helper_sse.app)
+    with start_span("tool.call shell_helper", "client") as client_span:
+        meta = inject({})
+    response = client.post("/sse/messages", json={
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "tools/call",
+        "params": {
+            "name": "shell_helper",
+            "arguments": {"platform": CURRENT_PLATFORM, "shell_command": "echo trace"},
+            "_meta": meta
+        }
+    })
+    assert "result" in response.json()
+
+    spans = {span["name"]: span for span in exporter.spans}
+    rpc = spans["jsonrpc tools/call"]
+    assert rpc["traceId"] == client_span.context.trace_id
+    assert rpc["parentSpanId"] == client_span.context.span_id
+    assert spans["subprocess"]["parentSpanId"] == rpc["spanId"]
+    assert spans["subprocess"]["attributes"]["process.exit_code"] == 0
+
+def test_http_header_continues_trace(exporter):
+    with start_span("caller", "client"):
+        headers = inject({})
+    response = TestClient(main.app).post(
+        "/execute",
+        json={"platform": CURRENT_PLATFORM, "shell_command": "echo trace"},
+        headers=headers
+    )
+    assert response.status_code == 200
+
+    spans = {span["name"]: span for span in exporter.spans}
+    server = spans["POST /execute"]
+    assert server["parentSpanId"] == extract(headers).span_id
+    assert server["attributes"]["http.status_code"] == 200
+    assert spans["subprocess"]["parentSpanId"] == server["spanId"]
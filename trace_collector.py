@@ -0,0 +1,56 @@
+"""
+本機追蹤收集器
+代替 OTLP collector 接收 OTLP/HTTP JSON 格式的 span 並寫入 JSON Lines 檔案，
+也可以將檔案中的追蹤排成樹狀顯示各段耗時
+"""
+import argparse
+import json
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+from api.tracing import FileExporter, format_trace_tree, from_otlp
+
+
+def create_app(output: str) -> FastAPI:
+    """建立接收 /v1/traces 的應用程式"""
+    app = FastAPI(title="Trace Collector")
+    exporter = FileExporter(output)
+
+    @app.post("/v1/traces")
+    async def receive_traces(request: Request):
+        spans = from_otlp(await request.json())
+        exporter.export(spans)
+        return {"partialSuccess": {}}
+
+    return app
+
+
+def print_summary(path: str, trace_id: Optional[str] = None):
+    """顯示檔案中的追蹤樹"""
+    with open(path, encoding="utf-8") as f:
+        spans = [json.loads(line) for line in f if line.strip()]
+    if trace_id:
+        spans = [span for span in spans if span["traceId"] == trace_id]
+    print(format_trace_tree(spans) or "沒有追蹤資料")
+
+
+def parse_arguments():
+    """解析命令列參數"""
+    parser = argparse.ArgumentParser(description="本機 OTLP 追蹤收集器")
+    parser.add_argument("--host", default="127.0.0.1", help="監聽位址（預設：127.0.0.1）")
+    parser.add_argument("--port", type=int, default=4318, help="監聽埠號（預設：4318）")
+    parser.add_argument("--output", default="traces.jsonl", help="寫入的檔案（預設：traces.jsonl）")
+    parser.add_argument("--summary", metavar="FILE", help="不啟動收集器，改為顯示檔案中的追蹤樹")
+    parser.add_argument("--trace", help="搭配 --summary，只顯示指定的 trace ID")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    if args.summary:
+        print_summary(args.summary, args.trace)
+    else:
+        print(f"接收 http://{args.host}:{args.port}/v1/traces，寫入 {args.output}")
+        uvicorn.run(create_app(args.output), host=args.host, port=args.port, log_level="warning")